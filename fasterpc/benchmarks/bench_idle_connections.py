@@ -0,0 +1,148 @@
+import argparse
+
+import asyncio
+
+import gc
+
+import json
+
+import sys
+
+import tracemalloc
+
+from pathlib import Path
+
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+
+class IdleSocket:
+
+    """Stands in for a connected websocket that never sends anything"""
+
+
+
+    async def send(self, msg): pass
+
+
+
+    async def recv(self):
+
+        await asyncio.Event().wait()
+
+
+
+    async def close(self, code: int = 1000): pass
+
+
+
+async def measure_idle_connections(count, shared_methods):
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+    from fasterpc.rpc_channel import RpcChannel
+
+    from fasterpc.rpc_methods import RpcUtilityMethods
+
+    from fasterpc.simplewebsocket import JsonSerializingWebSocket
+
+
+
+    class AgentMethods(RpcUtilityMethods):
+
+        _shared_ = shared_methods
+
+
+
+    methods = AgentMethods()
+
+    # warm up caches (pydantic, method tables) before measuring
+
+    RpcChannel(methods, JsonSerializingWebSocket(IdleSocket()))
+
+    gc.collect()
+
+    tracemalloc.start()
+
+    before = tracemalloc.get_traced_memory()[0]
+
+    # what an endpoint keeps per idle client: the serializing socket and a connected channel
+
+    channels = [RpcChannel(methods, JsonSerializingWebSocket(IdleSocket())) for _ in range(count)]
+
+    for channel in channels:
+
+        await channel.on_connect()
+
+    gc.collect()
+
+    used = tracemalloc.get_traced_memory()[0] - before
+
+    tracemalloc.stop()
+
+    return used / count
+
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="fasterpc memory per idle connection")
+
+    parser.add_argument("--connections", type=int, default=10000, help="idle channels to create")
+
+    parser.add_argument("--target", type=int, default=100000, help="idle agents one process should hold")
+
+    parser.add_argument("--max-bytes", type=float, default=None, help="fail if an idle connection takes more")
+
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    args = parser.parse_args(argv)
+
+
+
+    results = {}
+
+    for name, shared in (("copied_methods", False), ("shared_methods", True)):
+
+        per_connection = asyncio.run(measure_idle_connections(args.connections, shared))
+
+        results[name] = {"bytes_per_connection": round(per_connection),
+
+                         "target_mb": round(per_connection * args.target / 2 ** 20, 1)}
+
+    failures = []
+
+    if args.max_bytes is not None and results["copied_methods"]["bytes_per_connection"] > args.max_bytes:
+
+        failures.append(f"idle connection takes {results['copied_methods']['bytes_per_connection']} bytes")
+
+    results["failures"] = failures
+
+
+
+    if args.json:
+
+        print(json.dumps(results, indent=2))
+
+    else:
+
+        for name, data in results.items():
+
+            if name == "failures": continue
+
+            print(f"{name:<15} {data['bytes_per_connection']:>7} bytes/connection  {data['target_mb']:>8.1f} MB for {args.target}")
+
+        for failure in failures:
+
+            print(f"FAIL: {failure}")
+
+    return 1 if failures else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
+
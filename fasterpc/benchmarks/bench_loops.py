@@ -0,0 +1,112 @@
+import argparse
+
+import asyncio
+
+import json
+
+import os
+
+import sys
+
+import tempfile
+
+from pathlib import Path
+
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+
+from fasterpc import loop as event_loop
+
+from fasterpc.loadgen import EchoServer, run_load
+
+from fasterpc.logger import LoggingModes, logging_config
+
+
+
+async def measure(uri, requests, connections, concurrency):
+
+    server = EchoServer(uri)
+
+    server.start()
+
+    await asyncio.sleep(0.5)
+
+    try:
+
+        # warm up, then measure
+
+        await run_load(uri, connections=connections, concurrency=concurrency, requests=requests // 10)
+
+        return await run_load(uri, connections=connections, concurrency=concurrency, requests=requests)
+
+    finally:
+
+        await server.stop()
+
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="echo throughput and latency on each available event loop")
+
+    parser.add_argument("--requests", type=int, default=20000)
+
+    parser.add_argument("-c", "--connections", type=int, default=4)
+
+    parser.add_argument("-m", "--concurrency", type=int, default=8, help="concurrent callers per connection")
+
+    parser.add_argument("--port", type=int, default=9989, help="port for the websocket runs")
+
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    args = parser.parse_args(argv)
+
+    logging_config.set_mode(LoggingModes.NO_LOGS)
+
+
+
+    loops = ["asyncio"] + (["uvloop"] if event_loop.uvloop is not None else [])
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        transports = {"ws": f"ws://127.0.0.1:{args.port}/ws", "unix": f"unix://{os.path.join(directory, 'echo.sock')}"}
+
+        for name in loops:
+
+            for transport, uri in transports.items():
+
+                report = event_loop.run(measure(uri, args.requests, args.connections, args.concurrency), name)
+
+                results[f"{name}/{transport}"] = {"calls_per_s": report["throughput_per_s"], **report["latency"]}
+
+
+
+    if args.json:
+
+        print(json.dumps(results, indent=2))
+
+    else:
+
+        if "uvloop" not in loops:
+
+            print("uvloop is not installed, only asyncio was measured (pip install fasterpc[uvloop])")
+
+        for name, data in results.items():
+
+            print(f"{name:<15} {data['calls_per_s']:>10.1f} calls/s  p50 {data['p50_ms']:>7.3f} ms  p99 {data['p99_ms']:>7.3f} ms")
+
+    return 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
+
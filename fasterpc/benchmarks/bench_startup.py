@@ -0,0 +1,216 @@
+import argparse
+
+import ast
+
+import json
+
+import subprocess
+
+import sys
+
+import time
+
+from pathlib import Path
+
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+
+IMPORT_SCENARIOS = {
+
+    "package": "import fasterpc",
+
+    "client": "from fasterpc import WebSocketRpcClient",
+
+    "endpoint": "from fasterpc import WebsocketRPCEndpoint",
+
+}
+
+
+
+# Modules a client-only process must never pull in.
+
+SERVER_ONLY_MODULES = ("fastapi", "starlette")
+
+
+
+PROBE = (
+
+    "import sys, time\n"
+
+    "start = time.perf_counter()\n"
+
+    "{statement}\n"
+
+    "elapsed = time.perf_counter() - start\n"
+
+    "print(repr((elapsed, sorted(m for m in {modules!r} if m in sys.modules))))\n"
+
+)
+
+
+
+def measure_import(statement, repeat):
+
+    timings, loaded = [], []
+
+    for _ in range(repeat):
+
+        out = subprocess.run(
+
+            [sys.executable, "-c", PROBE.format(statement=statement, modules=SERVER_ONLY_MODULES)],
+
+            cwd=PROJECT_ROOT, check=True, capture_output=True, text=True,
+
+        ).stdout.strip().splitlines()[-1]
+
+        elapsed, loaded = ast.literal_eval(out)
+
+        timings.append(elapsed)
+
+    return min(timings), loaded
+
+
+
+def measure_message_roundtrip(count):
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+    from fasterpc.schemas import RpcMessage, RpcRequest
+
+    from fasterpc.utils import pydantic_parse, pydantic_serialize
+
+
+
+    message = RpcMessage(request=RpcRequest(method="echo", arguments={"text": "hello"}, call_id="0" * 32))
+
+    start = time.perf_counter()
+
+    for _ in range(count):
+
+        pydantic_parse(RpcMessage, json.loads(pydantic_serialize(message)))
+
+    return (time.perf_counter() - start) / count
+
+
+
+# wire size and encode+decode+parse time of the same request through each serializing socket
+
+def measure_envelopes(count):
+
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+    from fasterpc.compact import CompactSerializingWebSocket
+
+    from fasterpc.schemas import RpcMessage, RpcRequest
+
+    from fasterpc.simplewebsocket import JsonSerializingWebSocket
+
+    from fasterpc.utils import pydantic_parse
+
+
+
+    compact = CompactSerializingWebSocket(None)
+
+    compact._peer_method_ids, compact._local_methods = {"echo": 0}, ["echo"]
+
+    message = RpcMessage(request=RpcRequest(method="echo", arguments={"text": "hello"}, call_id="0" * 32))
+
+    results = {}
+
+    for name, socket in (("json", JsonSerializingWebSocket(None)), ("compact", compact)):
+
+        start = time.perf_counter()
+
+        for _ in range(count):
+
+            pydantic_parse(RpcMessage, socket._deserialize(socket._serialize(message)))
+
+        results[name] = {"bytes": len(socket._serialize(message)), "us": round((time.perf_counter() - start) / count * 1e6, 2)}
+
+    return results
+
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="fasterpc import-time and per-message benchmark")
+
+    parser.add_argument("--repeat", type=int, default=5, help="import runs per scenario (best is reported)")
+
+    parser.add_argument("--messages", type=int, default=20000, help="messages to serialize and parse")
+
+    parser.add_argument("--max-client-import-ms", type=float, default=None, help="fail if the client import is slower")
+
+    parser.add_argument("--max-message-us", type=float, default=None, help="fail if a message roundtrip is slower")
+
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+
+    args = parser.parse_args(argv)
+
+
+
+    results = {"imports": {}}
+
+    for name, statement in IMPORT_SCENARIOS.items():
+
+        elapsed, loaded = measure_import(statement, args.repeat)
+
+        results["imports"][name] = {"ms": round(elapsed * 1000, 2), "server_modules": loaded}
+
+    results["message_roundtrip_us"] = round(measure_message_roundtrip(args.messages) * 1e6, 2)
+
+    results["envelopes"] = measure_envelopes(args.messages)
+
+
+
+    failures = []
+
+    for name in ("package", "client"):
+
+        if results["imports"][name]["server_modules"]:
+
+            failures.append(f"'{name}' import loaded {results['imports'][name]['server_modules']}")
+
+    if args.max_client_import_ms is not None and results["imports"]["client"]["ms"] > args.max_client_import_ms:
+
+        failures.append(f"client import took {results['imports']['client']['ms']}ms")
+
+    if args.max_message_us is not None and results["message_roundtrip_us"] > args.max_message_us:
+
+        failures.append(f"message roundtrip took {results['message_roundtrip_us']}us")
+
+    results["failures"] = failures
+
+
+
+    if args.json:
+
+        print(json.dumps(results, indent=2))
+
+    else:
+
+        for name, data in results["imports"].items():
+
+            print(f"import {name:<10} {data['ms']:>8.2f} ms  server modules: {data['server_modules'] or '-'}")
+
+        print(f"message roundtrip  {results['message_roundtrip_us']:>8.2f} us")
+
+        for name, data in results["envelopes"].items():
+
+            print(f"envelope {name:<9} {data['us']:>8.2f} us  {data['bytes']} bytes")
+
+        for failure in failures:
+
+            print(f"FAIL: {failure}")
+
+    return 1 if failures else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
+
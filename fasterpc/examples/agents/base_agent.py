@@ -4,11 +4,17 @@ import uvicorn
 
 from fastapi import FastAPI
 
-from fasterpc import RpcMethodsBase, WebsocketRPCEndpoint
+from fasterpc import WebsocketRPCEndpoint
 
+from fasterpc.dag import DagAgentMethods
 
+from fasterpc.loop import uvicorn_loop
 
-class BaseAgentMethods(RpcMethodsBase):
+
+
+# DagAgentMethods lets workflows keep results on the agent and have other agents fetch them directly
+
+class BaseAgentMethods(DagAgentMethods):
 
     def __init__(self, agent_name):
 
@@ -18,7 +24,7 @@ class BaseAgentMethods(RpcMethodsBase):
 
 
 
-    async def get_info(self):
+    async def get_info(self) -> dict:
 
         return {"name": self.agent_name, "status": "active"}
 
@@ -26,11 +32,15 @@ class BaseAgentMethods(RpcMethodsBase):
 
 def run_agent_server(agent_methods, port):
 
+    agent_methods.public_uri = f"ws://localhost:{port}/ws"
+
     app = FastAPI()
 
     endpoint = WebsocketRPCEndpoint(agent_methods)
 
     endpoint.register_route(app, "/ws")
 
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # uvloop when installed, override with FASTERPC_LOOP=asyncio
+
+    uvicorn.run(app, host="0.0.0.0", port=port, loop=uvicorn_loop())
 
@@ -1,7 +1,11 @@
-import asyncio
-
 from fasterpc import WebSocketRpcClient, RpcMethodsBase
 
+from fasterpc.dag import DagExecutor, Ref, Step
+
+from fasterpc.gather import scatter_gather
+
+from fasterpc.loop import run
+
 
 
 async def run_workflow():
@@ -20,25 +24,39 @@ async def run_workflow():
 
         
 
-        # 1. Task Researcher
+        # 0. Check on all agents at once - an unresponsive one is reported, not fatal
 
-        topic = "Quantum Computing"
+        status = await scatter_gather({"researcher": researcher, "analyst": analyst}, "get_info", timeout=2)
+
+        for name, info in status.results.items():
+
+            print(f"   {name}: {info['status']}")
 
-        print(f"\n1️⃣ Asking Researcher about '{topic}'...")
+        for name, error in status.errors.items():
 
-        search_results = await researcher.other.search(query=topic)
+            print(f"   {name} unavailable: {error!r}")
+
+
+
+        # 1+2. Research, then analysis as soon as the research is done. The search results stay on the
+
+        # researcher and the analyst fetches them from it directly - they never pass through us.
+
+        topic = "Quantum Computing"
 
-        print(f"   Received: {search_results.result}")
+        print(f"\n1️⃣ Researching '{topic}' and analysing the findings...")
 
+        workflow = DagExecutor({"researcher": researcher, "analyst": analyst})
 
+        results = await workflow.run([
 
-        # 2. Task Analyst with Researcher's output
+            Step("search", "researcher", "search", {"query": topic}, by_reference=True),
 
-        print(f"\n2️⃣ Sending data to Analyst...")
+            Step("analysis", "analyst", "analyze", {"data": Ref("search")}),
 
-        analysis = await analyst.other.analyze(data=search_results.result)
+        ], timeout=30)
 
-        print(f"   Analysis: {analysis.result}")
+        print(f"   Analysis: {results['analysis']}")
 
 
 
@@ -50,7 +68,7 @@ if __name__ == "__main__":
 
     try:
 
-        asyncio.run(run_workflow())
+        run(run_workflow())
 
     except OSError:
 
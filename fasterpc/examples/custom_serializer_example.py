@@ -34,7 +34,11 @@ class CustomJsonSocket(JsonSerializingWebSocket):
 
         # Use custom encoder
 
-        return json.dumps(msg.dict(), cls=DateTimeEncoder)
+        # control frames (keep-alive etc.) arrive as plain dicts
+
+        payload = msg if isinstance(msg, dict) else msg.dict()
+
+        return json.dumps(payload, cls=DateTimeEncoder)
 
     def _deserialize(self, buffer):
 
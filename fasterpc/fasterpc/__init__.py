@@ -1,12 +1,88 @@
-from .rpc_methods import RpcMethodsBase, RpcUtilityMethods
+import importlib
 
-from .websocket_rpc_client import WebSocketRpcClient
+from typing import TYPE_CHECKING
 
-from .websocket_rpc_endpoint import WebsocketRPCEndpoint
 
-from .rpc_channel import RpcChannel
 
-from .logger import logging_config, LoggingModes, get_logger
+# Public names are resolved on first access so that, e.g., a client-only
 
-from .proxy_enabled_websocket_client_handler import ProxyEnabledWebSocketClientHandler
+# process never pays for importing FastAPI/Starlette.
+
+_LAZY_ATTRIBUTES = {
+
+    "RpcMethodsBase": ".rpc_methods",
+
+    "RpcUtilityMethods": ".rpc_methods",
+
+    "WebSocketRpcClient": ".websocket_rpc_client",
+
+    "WebsocketRPCEndpoint": ".websocket_rpc_endpoint",
+
+    "RpcChannel": ".rpc_channel",
+
+    "RpcPriority": ".schemas",
+
+    "logging_config": ".logger",
+
+    "LoggingModes": ".logger",
+
+    "get_logger": ".logger",
+
+    "ProxyEnabledWebSocketClientHandler": ".proxy_enabled_websocket_client_handler",
+
+    "StreamSocket": ".stream_socket",
+
+    "StreamRpcServer": ".stream_socket",
+
+    "SyncRpcClient": ".sync_client",
+
+}
+
+
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+
+if TYPE_CHECKING:
+
+    from .rpc_methods import RpcMethodsBase, RpcUtilityMethods
+
+    from .websocket_rpc_client import WebSocketRpcClient
+
+    from .websocket_rpc_endpoint import WebsocketRPCEndpoint
+
+    from .rpc_channel import RpcChannel
+
+    from .schemas import RpcPriority
+
+    from .logger import logging_config, LoggingModes, get_logger
+
+    from .proxy_enabled_websocket_client_handler import ProxyEnabledWebSocketClientHandler
+
+    from .stream_socket import StreamSocket, StreamRpcServer
+
+    from .sync_client import SyncRpcClient
+
+
+
+def __getattr__(name):
+
+    module_name = _LAZY_ATTRIBUTES.get(name)
+
+    if module_name is None:
+
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+
+    globals()[name] = value
+
+    return value
+
+
+
+def __dir__():
+
+    return sorted(set(globals()) | set(__all__))
 
@@ -0,0 +1,168 @@
+import time
+
+from typing import Dict, Optional, Tuple
+
+
+
+# (rate per second, burst)
+
+RateLimit = Tuple[float, float]
+
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: float = None):
+
+        self.rate = rate
+
+        self.capacity = burst if burst is not None else max(rate, 1)
+
+        self.tokens = self.capacity
+
+        self.updated = time.monotonic()
+
+
+
+    # Returns 0 when `amount` tokens were taken, otherwise the seconds until they would be available
+
+    def take(self, amount: float = 1) -> float:
+
+        now = time.monotonic()
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+        self.updated = now
+
+        # anything larger than the burst passes once the bucket is full, instead of never
+
+        amount = min(amount, self.capacity)
+
+        if self.tokens >= amount:
+
+            self.tokens -= amount
+
+            return 0
+
+        return (amount - self.tokens) / self.rate
+
+
+
+class AdmissionController:
+
+    def __init__(self, calls_per_second: RateLimit = None,
+
+                 bytes_per_second: RateLimit = None,
+
+                 method_limits: Dict[str, RateLimit] = None,
+
+                 max_concurrent_calls: int = None,
+
+                 max_in_flight: int = None,
+
+                 overload_retry_after: float = 0.1):
+
+        self.calls_per_second = calls_per_second
+
+        self.bytes_per_second = bytes_per_second
+
+        self.method_limits = method_limits or {}
+
+        self.max_concurrent_calls = max_concurrent_calls
+
+        self.max_in_flight = max_in_flight
+
+        self.overload_retry_after = overload_retry_after
+
+        # admitted calls across all connections that did not finish yet
+
+        self.in_flight = 0
+
+        self.rejected = 0
+
+
+
+    def connection(self) -> "ConnectionAdmission":
+
+        return ConnectionAdmission(self)
+
+
+
+class ConnectionAdmission:
+
+    def __init__(self, controller: AdmissionController):
+
+        self.controller = controller
+
+        self.in_flight = 0
+
+        self._calls = TokenBucket(*controller.calls_per_second) if controller.calls_per_second else None
+
+        self._bytes = TokenBucket(*controller.bytes_per_second) if controller.bytes_per_second else None
+
+        self._methods: Dict[str, TokenBucket] = {}
+
+
+
+    # Returns None when the call is admitted, otherwise a retry-after hint in seconds
+
+    def admit(self, method: str, size: int = 0) -> Optional[float]:
+
+        controller = self.controller
+
+        if controller.max_in_flight is not None and controller.in_flight >= controller.max_in_flight:
+
+            return self._reject(controller.overload_retry_after)
+
+        if controller.max_concurrent_calls is not None and self.in_flight >= controller.max_concurrent_calls:
+
+            return self._reject(controller.overload_retry_after)
+
+        if self._calls is not None:
+
+            wait = self._calls.take()
+
+            if wait: return self._reject(wait)
+
+        if self._bytes is not None and size:
+
+            wait = self._bytes.take(size)
+
+            if wait: return self._reject(wait)
+
+        limit = controller.method_limits.get(method)
+
+        if limit is not None:
+
+            bucket = self._methods.get(method)
+
+            if bucket is None:
+
+                bucket = self._methods[method] = TokenBucket(*limit)
+
+            wait = bucket.take()
+
+            if wait: return self._reject(wait)
+
+        self.in_flight += 1
+
+        controller.in_flight += 1
+
+        return None
+
+
+
+    def release(self):
+
+        self.in_flight -= 1
+
+        self.controller.in_flight -= 1
+
+
+
+    def _reject(self, retry_after: float) -> float:
+
+        self.controller.rejected += 1
+
+        return retry_after
+
@@ -0,0 +1,350 @@
+import time
+
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+
+from .logger import get_logger
+
+from .simplewebsocket import JsonSerializingWebSocket, SimpleWebSocket
+
+from .streaming import ArrayStreamDecoder
+
+
+
+logger = get_logger("RPC_CHUNKING")
+
+
+
+# Chunk frames are "\x1e<message id>,<total length>,<call id>|<piece>" (hex numbers; the call id only for responses,
+
+# so the receiver can stream them). JSON text never starts with \x1e.
+
+CHUNK_MARKER = "\x1e"
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+DEFAULT_MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+DEFAULT_MAX_REASSEMBLY_SIZE = 128 * 1024 * 1024
+
+
+
+class MessageTooLargeError(ValueError):
+
+    pass
+
+
+
+def _parse_header(frame: str):
+
+    """(message id, total, call id, piece) of a chunk frame, None when its header is malformed"""
+
+    header_end = frame.find("|")
+
+    fields = frame[1:header_end].split(",") if header_end > 0 else ()
+
+    if len(fields) != 3:
+
+        return None
+
+    try:
+
+        total = int(fields[1], 16)
+
+    except ValueError:
+
+        return None
+
+    return (fields[0], total, fields[2], frame[header_end + 1:]) if total >= 0 else None
+
+
+
+class _Reassembly:
+
+    __slots__ = ("total", "received", "pieces", "decoder")
+
+
+
+    def __init__(self, total: int, decoder: ArrayStreamDecoder = None):
+
+        self.total = total
+
+        self.received = 0
+
+        self.pieces: List[str] = []
+
+        self.decoder = decoder
+
+
+
+    @property
+
+    def buffered(self) -> int:
+
+        return self.decoder.buffered if self.decoder is not None else self.received
+
+
+
+class ChunkedSerializingWebSocket(JsonSerializingWebSocket):
+
+    """
+
+    Sends messages longer than `chunk_size` as chunk frames; RpcChannel lets equally or more urgent messages out
+
+    between them. Receiving reassembles incrementally, dropping messages over `max_message_size` (judged from the
+
+    first chunk, before buffering) and anything that would take more than `max_reassembly_size` in total.
+
+    Sizes are in characters of the serialized message.
+
+    """
+
+
+
+    def __init__(self, websocket: SimpleWebSocket, chunk_size: int = DEFAULT_CHUNK_SIZE,
+
+                 max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE, max_reassembly_size: int = DEFAULT_MAX_REASSEMBLY_SIZE):
+
+        super().__init__(websocket)
+
+        self.chunk_size = chunk_size
+
+        self.max_message_size = max_message_size
+
+        self.max_reassembly_size = max_reassembly_size
+
+        self.dropped = 0
+
+        self._next_id = 0
+
+        self._reassembly: Dict[str, _Reassembly] = {}
+
+        self._buffered = 0
+
+        # ids of messages being dropped, their remaining chunks are skipped
+
+        self._skipping: Dict[str, int] = {}
+
+        # call id -> sink for the elements of a response's array result, decoded while its chunks arrive
+
+        self._streams: Dict[str, Callable[[Any], Optional[bool]]] = {}
+
+
+
+    def register_stream(self, call_id: str, on_element: Callable[[Any], Optional[bool]]):
+
+        self._streams[call_id] = on_element
+
+
+
+    def unregister_stream(self, call_id: str):
+
+        self._streams.pop(call_id, None)
+
+
+
+    def split(self, msg) -> Iterator[str]:
+
+        start = time.perf_counter()
+
+        data = self._serialize(msg)
+
+        if self.on_serialized is not None: self.on_serialized(msg, time.perf_counter() - start)
+
+        total = len(data)
+
+        if total > self.max_message_size:
+
+            raise MessageTooLargeError(f"Message of {total} characters exceeds the {self.max_message_size} limit")
+
+        if total <= self.chunk_size:
+
+            return iter((data,))
+
+        self._next_id += 1
+
+        response = getattr(msg, "response", None)
+
+        call_id = response.call_id if response is not None and response.call_id is not None else ""
+
+        return self._chunks(data, f"{CHUNK_MARKER}{self._next_id:x},{total:x},{call_id}|")
+
+
+
+    def _chunks(self, data: str, header: str) -> Iterator[str]:
+
+        for offset in range(0, len(data), self.chunk_size):
+
+            yield header + data[offset:offset + self.chunk_size]
+
+
+
+    async def send_frame(self, frame):
+
+        await self._websocket.send(frame)
+
+
+
+    async def send(self, msg):
+
+        for frame in self.split(msg):
+
+            await self.send_frame(frame)
+
+
+
+    def _drop(self, message_id: str, reason: str):
+
+        self.dropped += 1
+
+        logger.warning("Dropping chunked message %s: %s", message_id, reason)
+
+
+
+    # Returns the whole message once its last chunk arrived, None before that
+
+    def _on_chunk(self, message_id: str, total: int, call_id: str, piece: str):
+
+        if message_id in self._skipping:
+
+            self._skipping[message_id] -= len(piece)
+
+            if self._skipping[message_id] <= 0: del self._skipping[message_id]
+
+            return None
+
+        reassembly = self._reassembly.get(message_id)
+
+        if reassembly is None:
+
+            if total > self.max_message_size:
+
+                if total > len(piece): self._skipping[message_id] = total - len(piece)
+
+                self._drop(message_id, f"{total} characters exceed the {self.max_message_size} limit")
+
+                return None
+
+            on_element = self._streams.get(call_id) if call_id else None
+
+            decoder = ArrayStreamDecoder(on_element) if on_element is not None else None
+
+            reassembly = self._reassembly[message_id] = _Reassembly(total, decoder)
+
+        if self._buffered + len(piece) > self.max_reassembly_size:
+
+            self._abandon(message_id, reassembly.buffered, reassembly.total - reassembly.received - len(piece),
+
+                          f"reassembly buffers would exceed {self.max_reassembly_size} characters")
+
+            return None
+
+        before = reassembly.buffered
+
+        reassembly.received += len(piece)
+
+        if reassembly.decoder is not None:
+
+            try:
+
+                reassembly.decoder.feed(piece)
+
+            except ValueError as e:
+
+                # the peer's input, it must not take the reader down
+
+                self._abandon(message_id, before, reassembly.total - reassembly.received, f"invalid JSON: {e}")
+
+                return None
+
+        else:
+
+            reassembly.pieces.append(piece)
+
+        self._buffered += reassembly.buffered - before
+
+        if reassembly.received < reassembly.total:
+
+            return None
+
+        del self._reassembly[message_id]
+
+        self._buffered -= reassembly.buffered
+
+        if reassembly.decoder is not None:
+
+            # already decoded, the array elements went to the stream
+
+            try:
+
+                return reassembly.decoder.finish()
+
+            except ValueError as e:
+
+                self._drop(message_id, f"invalid JSON: {e}")
+
+                return None
+
+        return "".join(reassembly.pieces)
+
+
+
+    def _abandon(self, message_id: str, counted: int, remaining: int, reason: str):
+
+        """Drops a message being reassembled, `counted` of its characters are in self._buffered"""
+
+        del self._reassembly[message_id]
+
+        self._buffered -= counted
+
+        if remaining > 0: self._skipping[message_id] = remaining
+
+        self._drop(message_id, reason)
+
+
+
+    async def recv(self):
+
+        while True:
+
+            frame = await self._websocket.recv()
+
+            if frame is None:
+
+                return None
+
+            if isinstance(frame, str) and frame.startswith(CHUNK_MARKER):
+
+                chunk = _parse_header(frame)
+
+                if chunk is None:
+
+                    # the peer's input, it must not take the reader down
+
+                    self._drop("-", "malformed chunk header")
+
+                    continue
+
+                frame = self._on_chunk(*chunk)
+
+                if frame is None:
+
+                    continue
+
+                if isinstance(frame, dict):
+
+                    self.last_recv_size = chunk[1]
+
+                    return frame
+
+            elif len(frame) > self.max_message_size:
+
+                self._drop("-", f"unchunked frame of {len(frame)} characters exceeds the {self.max_message_size} limit")
+
+                continue
+
+            self.last_recv_size = len(frame)
+
+            return self._deserialize(frame)
+
@@ -0,0 +1,206 @@
+import json
+
+from typing import Dict, List, Optional
+
+
+
+from pydantic import BaseModel
+
+
+
+from .logger import get_logger
+
+from .rpc_methods import EXPOSED_BUILT_IN_METHODS
+
+from .simplewebsocket import JsonSerializingWebSocket, SimpleWebSocket
+
+from .utils import pydantic_dump
+
+
+
+logger = get_logger("RPC_COMPACT")
+
+
+
+# Compact envelopes are JSON arrays, control frames stay JSON objects:
+
+#   request   [0, method, arguments, call_id, priority, deadline, traceparent]
+
+#   response  [1, call_id, result, error, result_type]
+
+# kinds 2 and 3 are the same with [kind, seq, ack, ...] for resumable sessions.
+
+# `method` is an index into the receiver's method table once it announced one, the name otherwise.
+
+REQUEST, RESPONSE, SESSION_REQUEST, SESSION_RESPONSE = range(4)
+
+METHODS_KEY = "methods"
+
+
+
+def method_table(methods) -> List[str]:
+
+    cls = type(methods)
+
+    return sorted(name for name in dir(cls) if not name.startswith("_") and callable(getattr(cls, name))) + \
+
+        list(EXPOSED_BUILT_IN_METHODS)
+
+
+
+def _trim(fields: list, keep: int) -> list:
+
+    while len(fields) > keep and fields[-1] is None:
+
+        fields.pop()
+
+    return fields
+
+
+
+def _default(value):
+
+    if isinstance(value, BaseModel):
+
+        return pydantic_dump(value)
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+
+class CompactSerializingWebSocket(JsonSerializingWebSocket):
+
+    """
+
+    Positional JSON envelopes with method ids from a table each side announces when its channel connects.
+
+    `result_type` is only sent with `send_result_type=True` - RpcChannel callers never read it.
+
+    """
+
+
+
+    def __init__(self, websocket: SimpleWebSocket, send_result_type: bool = False):
+
+        super().__init__(websocket)
+
+        self.send_result_type = send_result_type
+
+        self._local_methods: Optional[List[str]] = None
+
+        self._peer_method_ids: Dict[str, int] = {}
+
+
+
+    async def on_channel_connect(self, channel):
+
+        self._local_methods = method_table(channel.methods)
+
+        await self._websocket.send(json.dumps({METHODS_KEY: self._local_methods}))
+
+
+
+    def _serialize(self, msg):
+
+        if isinstance(msg, dict):
+
+            return json.dumps(msg, default=_default)
+
+        session = [msg.seq, msg.ack] if msg.seq is not None else None
+
+        request = msg.request
+
+        if request is not None:
+
+            method = self._peer_method_ids.get(request.method, request.method)
+
+            fields = _trim([method, request.arguments, request.call_id, request.priority, request.deadline,
+
+                            request.traceparent], 2)
+
+            kind = REQUEST
+
+        else:
+
+            response = msg.response
+
+            result_type = response.result_type if self.send_result_type else None
+
+            fields = _trim([response.call_id, response.result, response.error, result_type], 2)
+
+            kind = RESPONSE
+
+        if session is not None:
+
+            return json.dumps([kind + 2] + session + fields, separators=(",", ":"), default=_default)
+
+        return json.dumps([kind] + fields, separators=(",", ":"), default=_default)
+
+
+
+    def _deserialize(self, buffer):
+
+        data = json.loads(buffer)
+
+        if not isinstance(data, list):
+
+            return data
+
+        kind = data[0]
+
+        message = {}
+
+        if kind >= SESSION_REQUEST:
+
+            kind -= 2
+
+            message["seq"], message["ack"] = data[1], data[2]
+
+            data = data[3:]
+
+        else:
+
+            data = data[1:]
+
+        data += [None] * (6 - len(data))
+
+        if kind == REQUEST:
+
+            method = data[0]
+
+            if isinstance(method, int):
+
+                # an id we never announced fails like any unknown method name
+
+                known = self._local_methods is not None and 0 <= method < len(self._local_methods)
+
+                method = self._local_methods[method] if known else f"#{method}"
+
+            message["request"] = {"method": method, "arguments": data[1] or {}, "call_id": data[2], "priority": data[3],
+
+                                  "deadline": data[4], "traceparent": data[5]}
+
+        else:
+
+            message["response"] = {"call_id": data[0], "result": data[1], "error": data[2], "result_type": data[3]}
+
+        return message
+
+
+
+    async def recv(self):
+
+        while True:
+
+            msg = await super().recv()
+
+            # the peer's method table is for us, not for the channel
+
+            if isinstance(msg, dict) and METHODS_KEY in msg:
+
+                self._peer_method_ids = {name: index for index, name in enumerate(msg[METHODS_KEY])}
+
+                continue
+
+            return msg
+
@@ -1,15 +1,29 @@
-from typing import List
+from typing import TYPE_CHECKING, Dict, List
 
 from fastapi import WebSocket
 
 
 
+if TYPE_CHECKING:
+
+    from .gather import GatherResult
+
+    from .rpc_channel import RpcChannel
+
+
+
 class ConnectionManager:
 
     def __init__(self):
 
         self.active_connections: List[WebSocket] = []
 
+        self.channels: Dict[str, "RpcChannel"] = {}
+
+        # set by WorkerRouter so channels are reachable from other workers
+
+        self.router = None
+
 
 
     async def connect(self, websocket: WebSocket):
@@ -24,3 +38,29 @@ class ConnectionManager:
 
         self.active_connections.remove(websocket)
 
+
+
+    def register_channel(self, channel: "RpcChannel"):
+
+        self.channels[channel.id] = channel
+
+        if self.router is not None: self.router.on_channel_registered(channel)
+
+
+
+    def unregister_channel(self, channel: "RpcChannel"):
+
+        if self.channels.pop(channel.id, None) is not None and self.router is not None:
+
+            self.router.on_channel_unregistered(channel)
+
+
+
+    async def scatter_gather(self, method: str, args: Dict = None, **options) -> "GatherResult":
+
+        """Calls `method` on every connected client, results keyed by channel id - see gather.scatter_gather"""
+
+        from .gather import scatter_gather
+
+        return await scatter_gather(dict(self.channels), method, args, **options)
+
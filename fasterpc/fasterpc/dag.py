@@ -0,0 +1,450 @@
+import asyncio
+
+import time
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+
+
+from .logger import get_logger
+
+from .rpc_channel import DEFAULT_TIMEOUT
+
+from .rpc_methods import RpcMethodsBase
+
+from .utils import gen_uid
+
+
+
+logger = get_logger("RPC_DAG")
+
+
+
+class WorkflowError(Exception):
+
+    def __init__(self, step: str, error: BaseException, results: Dict[str, Any]):
+
+        super().__init__(f"Step {step!r} failed: {error!r}")
+
+        self.step = step
+
+        self.error = error
+
+        # outputs of the steps that completed
+
+        self.results = results
+
+
+
+class Ref:
+
+    """Placeholder in a step's arguments for the output of another step, optionally a key path into it."""
+
+    __slots__ = ("step", "path")
+
+
+
+    def __init__(self, step: str, *path):
+
+        self.step = step
+
+        self.path = path
+
+
+
+    def __repr__(self):
+
+        return f"Ref({self.step!r}{''.join(f', {key!r}' for key in self.path)})"
+
+
+
+class ResultRef(dict):
+
+    """A result kept by the agent that produced it: {"ref": id, "uri": where to fetch it}, plus an optional path."""
+
+
+
+def _pick(value, path: Sequence):
+
+    for key in path:
+
+        value = value[key]
+
+    return value
+
+
+
+def _refs(value) -> Iterable[Ref]:
+
+    if isinstance(value, Ref):
+
+        yield value
+
+    elif isinstance(value, dict):
+
+        for item in value.values(): yield from _refs(item)
+
+    elif isinstance(value, (list, tuple)):
+
+        for item in value: yield from _refs(item)
+
+
+
+class Step:
+
+    """
+
+    One call of the workflow: `method` on `agent` (a key of the executor's agents) with `args`, where Ref values
+
+    are filled in from other steps. by_reference: the agent keeps its output and only a ResultRef travels -
+
+    consumers fetch it from the agent directly (both need DagAgentMethods).
+
+    """
+
+
+
+    def __init__(self, name: str, agent: str, method: str, args: Dict[str, Any] = None, by_reference: bool = False):
+
+        self.name = name
+
+        self.agent = agent
+
+        self.method = method
+
+        self.args = args or {}
+
+        self.by_reference = by_reference
+
+        self.depends_on: Set[str] = {ref.step for ref in _refs(self.args)}
+
+
+
+def _check(steps: Dict[str, Step]):
+
+    for step in steps.values():
+
+        missing = step.depends_on - set(steps)
+
+        if missing:
+
+            raise ValueError(f"Step {step.name!r} depends on unknown steps {sorted(missing)}")
+
+    visiting, done = set(), set()
+
+
+
+    def visit(name, trail):
+
+        if name in done: return
+
+        if name in visiting:
+
+            raise ValueError(f"Workflow has a cycle: {' -> '.join(trail + [name])}")
+
+        visiting.add(name)
+
+        for dependency in steps[name].depends_on: visit(dependency, trail + [name])
+
+        visiting.discard(name)
+
+        done.add(name)
+
+    for name in steps: visit(name, [])
+
+
+
+class DagExecutor:
+
+    """
+
+    Runs a workflow of Steps over connected clients (`agents`, by name). Every step starts as soon as the
+
+    steps it depends on finished, so independent branches run in parallel and the whole run takes about as
+
+    long as its critical path. Outputs of by_reference steps stay on their agents; intermediate ones are
+
+    released when the run ends.
+
+    """
+
+
+
+    def __init__(self, agents: Dict[str, Any]):
+
+        self.agents = agents
+
+
+
+    def _channel(self, agent: str):
+
+        target = self.agents[agent]
+
+        return getattr(target, "channel", target)
+
+
+
+    async def run(self, steps: List[Step], timeout: Optional[float] = None, release: bool = True) -> Dict[str, Any]:
+
+        steps = {step.name: step for step in steps}
+
+        _check(steps)
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        results: Dict[str, Any] = {}
+
+        done: Dict[str, asyncio.Future] = {name: asyncio.get_running_loop().create_future() for name in steps}
+
+        consumed = {dependency for step in steps.values() for dependency in step.depends_on}
+
+
+
+        async def run_step(step: Step):
+
+            await asyncio.gather(*(done[dependency] for dependency in step.depends_on))
+
+            remaining = max(deadline - time.monotonic(), 0) if deadline is not None else DEFAULT_TIMEOUT
+
+            result = await self._call(step, results, remaining)
+
+            results[step.name] = result
+
+            done[step.name].set_result(None)
+
+
+
+        tasks = {asyncio.ensure_future(run_step(step)): name for name, step in steps.items()}
+
+        try:
+
+            pending = set(tasks)
+
+            while pending:
+
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+
+                for task in finished:
+
+                    if task.exception() is not None:
+
+                        raise WorkflowError(tasks[task], task.exception(), dict(results))
+
+        finally:
+
+            for task in tasks:
+
+                task.cancel()
+
+            # a failed step leaves its dependents waiting on futures that never complete
+
+            for future in done.values():
+
+                if not future.done(): future.cancel()
+
+            if release:
+
+                await self._release(consumed, results, steps)
+
+        return results
+
+
+
+    async def _call(self, step: Step, results: Dict[str, Any], timeout):
+
+        refs = {}
+
+
+
+        def resolve(value, key=None):
+
+            if isinstance(value, Ref):
+
+                output = results[value.step]
+
+                if isinstance(output, ResultRef):
+
+                    # fetched by the consuming agent itself, straight from the producer
+
+                    if key is None:
+
+                        raise ValueError(f"Step {step.name!r}: references to by_reference outputs must be whole arguments")
+
+                    refs[key] = ResultRef(output, path=list(value.path))
+
+                    return None
+
+                return _pick(output, value.path)
+
+            if isinstance(value, dict):
+
+                return {k: resolve(v) for k, v in value.items()}
+
+            if isinstance(value, (list, tuple)):
+
+                return [resolve(v) for v in value]
+
+            return value
+
+        args = {key: resolve(value, key) for key, value in step.args.items()}
+
+        for key in refs: del args[key]
+
+        channel = self._channel(step.agent)
+
+        if refs or step.by_reference:
+
+            response = await channel.call("run_step", {"method": step.method, "args": args, "refs": refs, "keep": step.by_reference},
+
+                                          timeout=timeout)
+
+            return ResultRef(response.result) if step.by_reference else response.result
+
+        return (await channel.call(step.method, args, timeout=timeout)).result
+
+
+
+    async def fetch(self, ref: ResultRef, agent: str, release: bool = True) -> Any:
+
+        """Pulls a by_reference output (e.g. of a final step) through `agent`, the agent that produced it"""
+
+        value = (await self._channel(agent).call("fetch_result", {"ref": ref["ref"]})).result
+
+        if release: await self._channel(agent).call("release_result", {"ref": ref["ref"]})
+
+        return value
+
+
+
+    async def _release(self, names: Iterable[str], results: Dict[str, Any], steps: Dict[str, Step]):
+
+        calls = [self._channel(steps[name].agent).call("release_result", {"ref": results[name]["ref"]})
+
+                 for name in names if isinstance(results.get(name), ResultRef)]
+
+        for outcome in await asyncio.gather(*calls, return_exceptions=True):
+
+            if isinstance(outcome, Exception): logger.warning("Failed releasing an intermediate result: %r", outcome)
+
+
+
+class ResultStore:
+
+    """Outputs kept by an agent for by_reference steps, and the connections it fetches other agents' outputs over."""
+
+
+
+    def __init__(self):
+
+        self.results: Dict[str, Any] = {}
+
+        self._peers: Dict[str, Any] = {}
+
+        self._lock = asyncio.Lock()
+
+
+
+    async def peer(self, uri: str):
+
+        async with self._lock:
+
+            client = self._peers.get(uri)
+
+            if client is None or client.channel is None or client.channel.isClosed():
+
+                # imported here - only agents forwarding to each other open client connections
+
+                from .websocket_rpc_client import WebSocketRpcClient
+
+                client = self._peers[uri] = await WebSocketRpcClient(uri, retry_config=False).__aenter__()
+
+            return client
+
+
+
+    async def close(self):
+
+        for client in self._peers.values():
+
+            await client.close()
+
+        self._peers.clear()
+
+
+
+class DagAgentMethods(RpcMethodsBase):
+
+    """
+
+    Mixin for agents taking part in DagExecutor workflows with by_reference steps. `public_uri` is where other
+
+    agents reach this one; `result_store` is shared by all channels of the process.
+
+    """
+
+    public_uri: Optional[str] = None
+
+    result_store = ResultStore()
+
+
+
+    async def run_step(self, method: str, args: Dict[str, Any], refs: Dict[str, Any] = {}, keep: bool = False) -> Any:
+
+        if method.startswith("_") or method in ("run_step", "fetch_result", "release_result"):
+
+            raise ValueError(f"{method!r} can't be run as a workflow step")
+
+        args = dict(args)
+
+        for key, ref in refs.items():
+
+            args[key] = _pick(await self._resolve(ref), ref.get("path") or ())
+
+        result = await getattr(self, method)(**args)
+
+        if not keep:
+
+            return result
+
+        ref = gen_uid()
+
+        self.result_store.results[ref] = result
+
+        return {"ref": ref, "uri": self.public_uri}
+
+
+
+    async def _resolve(self, ref: Dict[str, Any]):
+
+        store = self.result_store
+
+        if ref["ref"] in store.results:
+
+            return store.results[ref["ref"]]
+
+        if not ref.get("uri"):
+
+            raise LookupError(f"Result {ref['ref']} is not here and its producer has no public_uri")
+
+        peer = await store.peer(ref["uri"])
+
+        return (await peer.other.fetch_result(ref=ref["ref"])).result
+
+
+
+    async def fetch_result(self, ref: str) -> Any:
+
+        try:
+
+            return self.result_store.results[ref]
+
+        except KeyError:
+
+            raise LookupError(f"No result {ref}") from None
+
+
+
+    async def release_result(self, ref: str) -> bool:
+
+        return self.result_store.results.pop(ref, None) is not None
+
@@ -0,0 +1,48 @@
+import asyncio
+
+import struct
+
+from typing import Optional
+
+
+
+# 4-byte big-endian length prefix
+
+FRAME_HEADER = struct.Struct("!I")
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+
+class FrameTooLargeError(ValueError):
+
+    pass
+
+
+
+def encode_frame(payload: bytes) -> bytes:
+
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+
+# Returns None once the stream ends (cleanly or mid-frame)
+
+async def read_frame(reader: asyncio.StreamReader, max_size: int = MAX_FRAME_SIZE) -> Optional[bytes]:
+
+    try:
+
+        header = await reader.readexactly(FRAME_HEADER.size)
+
+        (size,) = FRAME_HEADER.unpack(header)
+
+        if size > max_size:
+
+            raise FrameTooLargeError(f"Frame of {size} bytes exceeds the {max_size} bytes limit")
+
+        return await reader.readexactly(size)
+
+    except (asyncio.IncompleteReadError, ConnectionError):
+
+        return None
+
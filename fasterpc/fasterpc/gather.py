@@ -0,0 +1,178 @@
+import asyncio
+
+import time
+
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Union
+
+
+
+from .logger import get_logger
+
+from .rpc_channel import DEFAULT_TIMEOUT, RpcChannel, RpcTimeoutException
+
+
+
+logger = get_logger("RPC_GATHER")
+
+
+
+class GatherResult:
+
+    """
+
+    Outcome of scatter_gather, per target key: `results` of the calls that succeeded, `errors` of those that failed
+
+    or ran out of time, and `cancelled` - targets not (or no longer) called because the quorum was already met.
+
+    """
+
+
+
+    def __init__(self, quorum: int):
+
+        self.quorum = quorum
+
+        self.results: Dict[Hashable, Any] = {}
+
+        self.errors: Dict[Hashable, BaseException] = {}
+
+        self.cancelled: List[Hashable] = []
+
+        self.elapsed = 0.0
+
+
+
+    @property
+
+    def complete(self) -> bool:
+
+        return len(self.results) >= self.quorum
+
+
+
+    def __repr__(self):
+
+        return f"GatherResult(results={self.results!r}, errors={self.errors!r}, cancelled={self.cancelled!r})"
+
+
+
+def _channel(target) -> RpcChannel:
+
+    # clients expose their current channel, channels are taken as they are
+
+    return target if isinstance(target, RpcChannel) else target.channel
+
+
+
+async def scatter_gather(targets: Union[Mapping[Hashable, Any], List[Any]], method: str, args: Dict = None,
+
+                         timeout: Optional[float] = None, quorum: Optional[int] = None, hedge_after: Optional[float] = None,
+
+                         priority=None) -> GatherResult:
+
+    """
+
+    Calls `method` on every target (clients or channels; a mapping names them, a list keys them by position)
+
+    concurrently and collects what comes back within `timeout` seconds overall.
+
+    quorum: return as soon as this many calls succeeded, cancelling the rest (default: all of them).
+
+    hedge_after: with a quorum, only call `quorum` targets at first, and one more whenever a call fails or
+
+                 this many seconds pass without reaching the quorum.
+
+    Failures never raise, they are reported per target.
+
+    """
+
+    targets = dict(targets) if isinstance(targets, Mapping) else dict(enumerate(targets))
+
+    quorum = len(targets) if quorum is None else min(quorum, len(targets))
+
+    outcome = GatherResult(quorum)
+
+    started = time.monotonic()
+
+    deadline = started + timeout if timeout is not None else None
+
+    waiting = list(targets)
+
+    running: Dict[asyncio.Task, Hashable] = {}
+
+
+
+    def launch(count: int):
+
+        for key in waiting[:count]:
+
+            remaining = max(deadline - time.monotonic(), 0) if deadline is not None else DEFAULT_TIMEOUT
+
+            call = _channel(targets[key]).call(method, args or {}, timeout=remaining, priority=priority)
+
+            running[asyncio.ensure_future(call)] = key
+
+        del waiting[:count]
+
+
+
+    launch(quorum if hedge_after is not None else len(waiting))
+
+    try:
+
+        while running and not outcome.complete:
+
+            wait = None
+
+            if deadline is not None: wait = deadline - time.monotonic()
+
+            if waiting and hedge_after is not None: wait = hedge_after if wait is None else min(wait, hedge_after)
+
+            if wait is not None and wait <= 0:
+
+                break
+
+            done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+            failed = 0
+
+            for task in done:
+
+                key = running.pop(task)
+
+                if task.exception() is None:
+
+                    outcome.results[key] = task.result().result
+
+                else:
+
+                    outcome.errors[key] = task.exception()
+
+                    failed += 1
+
+            # a failed call is replaced at once, a slow one after hedge_after
+
+            if waiting and (failed or not done):
+
+                launch(max(failed, 1))
+
+            elif not running and waiting:
+
+                launch(1)
+
+    finally:
+
+        for task, key in running.items():
+
+            task.cancel()
+
+            if outcome.complete: outcome.cancelled.append(key)
+
+            else: outcome.errors[key] = RpcTimeoutException(f"No response from {key!r} within {timeout}s")
+
+        outcome.cancelled.extend(waiting)
+
+        outcome.elapsed = time.monotonic() - started
+
+    return outcome
+
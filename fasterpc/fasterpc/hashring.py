@@ -0,0 +1,364 @@
+import asyncio
+
+import bisect
+
+import hashlib
+
+import math
+
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional
+
+
+
+from .logger import get_logger
+
+from .rpc_channel import DEFAULT_TIMEOUT, RpcChannelClosedException
+
+from .websocket_rpc_client import WebSocketRpcClient
+
+
+
+logger = get_logger("RPC_HASHRING")
+
+
+
+def _hash(value: str) -> int:
+
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+
+class HashRing:
+
+    """
+
+    Consistent-hash ring with `vnodes` points per node: adding or removing a node only moves the keys that
+
+    node gains or loses. node_for() optionally applies bounded loads - no node takes more than `load_factor`
+
+    times the average load, the excess spills to the next nodes on the ring.
+
+    """
+
+
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 160):
+
+        self.vnodes = vnodes
+
+        self.nodes: List[str] = []
+
+        self._points: List[int] = []
+
+        self._owners: List[str] = []
+
+        for node in nodes: self.add(node)
+
+
+
+    def add(self, node: str):
+
+        if node in self.nodes:
+
+            return
+
+        self.nodes.append(node)
+
+        for replica in range(self.vnodes):
+
+            point = _hash(f"{node}#{replica}")
+
+            index = bisect.bisect(self._points, point)
+
+            self._points.insert(index, point)
+
+            self._owners.insert(index, node)
+
+
+
+    def remove(self, node: str):
+
+        if node not in self.nodes:
+
+            return
+
+        self.nodes.remove(node)
+
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+
+        self._points = [point for point, _ in kept]
+
+        self._owners = [owner for _, owner in kept]
+
+
+
+    def walk(self, key: str) -> Iterator[str]:
+
+        """Distinct nodes clockwise from the key's position - its owner first, then the failover order"""
+
+        if not self._points:
+
+            return
+
+        start, seen, count = bisect.bisect(self._points, _hash(key)), set(), len(self._points)
+
+        for offset in range(count):
+
+            owner = self._owners[(start + offset) % count]
+
+            if owner not in seen:
+
+                seen.add(owner)
+
+                yield owner
+
+                if len(seen) == len(self.nodes):
+
+                    return
+
+
+
+    def node_for(self, key: str, loads: Dict[str, int] = None, load_factor: float = None,
+
+                 exclude: Collection[str] = ()) -> Optional[str]:
+
+        candidates = [node for node in self.walk(key) if node not in exclude]
+
+        if not candidates:
+
+            return None
+
+        if loads is None or load_factor is None:
+
+            return candidates[0]
+
+        capacity = math.ceil(load_factor * (sum(loads.get(node, 0) for node in candidates) + 1) / len(candidates))
+
+        return next((node for node in candidates if loads.get(node, 0) < capacity), candidates[0])
+
+
+
+class ReplicaRouter:
+
+    """
+
+    Client for a set of replicas of one endpoint: every call names a key and goes to the key's replica on a
+
+    HashRing, so per-key state stays warm on one replica. Load is bounded by in-flight calls (`load_factor`).
+
+    A replica whose connection drops (mid-call or idle) is skipped - its keys fail over to the next replica on
+
+    the ring - and reconnected in the background; add_replica/remove_replica rebalance with minimal key movement.
+
+    """
+
+
+
+    def __init__(self, uris: Iterable[str], vnodes: int = 160, load_factor: Optional[float] = 1.25,
+
+                 reconnect_interval: float = 1, **client_kwargs):
+
+        self.ring = HashRing(vnodes=vnodes)
+
+        self.load_factor = load_factor
+
+        self.reconnect_interval = reconnect_interval
+
+        self.clients: Dict[str, WebSocketRpcClient] = {}
+
+        self.in_flight: Dict[str, int] = {}
+
+        self._uris = list(uris)
+
+        self._client_kwargs = {"retry_config": False, **client_kwargs}
+
+        self._down: Dict[str, asyncio.Task] = {}
+
+        self._closing = False
+
+
+
+    async def __aenter__(self):
+
+        await asyncio.gather(*(self.add_replica(uri) for uri in self._uris))
+
+        return self
+
+
+
+    async def __aexit__(self, *args):
+
+        await self.close()
+
+
+
+    async def close(self):
+
+        self._closing = True
+
+        for task in self._down.values(): task.cancel()
+
+        self._down.clear()
+
+        await asyncio.gather(*(client.close() for client in self.clients.values()), return_exceptions=True)
+
+        self.clients.clear()
+
+
+
+    async def add_replica(self, uri: str):
+
+        self.ring.add(uri)
+
+        self.in_flight.setdefault(uri, 0)
+
+        try:
+
+            await self._connect(uri)
+
+        except Exception as e:
+
+            self._mark_down(uri, e)
+
+
+
+    async def remove_replica(self, uri: str):
+
+        self.ring.remove(uri)
+
+        task = self._down.pop(uri, None)
+
+        if task is not None: task.cancel()
+
+        client = self.clients.pop(uri, None)
+
+        self.in_flight.pop(uri, None)
+
+        if client is not None: await client.close()
+
+
+
+    async def _connect(self, uri: str):
+
+        client = await WebSocketRpcClient(uri, **self._client_kwargs).__aenter__()
+
+        self.clients[uri] = client
+
+
+
+        async def on_disconnect(channel):
+
+            # dropped while idle too, not only under a call - reconnect either way
+
+            if self.clients.get(uri) is client: self._mark_down(uri, ConnectionError("connection closed"))
+
+        client.channel.register_disconnect_handler([on_disconnect])
+
+
+
+    def _available(self, uri: str) -> bool:
+
+        client = self.clients.get(uri)
+
+        return uri not in self._down and client is not None and not client.channel.isClosed()
+
+
+
+    def _mark_down(self, uri: str, error: BaseException = None):
+
+        if self._closing or uri in self._down or uri not in self.ring.nodes:
+
+            return
+
+        logger.warning("Replica %s is down (%r), failing over", uri, error)
+
+        self._down[uri] = asyncio.ensure_future(self._reconnect(uri))
+
+
+
+    async def _reconnect(self, uri: str):
+
+        client = self.clients.pop(uri, None)
+
+        if client is not None:
+
+            await asyncio.gather(client.close(), return_exceptions=True)
+
+        while True:
+
+            await asyncio.sleep(self.reconnect_interval)
+
+            try:
+
+                await self._connect(uri)
+
+            except Exception:
+
+                continue
+
+            logger.info("Replica %s is back", uri)
+
+            self._down.pop(uri, None)
+
+            return
+
+
+
+    def replica_for(self, key: str, exclude: Collection[str] = ()) -> Optional[str]:
+
+        """The replica `key` goes to now, skipping those unavailable and those in `exclude`"""
+
+        unavailable = set(exclude)
+
+        for uri in self.ring.nodes:
+
+            if not self._available(uri):
+
+                unavailable.add(uri)
+
+                # a drop nobody reported yet still gets reconnected
+
+                if uri not in self._down and uri in self.clients: self._mark_down(uri)
+
+        return self.ring.node_for(key, self.in_flight, self.load_factor, exclude=unavailable)
+
+
+
+    async def call(self, key: str, method: str, args: Dict = None, timeout=DEFAULT_TIMEOUT, priority=None) -> Any:
+
+        """Calls `method` on the replica owning `key`; returns the RpcResponse"""
+
+        tried = set()
+
+        while True:
+
+            uri = self.replica_for(key, exclude=tried)
+
+            if uri is None:
+
+                raise RpcChannelClosedException(f"No replica available for key {key!r}")
+
+            channel = self.clients[uri].channel
+
+            self.in_flight[uri] += 1
+
+            try:
+
+                return await channel.call(method, args or {}, timeout=timeout, priority=priority)
+
+            except RpcChannelClosedException as e:
+
+                # a plain timeout on a live replica isn't retried elsewhere - the call may still be running there
+
+                if not channel.isClosed():
+
+                    raise
+
+                tried.add(uri)
+
+                self._mark_down(uri, e)
+
+            finally:
+
+                if uri in self.in_flight: self.in_flight[uri] -= 1
+
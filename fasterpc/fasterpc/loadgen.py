@@ -0,0 +1,462 @@
+import argparse
+
+import asyncio
+
+import json
+
+import math
+
+import sys
+
+import time
+
+from collections import Counter
+
+from typing import Any, Dict, List, Optional
+
+from urllib.parse import urlsplit
+
+
+
+from . import loop as event_loop
+
+from .logger import LoggingModes, logging_config
+
+from .rpc_channel import RpcTimeoutException
+
+from .rpc_methods import RpcUtilityMethods
+
+from .stream_socket import StreamRpcServer, is_stream_uri
+
+from .websocket_rpc_client import WebSocketRpcClient
+
+
+
+# log-linear buckets, ~5% wide: enough for percentiles without keeping every sample
+
+BUCKETS_PER_E = 20
+
+
+
+class LatencyHistogram:
+
+    def __init__(self):
+
+        self.buckets: Counter = Counter()
+
+        self.count = 0
+
+        self.total = 0.0
+
+        self.max = 0.0
+
+
+
+    def record(self, seconds: float):
+
+        self.buckets[int(math.log(max(seconds * 1e6, 1)) * BUCKETS_PER_E)] += 1
+
+        self.count += 1
+
+        self.total += seconds
+
+        self.max = max(self.max, seconds)
+
+
+
+    def percentile(self, fraction: float) -> float:
+
+        if not self.count:
+
+            return 0.0
+
+        rank = fraction * self.count
+
+        seen = 0
+
+        for bucket in sorted(self.buckets):
+
+            seen += self.buckets[bucket]
+
+            if seen >= rank:
+
+                # upper edge of the bucket, in seconds
+
+                return min(math.exp((bucket + 1) / BUCKETS_PER_E) / 1e6, self.max)
+
+        return self.max
+
+
+
+    def summary(self) -> Dict[str, float]:
+
+        ms = lambda seconds: round(seconds * 1000, 3)
+
+        return {"mean_ms": ms(self.total / self.count if self.count else 0), "p50_ms": ms(self.percentile(0.5)),
+
+                "p90_ms": ms(self.percentile(0.9)), "p99_ms": ms(self.percentile(0.99)),
+
+                "p999_ms": ms(self.percentile(0.999)), "max_ms": ms(self.max)}
+
+
+
+class LoadStats:
+
+    def __init__(self):
+
+        self.latency = LatencyHistogram()
+
+        self.errors: Counter = Counter()
+
+        self.timeouts = 0
+
+        self.issued = 0
+
+        self.started_at = time.monotonic()
+
+
+
+    @property
+
+    def completed(self) -> int:
+
+        return self.latency.count
+
+
+
+    def report(self) -> Dict[str, Any]:
+
+        elapsed = time.monotonic() - self.started_at
+
+        return {"elapsed_s": round(elapsed, 3), "completed": self.completed, "timeouts": self.timeouts,
+
+                "errors": dict(self.errors), "throughput_per_s": round(self.completed / elapsed, 1) if elapsed else 0,
+
+                "latency": self.latency.summary()}
+
+
+
+def render_arguments(template: Any, **values) -> Any:
+
+    if isinstance(template, str):
+
+        return template.format(**values)
+
+    if isinstance(template, dict):
+
+        return {key: render_arguments(value, **values) for key, value in template.items()}
+
+    if isinstance(template, list):
+
+        return [render_arguments(value, **values) for value in template]
+
+    return template
+
+
+
+class _Pacer:
+
+    """Hands out evenly spaced send slots for a fixed total rate (open loop - a slow call doesn't delay the schedule)"""
+
+
+
+    def __init__(self, rate: float):
+
+        self.interval = 1 / rate
+
+        self.next_at = time.monotonic()
+
+
+
+    async def wait(self):
+
+        slot, self.next_at = self.next_at, max(self.next_at, time.monotonic() - self.interval) + self.interval
+
+        delay = slot - time.monotonic()
+
+        if delay > 0: await asyncio.sleep(delay)
+
+
+
+async def _caller(client: WebSocketRpcClient, method: str, template: Dict, connection: int, caller: int, stats: LoadStats,
+
+                  stop_at: float, remaining: List[int], pacer: Optional[_Pacer], timeout: float):
+
+    while time.monotonic() < stop_at:
+
+        if remaining[0] == 0:
+
+            return
+
+        remaining[0] -= 1
+
+        if pacer is not None: await pacer.wait()
+
+        arguments = render_arguments(template, i=stats.issued, connection=connection, caller=caller)
+
+        stats.issued += 1
+
+        start = time.monotonic()
+
+        try:
+
+            await client.channel.call(method, arguments, timeout=timeout)
+
+            stats.latency.record(time.monotonic() - start)
+
+        except RpcTimeoutException:
+
+            stats.timeouts += 1
+
+        except Exception as e:
+
+            stats.errors[type(e).__name__] += 1
+
+            if client.channel.isClosed(): return
+
+
+
+async def _live_report(stats: LoadStats, interval: float, as_json: bool):
+
+    last = 0
+
+    while True:
+
+        await asyncio.sleep(interval)
+
+        report = stats.report()
+
+        done, last = report["completed"] - last, report["completed"]
+
+        if as_json:
+
+            print(json.dumps({"live": report}), file=sys.stderr)
+
+        else:
+
+            print(f"[{report['elapsed_s']:>7.1f}s] {done / interval:>9.1f}/s  completed {report['completed']}  "
+
+                  f"p99 {report['latency']['p99_ms']}ms  timeouts {report['timeouts']}  errors {sum(stats.errors.values())}",
+
+                  file=sys.stderr)
+
+
+
+async def run_load(uri: str, method: str = "echo", arguments: Dict = None, connections: int = 1, concurrency: int = 1,
+
+                   rate: float = 0, duration: float = 10, requests: int = -1, timeout: float = 5,
+
+                   report_interval: float = 0, as_json: bool = False, **client_kwargs) -> Dict[str, Any]:
+
+    """Opens `connections` clients with `concurrency` callers each; `rate` is calls per second in total, 0 for as fast as possible"""
+
+    template = arguments if arguments is not None else {"text": "hello {i}"}
+
+    clients = [WebSocketRpcClient(uri, retry_config=False, **client_kwargs) for _ in range(connections)]
+
+    await asyncio.gather(*(client.__aenter__() for client in clients))
+
+    stats = LoadStats()
+
+    pacer = _Pacer(rate) if rate > 0 else None
+
+    remaining = [requests]
+
+    live = asyncio.create_task(_live_report(stats, report_interval, as_json)) if report_interval > 0 else None
+
+    try:
+
+        await asyncio.gather(*(_caller(client, method, template, index, caller, stats, time.monotonic() + duration,
+
+                                       remaining, pacer, timeout)
+
+                               for index, client in enumerate(clients) for caller in range(concurrency)))
+
+    finally:
+
+        if live is not None: live.cancel()
+
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+    return stats.report()
+
+
+
+class EchoServer:
+
+    """Reference server for RpcUtilityMethods (echo, get_process_details) on a ws://, tcp:// or unix:// uri"""
+
+
+
+    def __init__(self, uri: str):
+
+        self.uri = uri
+
+        self._server = None
+
+        self._task = None
+
+
+
+    async def serve(self):
+
+        if is_stream_uri(self.uri):
+
+            self._server = StreamRpcServer(RpcUtilityMethods())
+
+            return await self._server.serve_forever(self.uri)
+
+        import uvicorn
+
+        from fastapi import FastAPI
+
+        from .websocket_rpc_endpoint import WebsocketRPCEndpoint
+
+        parts = urlsplit(self.uri)
+
+        app = FastAPI()
+
+        WebsocketRPCEndpoint(RpcUtilityMethods()).register_route(app, parts.path or "/ws")
+
+        self._server = uvicorn.Server(uvicorn.Config(app, host=parts.hostname, port=parts.port, log_level="warning",
+
+                                                     loop=event_loop.loop_name()))
+
+        await self._server.serve()
+
+
+
+    def start(self):
+
+        self._task = asyncio.create_task(self.serve())
+
+
+
+    async def stop(self):
+
+        if isinstance(self._server, StreamRpcServer):
+
+            await self._server.close()
+
+            self._task.cancel()
+
+        elif self._server is not None:
+
+            self._server.should_exit = True
+
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+
+def print_report(report: Dict[str, Any]):
+
+    latency = report["latency"]
+
+    print(f"completed   {report['completed']} in {report['elapsed_s']}s ({report['throughput_per_s']}/s)")
+
+    print(f"latency ms  mean {latency['mean_ms']}  p50 {latency['p50_ms']}  p90 {latency['p90_ms']}  "
+
+          f"p99 {latency['p99_ms']}  p99.9 {latency['p999_ms']}  max {latency['max_ms']}")
+
+    print(f"timeouts    {report['timeouts']}")
+
+    print(f"errors      {report['errors'] or '-'}")
+
+
+
+async def _run(args):
+
+    server = None
+
+    if args.serve:
+
+        server = EchoServer(args.uri)
+
+        server.start()
+
+        await asyncio.sleep(args.serve_startup)
+
+    try:
+
+        report = await run_load(args.uri, args.method, json.loads(args.args), args.connections, args.concurrency,
+
+                                args.rate, args.duration, args.requests, args.timeout, args.report_interval, args.json)
+
+    finally:
+
+        if server is not None: await server.stop()
+
+    if args.json:
+
+        print(json.dumps(report, indent=2))
+
+    else:
+
+        print_report(report)
+
+
+
+def main(argv: List[str] = None):
+
+    parser = argparse.ArgumentParser(prog="fasterpc-loadgen", description="Load generator for fasterpc endpoints")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="call a method on an endpoint and report throughput and latency")
+
+    run.add_argument("uri", help="ws://host:port/path, tcp://host:port or unix:///path")
+
+    run.add_argument("--method", default="echo")
+
+    run.add_argument("--args", default='{"text": "hello {i}"}',
+
+                     help="JSON arguments; strings may use {i}, {connection} and {caller}")
+
+    run.add_argument("-c", "--connections", type=int, default=1)
+
+    run.add_argument("-m", "--concurrency", type=int, default=1, help="concurrent callers per connection")
+
+    run.add_argument("--rate", type=float, default=0, help="calls per second in total, 0 for as fast as possible")
+
+    run.add_argument("-d", "--duration", type=float, default=10, help="seconds to run")
+
+    run.add_argument("-n", "--requests", type=int, default=-1, help="stop after this many calls")
+
+    run.add_argument("--timeout", type=float, default=5, help="per-call timeout in seconds")
+
+    run.add_argument("--report-interval", type=float, default=1, help="seconds between live reports, 0 to disable")
+
+    run.add_argument("--json", action="store_true", help="print the final report as JSON")
+
+    run.add_argument("--serve", action="store_true", help="start a local echo server on the uri first")
+
+    run.add_argument("--serve-startup", type=float, default=1, help="seconds to wait for the local server")
+
+    serve = commands.add_parser("serve", help="run a reference echo server (RpcUtilityMethods)")
+
+    serve.add_argument("uri", help="ws://host:port/path, tcp://host:port or unix:///path")
+
+    for command in (run, serve):
+
+        command.add_argument("--loop", choices=event_loop.LOOPS, default=None,
+
+                             help=f"event loop, defaults to ${event_loop.ENV_VAR} or auto (uvloop when installed)")
+
+    args = parser.parse_args(argv)
+
+    logging_config.set_mode(LoggingModes.NO_LOGS)
+
+    try:
+
+        event_loop.run(_run(args) if args.command == "run" else EchoServer(args.uri).serve(), args.loop)
+
+    except KeyboardInterrupt:
+
+        pass
+
+
+
+if __name__ == "__main__":
+
+    main()
+
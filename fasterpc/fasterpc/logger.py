@@ -1,12 +1,20 @@
+import atexit
+
 import logging
 
+import queue
+
+import time
+
 from logging.config import dictConfig
 
+from logging.handlers import QueueHandler, QueueListener
+
 import os
 
 from enum import Enum
 
-from typing import NewType
+from typing import Dict, NewType, Tuple
 
 
 
@@ -24,18 +32,114 @@ class LoggingModes(Enum):
 
     LOGURU = 3
 
+    # records go through a queue to a background thread - nothing is formatted or written on the event loop
+
+    QUEUED = 4
+
 
 
 LoggingMode = NewType('LoggingMode', LoggingModes)
 
 
 
+class RateLimitFilter(logging.Filter):
+
+    """
+
+    Lets through `burst` records per message template (the unformatted message - %-style calls share one) every
+
+    `interval` seconds and drops the rest; the next record let through reports how many were dropped.
+
+    """
+
+
+
+    MAX_TRACKED = 1024
+
+
+
+    def __init__(self, burst: int = 10, interval: float = 1.0):
+
+        super().__init__()
+
+        self.burst = burst
+
+        self.interval = interval
+
+        # (logger, level, template) -> [window start, records in window, suppressed]
+
+        self._windows: Dict[Tuple[str, int, str], list] = {}
+
+
+
+    def filter(self, record: logging.LogRecord) -> bool:
+
+        key = (record.name, record.levelno, str(record.msg))
+
+        now = time.monotonic()
+
+        window = self._windows.get(key)
+
+        if window is None:
+
+            if len(self._windows) >= self.MAX_TRACKED: self._windows.clear()
+
+            window = self._windows[key] = [now, 0, 0]
+
+        elif now - window[0] >= self.interval:
+
+            window[0], window[1] = now, 0
+
+        if window[1] >= self.burst:
+
+            window[2] += 1
+
+            return False
+
+        window[1] += 1
+
+        if window[2]:
+
+            record.suppressed = window[2]
+
+            window[2] = 0
+
+        return True
+
+
+
+class LazyQueueHandler(QueueHandler):
+
+    """Enqueues records as they are - message formatting and tracebacks are left to the listener thread"""
+
+
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        return record
+
+
+
+class SuppressedCountFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+
+        text = super().format(record)
+
+        suppressed = getattr(record, "suppressed", 0)
+
+        return f"{text} (suppressed {suppressed} similar messages)" if suppressed else text
+
+
+
 class LoggingConfig:
 
     def __init__(self) -> None:
 
         self._mode = None
 
+        self._listener: QueueListener = None
+
 
 
     config_template = {
@@ -100,10 +204,16 @@ class LoggingConfig:
 
 
 
-    def set_mode(self, mode: LoggingMode = LoggingModes.UVICORN, level=logging.INFO):
+    def set_mode(self, mode: LoggingMode = LoggingModes.UVICORN, level=logging.INFO, rate_limit_burst: int = 10,
+
+                 rate_limit_interval: float = 1.0):
+
+        """rate_limit_*: only for QUEUED mode, see RateLimitFilter (a burst of 0 disables it)"""
 
         self._mode = mode
 
+        self._stop_listener()
+
         logging_config = self.config_template.copy()
 
         if mode == LoggingModes.UVICORN:
@@ -120,10 +230,114 @@ class LoggingConfig:
 
             dictConfig(logging_config)
 
+        elif mode == LoggingModes.QUEUED:
+
+            self._start_listener(level, rate_limit_burst, rate_limit_interval)
+
+
+
+    def _start_listener(self, level, rate_limit_burst: int, rate_limit_interval: float):
+
+        # SimpleQueue: put() takes no Python-level lock, so the loop never waits on the writer thread
+
+        records = queue.SimpleQueue()
+
+        handler = LazyQueueHandler(records)
+
+        if rate_limit_burst > 0: handler.addFilter(RateLimitFilter(rate_limit_burst, rate_limit_interval))
+
+        output = logging.StreamHandler()
+
+        output.setFormatter(SuppressedCountFormatter("%(levelname)s:     %(asctime)s %(name)s %(message)s", "%Y-%m-%d %H:%M:%S"))
+
+        root = logging.getLogger("fasterpc")
+
+        for existing in list(root.handlers): root.removeHandler(existing)
+
+        root.addHandler(handler)
+
+        root.setLevel(level)
+
+        root.propagate = False
+
+        # loggers already handed out may have been disabled by an earlier dictConfig
+
+        for name, child in logging.root.manager.loggerDict.items():
+
+            if name.startswith("fasterpc.") and isinstance(child, logging.Logger): child.disabled = False
+
+        self._listener = QueueListener(records, output, respect_handler_level=True)
+
+        self._listener.start()
+
+
+
+    def _stop_listener(self):
+
+        if self._listener is not None:
+
+            # flushes what is still queued
+
+            self._listener.stop()
+
+            self._listener = None
+
+            root = logging.getLogger("fasterpc")
+
+            for handler in list(root.handlers):
+
+                if isinstance(handler, LazyQueueHandler): root.removeHandler(handler)
+
+            root.propagate = True
+
+            root.setLevel(logging.NOTSET)
+
+
+
+    def flush(self):
+
+        """Waits until the QUEUED mode's thread wrote everything logged so far"""
+
+        if self._listener is not None:
+
+            self._listener.stop()
+
+            self._listener.start()
+
 
 
 logging_config = LoggingConfig()
 
+atexit.register(logging_config._stop_listener)
+
+
+
+class _LoguruAdapter:
+
+    """Takes the %-style calls used throughout fasterpc; loguru itself formats with str.format()"""
+
+
+
+    def __init__(self, logger):
+
+        self._logger = logger
+
+
+
+    def __getattr__(self, level):
+
+        # the logging keywords fasterpc passes, in loguru's terms
+
+        def call(message, *args, exc_info=None, extra=None, stacklevel=1, **kwargs):
+
+            logger = self._logger.opt(depth=stacklevel, exception=exc_info or None)
+
+            if extra: logger = logger.bind(**extra)
+
+            getattr(logger, level)(str(message) % args if args else message)
+
+        return call
+
 
 
 def get_logger(name):
@@ -134,6 +348,8 @@ def get_logger(name):
 
         from loguru import logger
 
+        logger = _LoguruAdapter(logger)
+
     else:
 
         logger = logging.getLogger(f"fasterpc.{name}")
@@ -0,0 +1,112 @@
+import asyncio
+
+import os
+
+import sys
+
+from typing import Any, Coroutine
+
+
+
+from .logger import get_logger
+
+
+
+logger = get_logger("RPC_LOOP")
+
+
+
+try:
+
+    import uvloop
+
+except ImportError:
+
+    uvloop = None
+
+
+
+# the one place the event loop is chosen: an explicit name, else $FASTERPC_LOOP, else "auto"
+
+ENV_VAR = "FASTERPC_LOOP"
+
+LOOPS = ("auto", "asyncio", "uvloop")
+
+
+
+def resolve_loop(name: str = None) -> str:
+
+    name = (name or os.environ.get(ENV_VAR) or "auto").lower()
+
+    if name not in LOOPS:
+
+        raise ValueError(f"Unknown event loop {name!r}, expected one of {LOOPS}")
+
+    if name == "auto":
+
+        return "uvloop" if uvloop is not None else "asyncio"
+
+    if name == "uvloop" and uvloop is None:
+
+        raise RuntimeError("uvloop was requested but is not installed (pip install fasterpc[uvloop])")
+
+    return name
+
+
+
+def new_event_loop(name: str = None) -> asyncio.AbstractEventLoop:
+
+    return uvloop.new_event_loop() if resolve_loop(name) == "uvloop" else asyncio.new_event_loop()
+
+
+
+def install(name: str = None) -> str:
+
+    """Makes the selected loop the default for asyncio.run() and friends; returns its name"""
+
+    resolved = resolve_loop(name)
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy() if resolved == "uvloop" else asyncio.DefaultEventLoopPolicy())
+
+    return resolved
+
+
+
+def run(main: Coroutine, loop: str = None) -> Any:
+
+    """asyncio.run() on the selected loop"""
+
+    if sys.version_info >= (3, 11):
+
+        with asyncio.Runner(loop_factory=lambda: new_event_loop(loop)) as runner:
+
+            return runner.run(main)
+
+    previous = asyncio.get_event_loop_policy()
+
+    install(loop)
+
+    try:
+
+        return asyncio.run(main)
+
+    finally:
+
+        asyncio.set_event_loop_policy(previous)
+
+
+
+def uvicorn_loop(name: str = None) -> str:
+
+    """Value for uvicorn's `loop` setting"""
+
+    return resolve_loop(name)
+
+
+
+def loop_name(loop: asyncio.AbstractEventLoop = None) -> str:
+
+    loop = loop or asyncio.get_running_loop()
+
+    return "uvloop" if uvloop is not None and isinstance(loop, uvloop.Loop) else "asyncio"
+
@@ -0,0 +1,116 @@
+from collections import deque
+
+from typing import Any, Deque, List
+
+
+
+from .schemas import RpcPriority
+
+
+
+class PriorityLanes:
+
+    def __init__(self, lanes: int = len(RpcPriority), starvation_limit: int = 16):
+
+        self._lanes: List[Deque[Any]] = [deque() for _ in range(lanes)]
+
+        # how many times a waiting lane was passed over for a more urgent one
+
+        self._skipped = [0] * lanes
+
+        self.starvation_limit = starvation_limit
+
+        self._size = 0
+
+
+
+    def __len__(self):
+
+        return self._size
+
+
+
+    def _lane(self, priority):
+
+        if priority is None:
+
+            return RpcPriority.NORMAL
+
+        return min(max(int(priority), 0), len(self._lanes) - 1)
+
+
+
+    def put(self, priority, item):
+
+        self._lanes[self._lane(priority)].append(item)
+
+        self._size += 1
+
+
+
+    # Removes and returns the first item matching `predicate`, None if there is none
+
+    def remove(self, predicate):
+
+        for lane in self._lanes:
+
+            for item in lane:
+
+                if predicate(item):
+
+                    lane.remove(item)
+
+                    self._size -= 1
+
+                    return item
+
+        return None
+
+
+
+    def has_urgent(self, max_priority) -> bool:
+
+        return any(self._lanes[lane] for lane in range(self._lane(max_priority) + 1))
+
+
+
+    # Most urgent item first, unless a lower lane waited `starvation_limit` pops; None when empty
+
+    def pop(self, max_priority=None):
+
+        last = len(self._lanes) - 1 if max_priority is None else self._lane(max_priority)
+
+        chosen = None
+
+        for lane in range(last + 1):
+
+            if not self._lanes[lane]:
+
+                continue
+
+            if chosen is None:
+
+                chosen = lane
+
+            elif self._skipped[lane] >= self.starvation_limit:
+
+                chosen = lane
+
+                break
+
+        if chosen is None:
+
+            return None
+
+        for lane in range(last + 1):
+
+            if lane != chosen and self._lanes[lane]:
+
+                self._skipped[lane] += 1
+
+        self._skipped[chosen] = 0
+
+        self._size -= 1
+
+        return self._lanes[chosen].popleft()
+
@@ -0,0 +1,250 @@
+import cProfile
+
+import json
+
+import os
+
+import random
+
+import time
+
+from collections import deque
+
+from typing import Any, Deque, Dict, Optional
+
+
+
+from .logger import get_logger
+
+from .schemas import RpcRequest
+
+
+
+logger = get_logger("RPC_PROFILE")
+
+
+
+PHASES = ("parse", "dispatch", "handler", "serialize", "send")
+
+
+
+class CallTiming:
+
+    __slots__ = ("request", "frame_size", "started_at") + PHASES
+
+
+
+    def __init__(self, request: RpcRequest, parse: float = 0.0, frame_size: int = 0):
+
+        self.request = request
+
+        self.frame_size = frame_size
+
+        self.started_at = time.perf_counter()
+
+        self.parse = parse
+
+        self.dispatch = self.handler = self.serialize = self.send = 0.0
+
+
+
+    @property
+
+    def total(self) -> float:
+
+        return sum(getattr(self, phase) for phase in PHASES)
+
+
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        arguments = self.request.arguments or {}
+
+        return {"method": self.request.method, "call_id": self.request.call_id, "frame_bytes": self.frame_size,
+
+                "arg_bytes": {name: len(json.dumps(value, default=repr)) for name, value in arguments.items()},
+
+                "total_ms": round(self.total * 1000, 3),
+
+                "phases_ms": {phase: round(getattr(self, phase) * 1000, 3) for phase in PHASES}}
+
+
+
+class CallProfiler:
+
+    """
+
+    Per-phase timing of inbound calls: parse, dispatch (queued), handler, serialize and send.
+
+    Set on a channel (`channel.profiler = ...`, or `profiler=` on the endpoint); channels without one skip all of it.
+
+    """
+
+
+
+    def __init__(self, slow_threshold: float = 1.0, max_slow_calls: int = 100):
+
+        self.slow_threshold = slow_threshold
+
+        # most recent calls over the threshold, newest last
+
+        self.slow_calls: Deque[Dict[str, Any]] = deque(maxlen=max_slow_calls)
+
+        self._timings: Dict[Any, CallTiming] = {}
+
+        self._profile_method = None
+
+        self._profile_fraction = 0.0
+
+        self._profile_directory = "."
+
+        self._profiling = False
+
+
+
+    # cProfile the handlers of `method` (all methods if None) for a `fraction` of calls, dumping .pstats files.
+
+    # cProfile sees the whole thread, so other tasks running during the handler's awaits show up as well.
+
+    def enable_profiling(self, method: str = None, fraction: float = 1.0, directory: str = "."):
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._profile_method = method
+
+        self._profile_fraction = fraction
+
+        self._profile_directory = directory
+
+
+
+    def disable_profiling(self):
+
+        self._profile_fraction = 0.0
+
+
+
+    @staticmethod
+
+    def _key(request: RpcRequest):
+
+        return request.call_id if request.call_id is not None else id(request)
+
+
+
+    # `parsed` is (parse seconds, frame size) when the channel measured them. The timing only exists while the
+
+    # call runs, so requests dropped before it (cancelled while queued, channel closed) leave nothing behind.
+
+    async def on_request(self, channel, request: RpcRequest, received_at: float = None, parsed=None):
+
+        key = self._key(request)
+
+        timing = self._timings[key] = CallTiming(request, *(parsed or ()))
+
+        if received_at is not None:
+
+            timing.dispatch = time.monotonic() - received_at
+
+        try:
+
+            return await channel.on_request(request, received_at)
+
+        finally:
+
+            self._timings.pop(key, None)
+
+            if timing.total >= self.slow_threshold:
+
+                record = timing.to_dict()
+
+                self.slow_calls.append(record)
+
+                logger.warning("Slow call on channel %s: %s", channel.id, json.dumps(record))
+
+
+
+    def _should_profile(self, method: str) -> bool:
+
+        if self._profile_fraction <= 0 or self._profiling:
+
+            return False
+
+        if self._profile_method is not None and method != self._profile_method:
+
+            return False
+
+        return self._profile_fraction >= 1 or random.random() < self._profile_fraction
+
+
+
+    async def run_handler(self, channel, method, request: RpcRequest, received_at: float = None):
+
+        timing = self._timings.get(self._key(request))
+
+        profile = None
+
+        if self._should_profile(request.method):
+
+            # one at a time - cProfile can't nest
+
+            self._profiling = True
+
+            profile = cProfile.Profile()
+
+            profile.enable()
+
+        start = time.perf_counter()
+
+        try:
+
+            return await channel._run_handler(method, request, received_at)
+
+        finally:
+
+            if timing is not None: timing.handler = time.perf_counter() - start
+
+            if profile is not None:
+
+                profile.disable()
+
+                self._profiling = False
+
+                path = os.path.join(self._profile_directory, f"{request.method}-{request.call_id or 'call'}-{int(time.time() * 1000)}.pstats")
+
+                profile.dump_stats(path)
+
+                logger.info("Profiled %s call %s into %s", request.method, request.call_id, path)
+
+
+
+    async def send(self, channel, response, request: RpcRequest):
+
+        socket = channel.socket
+
+        if getattr(socket, "on_serialized", False) is None:
+
+            socket.on_serialized = self._on_serialized
+
+        start = time.perf_counter()
+
+        await channel.send(response, priority=request.priority)
+
+        timing = self._timings.get(self._key(request))
+
+        if timing is not None:
+
+            timing.send = time.perf_counter() - start - timing.serialize
+
+
+
+    def _on_serialized(self, msg, seconds: float):
+
+        response = getattr(msg, "response", None)
+
+        timing = self._timings.get(response.call_id) if response is not None else None
+
+        if timing is not None:
+
+            timing.serialize = seconds
+
@@ -1,5 +1,7 @@
 import asyncio
 
+import functools
+
 
 
 import logging
@@ -36,7 +38,7 @@ class ProxyEnabledWebSocketClientHandler(SimpleWebSocket):
 
         try:
 
-            self._websocket = await asyncio.get_event_loop().run_in_executor(
+            self._websocket = await asyncio.get_running_loop().run_in_executor(
 
                 None, 
 
@@ -46,7 +48,7 @@ class ProxyEnabledWebSocketClientHandler(SimpleWebSocket):
 
         except Exception as e:
 
-            logger.error(f"Proxy connection failed: {e}")
+            logger.error("Proxy connection failed: %s", e)
 
             raise
 
@@ -54,7 +56,7 @@ class ProxyEnabledWebSocketClientHandler(SimpleWebSocket):
 
         if self._websocket:
 
-            await asyncio.get_event_loop().run_in_executor(None, self._websocket.send, msg)
+            await asyncio.get_running_loop().run_in_executor(None, self._websocket.send, msg)
 
     async def recv(self):
 
@@ -64,7 +66,7 @@ class ProxyEnabledWebSocketClientHandler(SimpleWebSocket):
 
         try:
 
-            return await asyncio.get_event_loop().run_in_executor(None, self._websocket.recv)
+            return await asyncio.get_running_loop().run_in_executor(None, self._websocket.recv)
 
         except (websocket.WebSocketConnectionClosedException, BrokenPipeError):
 
@@ -74,4 +76,4 @@ class ProxyEnabledWebSocketClientHandler(SimpleWebSocket):
 
         if self._websocket:
 
-            await asyncio.get_event_loop().run_in_executor(None, self._websocket.close, code=code)
+            await asyncio.get_running_loop().run_in_executor(None, functools.partial(self._websocket.close, status=code))
@@ -0,0 +1,712 @@
+import asyncio
+
+import json
+
+import os
+
+from abc import ABC, abstractmethod
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+
+from .framing import encode_frame, read_frame
+
+from .logger import get_logger
+
+from .rpc_channel import (HANDLER_ERROR, RpcChannelClosedException, RpcOverloadedException, RpcRemoteError,
+
+                          RpcTimeoutException)
+
+from .schemas import RpcResponse
+
+from .utils import gen_uid, pydantic_parse, pydantic_serialize
+
+
+
+logger = get_logger("RPC_ROUTING")
+
+
+
+WorkerHandler = Callable[[Dict], Awaitable[Dict]]
+
+
+
+class ChannelNotFoundException(LookupError):
+
+    pass
+
+
+
+# what a forwarded call may fail with, raised again as the same type on the calling worker
+
+_FORWARDED_ERRORS = {cls.__name__: cls for cls in (RpcOverloadedException, RpcRemoteError, RpcTimeoutException,
+
+                                                   RpcChannelClosedException)}
+
+
+
+def _error_reply(error: Exception) -> Dict:
+
+    name = next(cls.__name__ for cls in type(error).__mro__ if cls.__name__ in _FORWARDED_ERRORS)
+
+    if isinstance(error, RpcRemoteError):
+
+        return {"error": "call_failed", "type": name, "details": error.error}
+
+    return {"error": "call_failed", "type": name, "message": str(error)}
+
+
+
+def _raise_error_reply(reply: Dict, worker_id: str):
+
+    if reply["error"] == "call_failed" and reply.get("type") in _FORWARDED_ERRORS:
+
+        cls = _FORWARDED_ERRORS[reply["type"]]
+
+        raise cls(reply["details"]) if issubclass(cls, RpcRemoteError) else cls(reply["message"])
+
+    # the worker itself failed (an unknown op, a bug) - reported like a failing method
+
+    raise RpcRemoteError({"code": HANDLER_ERROR, "message": f"Worker {worker_id} failed the call: {reply['error']}"})
+
+
+
+class ChannelRegistry(ABC):
+
+    @abstractmethod
+
+    def add_worker(self, worker_id: str):
+
+        pass
+
+
+
+    @abstractmethod
+
+    def remove_worker(self, worker_id: str):
+
+        pass
+
+
+
+    @abstractmethod
+
+    def workers(self) -> List[str]:
+
+        pass
+
+
+
+    @abstractmethod
+
+    def register(self, channel_id: str, worker_id: str):
+
+        pass
+
+
+
+    @abstractmethod
+
+    def unregister(self, channel_id: str):
+
+        pass
+
+
+
+    @abstractmethod
+
+    def lookup(self, channel_id: str) -> Optional[str]:
+
+        pass
+
+
+
+class InMemoryChannelRegistry(ChannelRegistry):
+
+    def __init__(self):
+
+        self._workers = set()
+
+        self._channels: Dict[str, str] = {}
+
+
+
+    def add_worker(self, worker_id: str):
+
+        self._workers.add(worker_id)
+
+
+
+    def remove_worker(self, worker_id: str):
+
+        self._workers.discard(worker_id)
+
+        for channel_id in [c for c, w in self._channels.items() if w == worker_id]:
+
+            del self._channels[channel_id]
+
+
+
+    def workers(self) -> List[str]:
+
+        return sorted(self._workers)
+
+
+
+    def register(self, channel_id: str, worker_id: str):
+
+        self._channels[channel_id] = worker_id
+
+
+
+    def unregister(self, channel_id: str):
+
+        self._channels.pop(channel_id, None)
+
+
+
+    def lookup(self, channel_id: str) -> Optional[str]:
+
+        return self._channels.get(channel_id)
+
+
+
+class FileChannelRegistry(ChannelRegistry):
+
+    """Shares the registry between processes on one host: one small file per worker and per channel."""
+
+
+
+    def __init__(self, directory: str):
+
+        self._workers_dir = os.path.join(directory, "workers")
+
+        self._channels_dir = os.path.join(directory, "channels")
+
+        os.makedirs(self._workers_dir, exist_ok=True)
+
+        os.makedirs(self._channels_dir, exist_ok=True)
+
+
+
+    @staticmethod
+
+    def _write(path: str, content: str):
+
+        # rename is atomic, readers never see a half-written entry
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        with open(tmp_path, "w") as f:
+
+            f.write(content)
+
+        os.replace(tmp_path, path)
+
+
+
+    @staticmethod
+
+    def _remove(path: str):
+
+        try:
+
+            os.unlink(path)
+
+        except FileNotFoundError:
+
+            pass
+
+
+
+    def add_worker(self, worker_id: str):
+
+        self._write(os.path.join(self._workers_dir, worker_id), worker_id)
+
+
+
+    def remove_worker(self, worker_id: str):
+
+        self._remove(os.path.join(self._workers_dir, worker_id))
+
+        for channel_id in os.listdir(self._channels_dir):
+
+            if self.lookup(channel_id) == worker_id:
+
+                self.unregister(channel_id)
+
+
+
+    def workers(self) -> List[str]:
+
+        return sorted(name for name in os.listdir(self._workers_dir) if not name.endswith(".tmp"))
+
+
+
+    def register(self, channel_id: str, worker_id: str):
+
+        self._write(os.path.join(self._channels_dir, channel_id), worker_id)
+
+
+
+    def unregister(self, channel_id: str):
+
+        self._remove(os.path.join(self._channels_dir, channel_id))
+
+
+
+    def lookup(self, channel_id: str) -> Optional[str]:
+
+        try:
+
+            with open(os.path.join(self._channels_dir, channel_id)) as f:
+
+                return f.read() or None
+
+        except FileNotFoundError:
+
+            return None
+
+
+
+class WorkerTransport(ABC):
+
+    @abstractmethod
+
+    async def start(self, worker_id: str, handler: WorkerHandler):
+
+        pass
+
+
+
+    @abstractmethod
+
+    async def request(self, worker_id: str, body: Dict, timeout: float = None) -> Dict:
+
+        pass
+
+
+
+    @abstractmethod
+
+    async def close(self):
+
+        pass
+
+
+
+class InMemoryWorkerTransport(WorkerTransport):
+
+    """Connects routers living in one process (tests); routers sharing a `hub` dict see each other."""
+
+
+
+    def __init__(self, hub: Dict[str, WorkerHandler]):
+
+        self._hub = hub
+
+        self._worker_id = None
+
+
+
+    async def start(self, worker_id: str, handler: WorkerHandler):
+
+        self._worker_id = worker_id
+
+        self._hub[worker_id] = handler
+
+
+
+    async def request(self, worker_id: str, body: Dict, timeout: float = None) -> Dict:
+
+        handler = self._hub.get(worker_id)
+
+        if handler is None:
+
+            raise ConnectionError(f"Worker {worker_id} is not reachable")
+
+        # round-trip through JSON like the real transports do
+
+        return json.loads(json.dumps(await asyncio.wait_for(handler(json.loads(json.dumps(body))), timeout)))
+
+
+
+    async def close(self):
+
+        if self._worker_id is not None:
+
+            self._hub.pop(self._worker_id, None)
+
+
+
+class _PeerConnection:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        self._writer = writer
+
+        self._waiters: Dict[str, asyncio.Future] = {}
+
+        self._lock = asyncio.Lock()
+
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+
+
+    @property
+
+    def closed(self) -> bool:
+
+        return self._reader_task.done()
+
+
+
+    async def _read(self, reader: asyncio.StreamReader):
+
+        try:
+
+            while True:
+
+                frame = await read_frame(reader)
+
+                if frame is None:
+
+                    break
+
+                reply = json.loads(frame)
+
+                waiter = self._waiters.pop(reply["id"], None)
+
+                if waiter is not None and not waiter.done():
+
+                    waiter.set_result(reply["body"])
+
+        finally:
+
+            for waiter in self._waiters.values():
+
+                if not waiter.done(): waiter.set_exception(ConnectionError("Worker connection lost"))
+
+            self._waiters.clear()
+
+            self._writer.close()
+
+
+
+    async def request(self, body: Dict, timeout: float = None) -> Dict:
+
+        request_id = gen_uid()
+
+        waiter = self._waiters[request_id] = asyncio.get_running_loop().create_future()
+
+        try:
+
+            async with self._lock:
+
+                self._writer.write(encode_frame(json.dumps({"id": request_id, "body": body}).encode()))
+
+                await self._writer.drain()
+
+            return await asyncio.wait_for(waiter, timeout)
+
+        finally:
+
+            self._waiters.pop(request_id, None)
+
+
+
+    def close(self):
+
+        self._reader_task.cancel()
+
+
+
+class UnixSocketWorkerTransport(WorkerTransport):
+
+    """Each worker listens on `<directory>/<worker_id>.sock`; requests are length-prefixed JSON frames."""
+
+
+
+    def __init__(self, directory: str):
+
+        self._directory = directory
+
+        self._server = None
+
+        self._handler = None
+
+        self._path = None
+
+        self._peers: Dict[str, _PeerConnection] = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+
+
+    def _socket_path(self, worker_id: str) -> str:
+
+        return os.path.join(self._directory, f"{worker_id}.sock")
+
+
+
+    async def start(self, worker_id: str, handler: WorkerHandler):
+
+        self._handler = handler
+
+        self._path = self._socket_path(worker_id)
+
+        if os.path.exists(self._path):
+
+            os.unlink(self._path)
+
+        self._server = await asyncio.start_unix_server(self._serve, self._path)
+
+
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+
+        lock = asyncio.Lock()
+
+        try:
+
+            while True:
+
+                frame = await read_frame(reader)
+
+                if frame is None:
+
+                    break
+
+                # requests on one connection are answered concurrently
+
+                asyncio.create_task(self._answer(json.loads(frame), writer, lock))
+
+        finally:
+
+            writer.close()
+
+
+
+    async def _answer(self, request: Dict, writer: asyncio.StreamWriter, lock: asyncio.Lock):
+
+        try:
+
+            body = await self._handler(request["body"])
+
+        except Exception as e:
+
+            logger.exception("Failed handling a request from another worker")
+
+            body = {"error": repr(e)}
+
+        async with lock:
+
+            writer.write(encode_frame(json.dumps({"id": request["id"], "body": body}).encode()))
+
+            await writer.drain()
+
+
+
+    async def _peer(self, worker_id: str) -> _PeerConnection:
+
+        peer = self._peers.get(worker_id)
+
+        if peer is None or peer.closed:
+
+            reader, writer = await asyncio.open_unix_connection(self._socket_path(worker_id))
+
+            peer = self._peers[worker_id] = _PeerConnection(reader, writer)
+
+        return peer
+
+
+
+    async def request(self, worker_id: str, body: Dict, timeout: float = None) -> Dict:
+
+        peer = await self._peer(worker_id)
+
+        return await peer.request(body, timeout)
+
+
+
+    async def close(self):
+
+        for peer in self._peers.values():
+
+            peer.close()
+
+        self._peers.clear()
+
+        if self._server is not None:
+
+            self._server.close()
+
+            await self._server.wait_closed()
+
+        if self._path is not None and os.path.exists(self._path):
+
+            os.unlink(self._path)
+
+
+
+class WorkerRouter:
+
+    def __init__(self, manager, registry: ChannelRegistry, transport: WorkerTransport, worker_id: str = None):
+
+        self.manager = manager
+
+        self.registry = registry
+
+        self.transport = transport
+
+        self.worker_id = worker_id or f"{os.getpid()}-{gen_uid()[:8]}"
+
+        manager.router = self
+
+
+
+    async def start(self):
+
+        await self.transport.start(self.worker_id, self._handle)
+
+        self.registry.add_worker(self.worker_id)
+
+        for channel in self.manager.channels.values():
+
+            self.on_channel_registered(channel)
+
+
+
+    async def close(self):
+
+        self.registry.remove_worker(self.worker_id)
+
+        await self.transport.close()
+
+
+
+    def on_channel_registered(self, channel):
+
+        self.registry.register(channel.id, self.worker_id)
+
+
+
+    def on_channel_unregistered(self, channel):
+
+        self.registry.unregister(channel.id)
+
+
+
+    async def call(self, channel_id: str, method: str, args: Dict[str, Any] = None, timeout: float = None) -> RpcResponse:
+
+        channel = self.manager.channels.get(channel_id)
+
+        if channel is not None:
+
+            return await channel.call(method, args or {}, timeout=timeout)
+
+        worker_id = self.registry.lookup(channel_id)
+
+        if worker_id is None or worker_id == self.worker_id:
+
+            raise ChannelNotFoundException(f"No worker holds channel {channel_id}")
+
+        try:
+
+            reply = await self.transport.request(worker_id, {"op": "call", "channel_id": channel_id, "method": method,
+
+                                                            "args": args or {}, "timeout": timeout}, timeout=timeout)
+
+        except ConnectionError as e:
+
+            raise ChannelNotFoundException(f"Worker {worker_id} holding channel {channel_id} is unreachable") from e
+
+        except asyncio.TimeoutError:
+
+            raise RpcTimeoutException(f"No RPC response for {method} on channel {channel_id} within {timeout}s")
+
+        if "error" in reply:
+
+            if reply["error"] == "not_found":
+
+                raise ChannelNotFoundException(f"Worker {worker_id} no longer holds channel {channel_id}")
+
+            _raise_error_reply(reply, worker_id)
+
+        return pydantic_parse(RpcResponse, reply["response"])
+
+
+
+    async def _broadcast_local(self, method: str, args: Dict[str, Any], timeout: float = None) -> int:
+
+        channels = list(self.manager.channels.values())
+
+        results = await asyncio.gather(*(channel.call(method, args, timeout=timeout) for channel in channels),
+
+                                       return_exceptions=True)
+
+        return sum(1 for result in results if not isinstance(result, BaseException))
+
+
+
+    # Calls `method` on every channel of every worker; returns how many calls succeeded
+
+    async def broadcast(self, method: str, args: Dict[str, Any] = None, timeout: float = None) -> int:
+
+        args = args or {}
+
+        body = {"op": "broadcast", "method": method, "args": args, "timeout": timeout}
+
+        others = [worker_id for worker_id in self.registry.workers() if worker_id != self.worker_id]
+
+        results = await asyncio.gather(self._broadcast_local(method, args, timeout),
+
+                                       *(self.transport.request(worker_id, body, timeout=timeout) for worker_id in others),
+
+                                       return_exceptions=True)
+
+        delivered = results[0] if not isinstance(results[0], BaseException) else 0
+
+        for worker_id, reply in zip(others, results[1:]):
+
+            if isinstance(reply, BaseException):
+
+                logger.warning("Broadcast to worker %s failed: %r", worker_id, reply)
+
+            else:
+
+                delivered += reply.get("delivered", 0)
+
+        return delivered
+
+
+
+    async def _handle(self, body: Dict) -> Dict:
+
+        op = body.get("op")
+
+        if op == "call":
+
+            channel = self.manager.channels.get(body["channel_id"])
+
+            if channel is None:
+
+                return {"error": "not_found"}
+
+            try:
+
+                response = await channel.call(body["method"], body.get("args") or {}, timeout=body.get("timeout"))
+
+            except tuple(_FORWARDED_ERRORS.values()) as e:
+
+                return _error_reply(e)
+
+            return {"response": json.loads(pydantic_serialize(response))}
+
+        if op == "broadcast":
+
+            return {"delivered": await self._broadcast_local(body["method"], body.get("args") or {}, body.get("timeout"))}
+
+        return {"error": f"unknown op {op!r}"}
+
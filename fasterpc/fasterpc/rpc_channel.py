@@ -1,18 +1,30 @@
 import asyncio
 
+import time
+
 from inspect import _empty, getmembers, ismethod, signature
 
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Set
 
 from pydantic import ValidationError
 
 
 
+from . import tracing
+
 from .logger import get_logger
 
-from .rpc_methods import EXPOSED_BUILT_IN_METHODS, NoResponse, RpcMethodsBase
+from .rpc_methods import EXPOSED_BUILT_IN_METHODS, NoResponse, RpcMethodsBase, current_channel
+
+from .admission import ConnectionAdmission
+
+from .chunking import MessageTooLargeError
 
-from .schemas import RpcMessage, RpcRequest, RpcResponse
+from .priority import PriorityLanes
+
+from .schemas import RpcMessage, RpcPriority, RpcRequest, RpcResponse
+
+from .session import PENDING, RpcSession
 
 from .utils import gen_uid, pydantic_parse
 
@@ -28,12 +40,26 @@ OnDisconnectCallback = Callable[['RpcChannel'], Any]
 
 
 
+# Weight of a new sample in the smoothed RTT (same gain as TCP's SRTT, RFC 6298)
+
+RTT_SMOOTHING = 0.125
+
+
+
 class DEFAULT_TIMEOUT:
 
     pass
 
 
 
+# handler result placeholder for calls that were cancelled or ran past their deadline
+
+class _ABANDONED:
+
+    pass
+
+
+
 class RemoteValueError(ValueError):
 
     pass
@@ -46,8 +72,54 @@ class RpcChannelClosedException(Exception):
 
 
 
+# subclasses RpcChannelClosedException, which timeouts used to raise
+
+class RpcTimeoutException(RpcChannelClosedException):
+
+    pass
+
+
+
+class RpcRemoteError(Exception):
+
+    def __init__(self, error: Dict):
+
+        super().__init__(error.get("message") or error.get("code"))
+
+        self.code = error.get("code")
+
+        self.error = error
+
+
+
+class RpcOverloadedException(RpcRemoteError):
+
+    @property
+
+    def retry_after(self) -> float:
+
+        return self.error.get("retry_after")
+
+
+
+OVERLOADED = "overloaded"
+
+HANDLER_ERROR = "handler_error"
+
+RESPONSE_TOO_LARGE = "response_too_large"
+
+
+
+_BUILT_IN_METHODS = frozenset(EXPOSED_BUILT_IN_METHODS)
+
+
+
 class RpcPromise:
 
+    __slots__ = ("_request", "_id", "_event")
+
+
+
     def __init__(self, request: RpcRequest):
 
         self._request = request
@@ -88,17 +160,29 @@ class RpcPromise:
 
 class RpcProxy:
 
-    def __init__(self, channel, method_name) -> None:
+    __slots__ = ("method_name", "channel", "options")
+
+
+
+    def __init__(self, channel, method_name, **options) -> None:
 
         self.method_name = method_name
 
         self.channel = channel
 
+        self.options = options
+
+
+
+    def with_options(self, **options) -> "RpcProxy":
+
+        return RpcProxy(self.channel, self.method_name, **{**self.options, **options})
+
 
 
     def __call__(self, **kwds: Any) -> Any:
 
-        return self.channel.call(self.method_name, args=kwds)
+        return self.channel.call(self.method_name, args=kwds, **self.options)
 
 
 
@@ -110,7 +194,7 @@ class RpcCaller:
 
         self._method_names = (
 
-            [method[0] for method in getmembers(methods, lambda i: ismethod(i))]
+            frozenset(method[0] for method in getmembers(methods, lambda i: ismethod(i)))
 
             if methods is not None
 
@@ -120,31 +204,55 @@ class RpcCaller:
 
 
 
-    def __getattribute__(self, name: str):
+    # only reached for names not already on the instance - each proxy is built once and then cached
+
+    def __getattr__(self, name: str):
 
-        if (not name.startswith("_") or name in EXPOSED_BUILT_IN_METHODS) and (
+        if (not name.startswith("_") or name in _BUILT_IN_METHODS) and (
 
             self._method_names is None or name in self._method_names
 
         ):
 
-            return RpcProxy(self._channel, name)
+            proxy = self.__dict__[name] = RpcProxy(self._channel, name)
 
-        else:
+            return proxy
 
-            return super().__getattribute__(name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
 
 
 
 class RpcChannel:
 
-    def __init__(self, methods: RpcMethodsBase, socket, channel_id=None, default_response_timeout=None, sync_channel_id=False, **kwargs):
+    # idle connections dominate large deployments - per-channel state is slotted and mostly created on first use
+
+    __slots__ = ("methods", "requests", "responses", "socket", "default_response_timeout", "id", "_sync_channel_id",
+
+                 "_other_channel_id", "_other", "_connect_handlers", "_disconnect_handlers",
+
+                 "_error_handlers", "_is_closed", "_context", "rtt", "_ping_seq", "_pong_waiters", "session",
+
+                 "_send_lanes", "_sending", "_request_lanes", "_request_concurrency", "_urgent_reserve", "_workers",
+
+                 "_urgent_workers", "_running", "admission", "profiler", "_goaway_handlers", "goaway", "_tasks",
+
+                 "__weakref__")
+
+
+
+    def __init__(self, methods: RpcMethodsBase, socket, channel_id=None, default_response_timeout=None, sync_channel_id=False,
+
+                 session: RpcSession = None, request_concurrency: int = 1, urgent_reserve: int = 1,
+
+                 admission: ConnectionAdmission = None, profiler=None, **kwargs):
 
         self.methods = methods._copy_()
 
-        self.methods._set_channel_(self)
+        # shared methods objects find their channel through current_channel instead
+
+        if self.methods is not methods: self.methods._set_channel_(self)
 
-        self.requests: Dict[str, asyncio.Event] = {}
+        self.requests: Dict[str, RpcPromise] = {}
 
         self.responses = {}
 
@@ -158,19 +266,65 @@ class RpcChannel:
 
         self._other_channel_id = None
 
-        self._channel_id_synced = asyncio.Event()
+        self._other = None
+
+        self._connect_handlers = None
+
+        self._disconnect_handlers = None
+
+        self._error_handlers = None
+
+        self._is_closed = False
+
+        self._context = kwargs
+
+        self.rtt = None
+
+        self._ping_seq = 0
+
+        self._pong_waiters: Dict[int, asyncio.Future] = None
+
+        self.session = session
+
+        # outbound messages wait here while another send is in progress
+
+        self._send_lanes: PriorityLanes = None
+
+        self._sending = False
 
-        self.other = RpcCaller(self)
+        # inbound requests wait here for a dispatch worker
 
-        self._connect_handlers = []
+        self._request_lanes: PriorityLanes = None
 
-        self._disconnect_handlers = []
+        self._request_concurrency = request_concurrency
 
-        self._error_handlers = []
+        # extra workers that only serve CONTROL/INTERACTIVE requests while the regular ones are busy
 
-        self._closed = asyncio.Event()
+        self._urgent_reserve = urgent_reserve
 
-        self._context = kwargs or {}
+        self._workers = 0
+
+        self._urgent_workers = 0
+
+        # call_id -> running handler task, so the caller can cancel it
+
+        self._running: Dict[str, asyncio.Task] = None
+
+        self.admission = admission
+
+        # a CallProfiler, settable at runtime; None skips all per-phase timing
+
+        self.profiler = profiler
+
+        self._goaway_handlers = None
+
+        # the peer's drain notice, once it sent one
+
+        self.goaway: Dict[str, Any] = None
+
+        # background tasks of this channel - the loop itself only keeps weak references to them
+
+        self._tasks: Set[asyncio.Task] = None
 
 
 
@@ -182,6 +336,18 @@ class RpcChannel:
 
 
 
+    @property
+
+    def other(self) -> RpcCaller:
+
+        if self._other is None:
+
+            self._other = RpcCaller(self)
+
+        return self._other
+
+
+
     def get_return_type(self, method):
 
         method_signature = signature(method)
@@ -190,197 +356,975 @@ class RpcChannel:
 
 
 
-    async def send(self, data):
+    async def send(self, data, priority=RpcPriority.NORMAL):
 
-        await self.socket.send(data)
+        if priority is None: priority = RpcPriority.NORMAL
 
+        if self._sending:
 
+            waiter = asyncio.get_running_loop().create_future()
 
-    async def close(self):
+            if self._send_lanes is None: self._send_lanes = PriorityLanes()
 
-        res = await self.socket.close()
+            self._send_lanes.put(priority, (data, waiter, priority))
 
-        self._closed.set()
+            return await waiter
 
-        return res
+        self._sending = True
 
+        try:
 
+            await self._send_now(data, priority)
 
-    def isClosed(self):
+        finally:
 
-        return self._closed.is_set()
+            # whoever holds the socket drains what queued up meanwhile, most urgent first
 
+            if self._send_lanes:
 
+                self._spawn(self._drain_send_lanes())
 
-    async def on_message(self, data):
+            else:
 
-        try:
+                self._sending = False
 
-            message = pydantic_parse(RpcMessage, data)
 
-            if message.request is not None:
 
-                await self.on_request(message.request)
+    def _spawn(self, coro) -> asyncio.Task:
 
-            if message.response is not None:
+        task = asyncio.ensure_future(coro)
+
+        if self._tasks is None: self._tasks = set()
+
+        self._tasks.add(task)
+
+        task.add_done_callback(self._tasks.discard)
+
+        return task
 
-                await self.on_response(message.response)
+
+
+    async def _send_queued(self, item):
+
+        data, waiter, priority = item
+
+        try:
+
+            await self._send_now(data, priority)
+
+            if not waiter.done(): waiter.set_result(None)
 
         except Exception as e:
 
-            await self.on_error(e)
+            if not waiter.done(): waiter.set_exception(e)
+
+
+
+    async def _drain_send_lanes(self):
+
+        try:
+
+            while self._send_lanes:
+
+                await self._send_queued(self._send_lanes.pop())
+
+        finally:
+
+            self._sending = False
+
+
+
+    async def _send_now(self, data, priority=RpcPriority.NORMAL):
+
+        session = self.session
+
+        if session is None:
+
+            return await self._write(data, self._split(data), priority)
+
+        if isinstance(data, dict):
+
+            # control frames are not worth replaying
+
+            if session.connected: await self._write(data, self._split(data), priority)
+
+            return
+
+        session.stamp(data)
+
+        try:
+
+            # serialized (and size checked) before it can fail on the socket - a message that can never be sent
+
+            # must not stay in the outbox, nor suspend a healthy session
+
+            frames = self._split(data)
+
+        except Exception:
+
+            session.unstamp(data)
 
             raise
 
+        if session.connected:
 
+            try:
 
-    def register_connect_handler(self, coros=None):
+                await self._write(data, frames, priority)
 
-        if coros is not None: self._connect_handlers.extend(coros)
+            except Exception:
 
+                # kept in the outbox, replayed once the session resumes
 
+                session.connected = False
 
-    def register_disconnect_handler(self, coros=None):
+                logger.debug("Send failed, channel %s suspended until the session resumes", self.id)
 
-        if coros is not None: self._disconnect_handlers.extend(coros)
 
 
+    def _split(self, data):
 
-    async def on_handler_event(self, handlers, *args, **kwargs):
+        split = getattr(self.socket, "split", None)
 
-        await asyncio.gather(*(callback(*args, **kwargs) for callback in handlers))
+        return split(data) if split is not None else None
 
 
 
-    async def on_connect(self):
+    async def _write(self, data, frames, priority):
 
-        if self._sync_channel_id:
+        if frames is None:
 
-            asyncio.create_task(self._get_other_channel_id())
+            return await self.socket.send(data)
 
-        await self.on_handler_event(self._connect_handlers, self)
+        # chunking sockets: anything as urgent that queued up meanwhile goes out between the chunks
 
+        frames = iter(frames)
 
+        await self.socket.send_frame(next(frames))
 
-    async def _get_other_channel_id(self):
+        for frame in frames:
 
-        if self._other_channel_id is None:
+            while self._send_lanes:
 
-            other_channel_id = await self.other._get_channel_id_()
+                item = self._send_lanes.pop(max_priority=priority)
 
-            self._other_channel_id = other_channel_id.result if other_channel_id else None
+                if item is None: break
 
-            self._channel_id_synced.set()
+                await self._send_queued(item)
 
-            return self._other_channel_id
+            await self.socket.send_frame(frame)
 
-        return self._other_channel_id
 
 
+    async def replay(self, peer_ack: int) -> bool:
 
-    async def on_disconnect(self):
+        session = self.session
 
-        self._closed.set()
+        complete = session.can_replay(peer_ack)
 
-        await self.on_handler_event(self._disconnect_handlers, self)
+        sent = peer_ack
 
+        # messages queued while replaying are picked up by the next pass
 
+        while True:
 
-    async def on_error(self, error: Exception):
+            missed = [message for message in session.outbox if message.seq > sent]
 
-        await self.on_handler_event(self._error_handlers, self, error)
+            if not missed:
 
+                break
 
+            for message in missed:
 
-    async def on_request(self, message: RpcRequest):
+                message.ack = session.last_received_seq
 
-        method_name = message.method
+                await self.socket.send(message)
 
-        if isinstance(method_name, str) and (not method_name.startswith("_") or method_name in EXPOSED_BUILT_IN_METHODS):
+                sent = message.seq
 
-            method = getattr(self.methods, method_name)
+        session.connected = True
 
-            if callable(method):
+        return complete
 
-                result = await method(**message.arguments)
 
-                if result is not NoResponse:
 
-                    result_type = self.get_return_type(method)
+    async def resend_pending_requests(self):
 
-                    response = RpcMessage(response=RpcResponse[result_type](
+        for promise in list(self.requests.values()):
 
-                            call_id=message.call_id,
+            await self.send(RpcMessage(request=promise.request))
 
-                            result=result,
 
-                            result_type=getattr(result_type, "__name__", "unknown-type"),
 
-                        ))
+    async def close(self):
 
-                    await self.send(response)
+        try:
 
+            return await self.socket.close()
 
+        finally:
 
-    async def on_response(self, response: RpcResponse):
+            self._mark_closed()
 
-        if response.call_id is not None and response.call_id in self.requests:
 
-            self.responses[response.call_id] = response
 
-            self.requests[response.call_id].set()
+    def isClosed(self):
 
+        return self._is_closed
 
 
-    async def wait_for_response(self, promise, timeout=DEFAULT_TIMEOUT) -> RpcResponse:
 
-        if timeout is DEFAULT_TIMEOUT:
+    def _mark_closed(self):
 
-            timeout = self.default_response_timeout
+        self._is_closed = True
 
-        _, pending = await asyncio.wait(
+        # wake pending callers, they find no response and raise RpcChannelClosedException
 
-            [asyncio.ensure_future(promise.wait()), asyncio.ensure_future(self._closed.wait())],
+        for promise in self.requests.values():
 
-            timeout=timeout,
+            promise.set()
 
-            return_when=asyncio.FIRST_COMPLETED,
 
-        )
 
-        for fut in pending: fut.cancel()
+    async def on_message(self, data):
 
-        response = self.responses.get(promise.call_id, NoResponse)
+        # keep-alive frames are answered before (and without) pydantic parsing
 
-        if response is NoResponse:
+        if "ping" in data:
 
-            raise RpcChannelClosedException(f"Channel Closed before RPC response for {promise.call_id} received")
+            return await self.send({"pong": data["ping"]}, priority=RpcPriority.CONTROL)
 
-        del self.requests[promise.call_id]
+        if "pong" in data:
 
-        del self.responses[promise.call_id]
+            return self._on_pong(data["pong"])
 
-        return response
+        if "cancel" in data:
 
+            return self._on_cancel(data["cancel"])
 
+        if "goaway" in data:
 
-    async def async_call(self, name, args={}, call_id=None) -> RpcPromise:
+            self.goaway = data["goaway"]
 
-        call_id = call_id or gen_uid()
+            return await self.on_handler_event(self._goaway_handlers, self, self.goaway)
 
-        msg = RpcMessage(request=RpcRequest(method=name, arguments=args, call_id=call_id))
+        session = self.session
 
-        await self.send(msg)
+        if session is not None:
 
-        promise = self.requests[msg.request.call_id] = RpcPromise(msg.request)
+            if not session.on_message(data):
 
-        return promise
+                return
+
+            if session.ack_due():
+
+                await self.send(session.ack_message(), priority=RpcPriority.CONTROL)
+
+        # nobody waits for this response anymore (timed out or cancelled) - skip parsing it
+
+        response = data.get("response")
+
+        if response is not None and data.get("request") is None and response.get("call_id") not in self.requests:
+
+            return
+
+        admitted = False
+
+        if self.admission is not None:
+
+            request = data.get("request")
+
+            if request is not None and request.get("method") not in EXPOSED_BUILT_IN_METHODS:
+
+                # rejected before parsing or running anything
+
+                retry_after = self.admission.admit(request.get("method"), getattr(self.socket, "last_recv_size", 0))
+
+                if retry_after is not None:
+
+                    return await self._reject(request.get("call_id"), OVERLOADED, retry_after=retry_after)
+
+                admitted = True
+
+        try:
+
+            profiler = self.profiler
+
+            parse_start = time.perf_counter() if profiler is not None else 0
+
+            message = pydantic_parse(RpcMessage, data)
+
+            if message.request is not None:
+
+                # parse time and frame size travel with the request, to the profiler's timing of the call
+
+                parsed = None
+
+                if profiler is not None: parsed = (time.perf_counter() - parse_start, getattr(self.socket, "last_recv_size", 0))
+
+                self._dispatch(message.request, parsed)
+
+                admitted = False
+
+            if message.response is not None:
+
+                await self.on_response(message.response)
+
+        except Exception as e:
+
+            if admitted: self.admission.release()
+
+            await self.on_error(e)
+
+            raise
+
+
+
+    async def _reject(self, call_id, code: str, **details):
+
+        if call_id is None:
+
+            return
+
+        error = {"code": code, **details}
+
+        await self.send({"response": {"result": None, "result_type": None, "call_id": call_id, "error": error}},
+
+                        priority=RpcPriority.CONTROL)
+
+
+
+    def _on_cancel(self, call_id):
+
+        handler = self._running.pop(call_id, None) if self._running else None
+
+        if handler is not None:
+
+            handler.cancel()
+
+        elif self._request_lanes:
+
+            queued = self._request_lanes.remove(lambda item: item[0].call_id == call_id)
+
+            if queued is not None: self._release(queued[0].method)
+
+
+
+    def _on_pong(self, seq):
+
+        waiter = self._pong_waiters.pop(seq, None) if self._pong_waiters else None
+
+        if waiter is not None and not waiter.done():
+
+            waiter.set_result(None)
+
+
+
+    async def ping(self, timeout=None) -> float:
+
+        self._ping_seq += 1
+
+        seq = self._ping_seq
+
+        if self._pong_waiters is None: self._pong_waiters = {}
+
+        waiter = self._pong_waiters[seq] = asyncio.get_running_loop().create_future()
+
+        sent_at = time.monotonic()
+
+        try:
+
+            await self.send({"ping": seq}, priority=RpcPriority.CONTROL)
+
+            await asyncio.wait_for(waiter, timeout)
+
+        finally:
+
+            self._pong_waiters.pop(seq, None)
+
+        rtt = time.monotonic() - sent_at
+
+        self.rtt = rtt if self.rtt is None else self.rtt + RTT_SMOOTHING * (rtt - self.rtt)
+
+        return rtt
+
+
+
+    # Returns once `max_missed` consecutive pings went unanswered within `timeout` (defaults to `interval`)
+
+    async def keep_alive(self, interval: float, timeout: float = None, max_missed: int = 3):
+
+        missed = 0
+
+        while not self.isClosed():
+
+            await asyncio.sleep(interval)
+
+            if self.session is not None and not self.session.connected:
+
+                missed = 0
+
+                continue
+
+            try:
+
+                await self.ping(timeout=timeout or interval)
+
+                missed = 0
+
+            except asyncio.TimeoutError:
+
+                missed += 1
+
+                logger.warning("Missed pong from peer of channel %s (%s/%s)", self.id, missed, max_missed)
+
+                if missed >= max_missed:
+
+                    logger.error("Peer of channel %s is unresponsive, closing", self.id)
+
+                    return
+
+            except Exception as e:
+
+                # the socket is already gone
+
+                logger.warning("Failed pinging peer of channel %s, closing: %r", self.id, e)
+
+                return
+
+
+
+    def register_connect_handler(self, coros=None):
+
+        if coros: self._connect_handlers = (self._connect_handlers or []) + list(coros)
+
+
+
+    def register_disconnect_handler(self, coros=None):
+
+        if coros: self._disconnect_handlers = (self._disconnect_handlers or []) + list(coros)
+
+
+
+    # called with (channel, notice) when the peer announces it is draining, see WebsocketRPCEndpoint.drain
+
+    def register_goaway_handler(self, coros=None):
+
+        if coros: self._goaway_handlers = (self._goaway_handlers or []) + list(coros)
+
+
+
+    async def send_goaway(self, **notice):
+
+        await self.send({"goaway": notice}, priority=RpcPriority.CONTROL)
+
+
+
+    @property
+
+    def busy(self) -> bool:
+
+        """Whether inbound requests are queued or being handled"""
+
+        return self._workers > 0 or self._urgent_workers > 0
+
+
+
+    async def on_handler_event(self, handlers, *args, **kwargs):
+
+        if handlers: await asyncio.gather(*(callback(*args, **kwargs) for callback in handlers))
+
+
+
+    async def on_connect(self):
+
+        # serializers with per-connection state (e.g. the compact method table) announce it first
+
+        announce = getattr(self.socket, "on_channel_connect", None)
+
+        if announce is not None: await announce(self)
+
+        if self._sync_channel_id:
+
+            self._spawn(self._get_other_channel_id())
+
+        await self.on_handler_event(self._connect_handlers, self)
+
+
+
+    async def _get_other_channel_id(self):
+
+        if self._other_channel_id is None:
+
+            other_channel_id = await self.other._get_channel_id_()
+
+            self._other_channel_id = other_channel_id.result if other_channel_id else None
+
+            return self._other_channel_id
+
+        return self._other_channel_id
+
+
+
+    async def on_disconnect(self):
+
+        self._mark_closed()
+
+        await self.on_handler_event(self._disconnect_handlers, self)
+
+
+
+    async def on_error(self, error: Exception):
+
+        await self.on_handler_event(self._error_handlers, self, error)
+
+
+
+    def _dispatch(self, request: RpcRequest, parsed=None):
+
+        priority = RpcPriority.CONTROL if request.method in EXPOSED_BUILT_IN_METHODS else request.priority
+
+        if self._request_lanes is None: self._request_lanes = PriorityLanes()
+
+        self._request_lanes.put(priority, (request, time.monotonic(), parsed))
+
+        if self._workers < self._request_concurrency:
+
+            self._workers += 1
+
+            self._spawn(self._dispatch_worker())
+
+        elif self._urgent_workers < self._urgent_reserve and self._request_lanes.has_urgent(RpcPriority.INTERACTIVE):
+
+            self._urgent_workers += 1
+
+            self._spawn(self._dispatch_worker(urgent=True))
+
+
+
+    def _release(self, method=None):
+
+        if self.admission is not None and method not in EXPOSED_BUILT_IN_METHODS:
+
+            self.admission.release()
+
+
+
+    async def _dispatch_worker(self, urgent=False):
+
+        # each worker is its own task, so this only scopes the handlers it runs
+
+        current_channel.set(self)
+
+        try:
+
+            while True:
+
+                item = self._request_lanes.pop(max_priority=RpcPriority.INTERACTIVE if urgent else None)
+
+                if item is None:
+
+                    break
+
+                request, received_at, parsed = item
+
+                try:
+
+                    with tracing.span(f"on_request {request.method}", tracing.SERVER, request.traceparent,
+
+                                      method=request.method, call_id=request.call_id, channel=self.id):
+
+                        if self.profiler is None: await self.on_request(request, received_at)
+
+                        else: await self.profiler.on_request(self, request, received_at, parsed)
+
+                except Exception as e:
+
+                    logger.exception("Failed handling %s on channel %s", request.method, self.id)
+
+                    # the caller would otherwise wait out its whole timeout (forever without one)
+
+                    try:
+
+                        await self._reject(request.call_id, HANDLER_ERROR, message=repr(e))
+
+                    except Exception:
+
+                        logger.debug("Failed sending the error of call %s", request.call_id)
+
+                    await self.on_error(e)
+
+                finally:
+
+                    self._release(request.method)
+
+        finally:
+
+            if urgent: self._urgent_workers -= 1
+
+            else: self._workers -= 1
+
+
+
+    async def on_request(self, message: RpcRequest, received_at: float = None):
+
+        method_name = message.method
+
+        if isinstance(method_name, str) and (not method_name.startswith("_") or method_name in EXPOSED_BUILT_IN_METHODS):
+
+            method = getattr(self.methods, method_name)
+
+            if callable(method):
+
+                calls = self.session.calls if self.session is not None and message.call_id is not None else None
+
+                if calls is not None:
+
+                    previous = calls.get(message.call_id)
+
+                    if previous is PENDING or previous is NoResponse:
+
+                        return
+
+                    if previous is not None:
+
+                        return await self.send(RpcMessage(response=previous), priority=message.priority)
+
+                    calls.start(message.call_id)
+
+                try:
+
+                    profiler = self.profiler
+
+                    with tracing.span(f"handler {method_name}", method=method_name):
+
+                        if profiler is None: result = await self._run_handler(method, message, received_at)
+
+                        else: result = await profiler.run_handler(self, method, message, received_at)
+
+                except BaseException:
+
+                    if calls is not None: calls.discard(message.call_id)
+
+                    raise
+
+                if result is _ABANDONED:
+
+                    if calls is not None: calls.discard(message.call_id)
+
+                    return
+
+                if result is not NoResponse:
+
+                    result_type = self.get_return_type(method)
+
+                    response = RpcMessage(response=RpcResponse[result_type](
+
+                            call_id=message.call_id,
+
+                            result=result,
+
+                            result_type=getattr(result_type, "__name__", "unknown-type"),
+
+                        ))
+
+                    try:
+
+                        if profiler is None: await self.send(response, priority=message.priority)
+
+                        else: await profiler.send(self, response, message)
+
+                    except MessageTooLargeError as e:
+
+                        if calls is not None: calls.discard(message.call_id)
+
+                        return await self._reject(message.call_id, RESPONSE_TOO_LARGE, message=str(e))
+
+                    if calls is not None: calls.complete(message.call_id, response.response)
+
+                elif calls is not None:
+
+                    calls.complete(message.call_id, NoResponse)
+
+
+
+    async def _run_handler(self, method, message: RpcRequest, received_at: float = None):
+
+        timeout = None
+
+        if message.deadline is not None:
+
+            timeout = message.deadline - (time.monotonic() - received_at if received_at is not None else 0)
+
+            if timeout <= 0:
+
+                logger.debug("Dropping %s call %s, its deadline passed while queued", message.method, message.call_id)
+
+                return _ABANDONED
+
+        call_id = message.call_id
+
+        if call_id is None and timeout is None:
+
+            return await method(**message.arguments)
+
+        handler = asyncio.ensure_future(method(**message.arguments))
+
+        if call_id is not None:
+
+            if self._running is None: self._running = {}
+
+            self._running[call_id] = handler
+
+        try:
+
+            return await asyncio.wait_for(handler, timeout) if timeout is not None else await handler
+
+        except asyncio.TimeoutError:
+
+            logger.debug("Cancelled %s call %s, its deadline passed", message.method, call_id)
+
+            return _ABANDONED
+
+        except asyncio.CancelledError:
+
+            # our own task is being cancelled, not just the handler
+
+            if call_id is None or self._running.get(call_id) is handler:
+
+                raise
+
+            logger.debug("Cancelled %s call %s at the caller's request", message.method, call_id)
+
+            return _ABANDONED
+
+        finally:
+
+            if call_id is not None and self._running.get(call_id) is handler:
+
+                del self._running[call_id]
+
+
+
+    async def on_response(self, response: RpcResponse):
+
+        if response.call_id is not None and response.call_id in self.requests:
+
+            self.responses[response.call_id] = response
+
+            self.requests[response.call_id].set()
+
+
+
+    async def wait_for_response(self, promise, timeout=DEFAULT_TIMEOUT) -> RpcResponse:
+
+        if timeout is DEFAULT_TIMEOUT:
+
+            timeout = self.default_response_timeout
+
+        # closing the channel sets the promise too
+
+        if not self._is_closed:
+
+            try:
+
+                await asyncio.wait_for(promise.wait(), timeout)
+
+            except asyncio.TimeoutError:
+
+                pass
+
+            except asyncio.CancelledError:
+
+                self._abandon(promise.call_id)
+
+                raise
+
+        response = self.responses.get(promise.call_id, NoResponse)
+
+        if response is NoResponse:
+
+            self._abandon(promise.call_id)
+
+            if self.isClosed():
+
+                raise RpcChannelClosedException(f"Channel Closed before RPC response for {promise.call_id} received")
+
+            raise RpcTimeoutException(f"No RPC response for {promise.call_id} within {timeout}s")
+
+        del self.requests[promise.call_id]
+
+        del self.responses[promise.call_id]
+
+        if response.error is not None:
+
+            if response.error.get("code") == OVERLOADED:
+
+                raise RpcOverloadedException(response.error)
+
+            raise RpcRemoteError(response.error)
+
+        return response
+
+
+
+    def _abandon(self, call_id):
+
+        self.requests.pop(call_id, None)
+
+        self.responses.pop(call_id, None)
+
+        if not self.isClosed():
+
+            self._spawn(self._send_cancel(call_id))
+
+
+
+    async def _send_cancel(self, call_id):
+
+        try:
+
+            await self.send({"cancel": call_id}, priority=RpcPriority.CONTROL)
+
+        except Exception:
+
+            logger.debug("Failed sending cancel for call %s", call_id)
+
+
+
+    async def async_call(self, name, args={}, call_id=None, priority=None, deadline=None) -> RpcPromise:
+
+        call_id = call_id or gen_uid()
+
+        if priority is None and name in EXPOSED_BUILT_IN_METHODS:
+
+            priority = RpcPriority.CONTROL
+
+        msg = RpcMessage(request=RpcRequest(method=name, arguments=args, call_id=call_id, priority=priority,
+
+                                            deadline=deadline, traceparent=tracing.current_traceparent()))
+
+        # registered before sending so a replayed or very fast response always finds it
+
+        promise = self.requests[msg.request.call_id] = RpcPromise(msg.request)
+
+        try:
+
+            await self.send(msg, priority=priority)
+
+        except BaseException:
+
+            del self.requests[msg.request.call_id]
+
+            raise
+
+        return promise
+
+
+
+    async def call(self, name, args={}, timeout=DEFAULT_TIMEOUT, priority=None):
+
+        if timeout is DEFAULT_TIMEOUT:
+
+            timeout = self.default_response_timeout
+
+        with tracing.span(f"call {name}", tracing.CLIENT, method=name, channel=self.id):
+
+            # the other side stops working on the call once we would have given up on it
+
+            promise = await self.async_call(name, args, priority=priority, deadline=timeout)
+
+            return await self.wait_for_response(promise, timeout=timeout)
+
+
+
+    async def stream_call(self, name, args={}, timeout=DEFAULT_TIMEOUT, priority=None, max_buffered=1024):
+
+        """
+
+        Calls a method returning a list and yields its elements. Over a socket with register_stream (chunked
+
+        sockets) elements are yielded while the response is still arriving, instead of after it was decoded whole.
+
+        Up to `max_buffered` elements wait for the consumer; past that the rest of the list arrives with the
+
+        response and is yielded after them.
+
+        """
+
+        if timeout is DEFAULT_TIMEOUT:
+
+            timeout = self.default_response_timeout
+
+        call_id = gen_uid()
+
+        register = getattr(self.socket, "register_stream", None)
+
+        # the socket's reader can't wait for a slow consumer without stalling every other call on the connection,
+
+        # so a full queue ends the streaming instead
+
+        elements = asyncio.Queue(max_buffered)
+
+
+
+        def on_element(element):
+
+            if elements.full():
+
+                return False
+
+            elements.put_nowait(element)
+
+        if register is not None: register(call_id, on_element)
+
+        try:
+
+            promise = await self.async_call(name, args, call_id=call_id, priority=priority, deadline=timeout)
+
+            response_task = asyncio.ensure_future(self.wait_for_response(promise, timeout=timeout))
+
+            try:
+
+                while not response_task.done():
+
+                    element_task = asyncio.ensure_future(elements.get())
+
+                    await asyncio.wait((element_task, response_task), return_when=asyncio.FIRST_COMPLETED)
+
+                    if element_task.done():
+
+                        yield element_task.result()
+
+                    else:
+
+                        element_task.cancel()
+
+                while not elements.empty():
+
+                    yield elements.get_nowait()
+
+                result = response_task.result().result
+
+            finally:
+
+                if not response_task.done(): response_task.cancel()
+
+            # the response wasn't streamed (small, or the socket can't) - it arrived whole
+
+            if isinstance(result, list):
+
+                for element in result:
+
+                    yield element
 
+            elif result is not None:
 
+                raise TypeError(f"stream_call expects {name} to return a list, got {type(result).__name__}")
 
-    async def call(self, name, args={}, timeout=DEFAULT_TIMEOUT):
+        finally:
 
-        promise = await self.async_call(name, args)
+            unregister = getattr(self.socket, "unregister_stream", None)
 
-        return await self.wait_for_response(promise, timeout=timeout)
+            if unregister is not None: unregister(call_id)
 
@@ -8,6 +8,8 @@ import typing
 
 import copy
 
+from contextvars import ContextVar
+
 from pydantic import BaseModel
 
 from .utils import gen_uid
@@ -16,7 +18,7 @@ from .utils import gen_uid
 
 PING_RESPONSE = "pong"
 
-EXPOSED_BUILT_IN_METHODS = ['_ping_', '_get_channel_id_']
+EXPOSED_BUILT_IN_METHODS = ['_ping_', '_get_channel_id_', '_describe_methods_']
 
 
 
@@ -26,8 +28,20 @@ class NoResponse:
 
 
 
+# the channel whose request is being handled - how shared methods objects reach their caller
+
+current_channel: ContextVar = ContextVar("fasterpc_current_channel", default=None)
+
+
+
 class RpcMethodsBase:
 
+    # set on subclasses without per-channel state: all channels then use the one instance instead of a copy each
+
+    _shared_ = False
+
+
+
     def __init__(self):
 
         self._channel = None
@@ -44,13 +58,13 @@ class RpcMethodsBase:
 
     def channel(self):
 
-        return self._channel
+        return self._channel if self._channel is not None else current_channel.get()
 
 
 
     def _copy_(self):
 
-        return copy.copy(self)
+        return self if self._shared_ else copy.copy(self)
 
 
 
@@ -62,7 +76,17 @@ class RpcMethodsBase:
 
     async def _get_channel_id_(self) -> str:
 
-        return self._channel.id
+        return self.channel.id
+
+
+
+    async def _describe_methods_(self) -> typing.Dict[str, typing.Any]:
+
+        # imported here, stubs are only needed by peers that introspect us
+
+        from .stubs import describe_methods
+
+        return describe_methods(self)
 
 
 
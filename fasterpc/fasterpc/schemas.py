@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 from typing import Dict, Generic, Optional, TypeVar
 
@@ -12,6 +12,18 @@ UUID = str
 
 
 
+class RpcPriority(IntEnum):
+
+    CONTROL = 0
+
+    INTERACTIVE = 1
+
+    NORMAL = 2
+
+    BULK = 3
+
+
+
 class RpcRequest(BaseModel):
 
     method: str
@@ -20,6 +32,16 @@ class RpcRequest(BaseModel):
 
     call_id: Optional[UUID] = None
 
+    priority: Optional[int] = None
+
+    # seconds the caller is still willing to wait, counted from receipt
+
+    deadline: Optional[float] = None
+
+    # W3C trace context of the calling span, set while tracing is on
+
+    traceparent: Optional[str] = None
+
 
 
 ResponseT = TypeVar("ResponseT")
@@ -38,6 +60,8 @@ if is_pydantic_pre_v2():
 
         call_id: Optional[UUID] = None
 
+        error: Optional[Dict] = None
+
 else:
 
     class RpcResponse(BaseModel, Generic[ResponseT]):
@@ -48,6 +72,10 @@ else:
 
         call_id: Optional[UUID] = None
 
+        # set instead of a result when the call was rejected, e.g. {"code": "overloaded", "retry_after": 0.5}
+
+        error: Optional[Dict] = None
+
 
 
 class RpcMessage(BaseModel):
@@ -56,6 +84,12 @@ class RpcMessage(BaseModel):
 
     response: Optional[RpcResponse] = None
 
+    # only used by resumable sessions
+
+    seq: Optional[int] = None
+
+    ack: Optional[int] = None
+
 
 
 class WebSocketFrameType(str, Enum):
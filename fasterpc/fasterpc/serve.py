@@ -0,0 +1,538 @@
+import argparse
+
+import asyncio
+
+import importlib
+
+import json
+
+import multiprocessing
+
+import queue
+
+import signal
+
+import socket
+
+import sys
+
+import time
+
+from typing import Any, Dict, List, Optional
+
+
+
+from . import loop as event_loop
+
+from .loadgen import LatencyHistogram
+
+from .logger import get_logger
+
+from .profiling import CallProfiler
+
+
+
+logger = get_logger("RPC_SERVE")
+
+
+
+class WorkerStats(CallProfiler):
+
+    """Counts calls and their latency (receipt to response sent) for the supervisor; set as the endpoint's profiler"""
+
+
+
+    def __init__(self):
+
+        # only counting here, not collecting slow calls
+
+        super().__init__(slow_threshold=float("inf"), max_slow_calls=0)
+
+        self.latency = LatencyHistogram()
+
+
+
+    async def on_request(self, channel, request, received_at: float = None, parsed=None):
+
+        start = received_at if received_at is not None else time.monotonic()
+
+        try:
+
+            return await super().on_request(channel, request, received_at, parsed)
+
+        finally:
+
+            self.latency.record(time.monotonic() - start)
+
+
+
+    def take(self) -> Dict[str, Any]:
+
+        """Latency of the calls since the last take()"""
+
+        latency, self.latency = self.latency, LatencyHistogram()
+
+        return {"buckets": dict(latency.buckets), "count": latency.count, "total": latency.total, "max": latency.max}
+
+
+
+def reuseport_socket(host: str, port: int) -> socket.socket:
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+
+        raise RuntimeError("SO_REUSEPORT is not available on this platform")
+
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    sock.bind((host, port))
+
+    return sock
+
+
+
+def load_endpoint(target: str, stats: WorkerStats):
+
+    """`module:attribute` naming a WebsocketRPCEndpoint, or RpcMethodsBase instance or class to serve"""
+
+    from .rpc_methods import RpcMethodsBase
+
+    from .websocket_rpc_endpoint import WebsocketRPCEndpoint
+
+    module_name, _, attribute = target.partition(":")
+
+    if not attribute:
+
+        raise ValueError(f"Expected module:attribute, got {target!r}")
+
+    value = getattr(importlib.import_module(module_name), attribute)
+
+    if isinstance(value, type) and issubclass(value, RpcMethodsBase):
+
+        value = value()
+
+    if isinstance(value, RpcMethodsBase):
+
+        return WebsocketRPCEndpoint(value, profiler=stats)
+
+    if isinstance(value, WebsocketRPCEndpoint):
+
+        if value.profiler is None: value.profiler = stats
+
+        return value
+
+    raise TypeError(f"{target} is a {type(value).__name__}, expected a WebsocketRPCEndpoint or RpcMethodsBase")
+
+
+
+async def _serve_worker(index: int, target: str, host: str, port: int, path: str, stats_queue, stats_interval: float):
+
+    import uvicorn
+
+    from fastapi import FastAPI
+
+    stats = WorkerStats()
+
+    endpoint = load_endpoint(target, stats)
+
+    app = FastAPI()
+
+    endpoint.register_route(app, path)
+
+    sock = reuseport_socket(host, port)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", loop=event_loop.loop_name()))
+
+
+
+    async def report():
+
+        while True:
+
+            await asyncio.sleep(stats_interval)
+
+            stats_queue.put({"worker": index, "connections": len(endpoint.manager.channels), "latency": stats.take()})
+
+    reporter = asyncio.create_task(report())
+
+    try:
+
+        await server.serve(sockets=[sock])
+
+    finally:
+
+        reporter.cancel()
+
+
+
+def _worker_main(index: int, target: str, host: str, port: int, path: str, loop: Optional[str], stats_queue, stats_interval: float):
+
+    try:
+
+        event_loop.run(_serve_worker(index, target, host, port, path, stats_queue, stats_interval), loop)
+
+    except KeyboardInterrupt:
+
+        pass
+
+
+
+class _Worker:
+
+    __slots__ = ("index", "process", "started_at", "restarts", "crashes", "connections", "calls")
+
+
+
+    def __init__(self, index: int):
+
+        self.index = index
+
+        self.process = None
+
+        self.started_at = 0.0
+
+        self.restarts = 0
+
+        # consecutive exits shortly after starting
+
+        self.crashes = 0
+
+        self.connections = 0
+
+        self.calls = 0
+
+
+
+class Supervisor:
+
+    """
+
+    Runs `workers` processes serving `target` on one port (each listens with SO_REUSEPORT, the kernel spreads
+
+    connections), restarts those that die - backing off while they keep crashing right away - and aggregates
+
+    their reports into snapshot().
+
+    """
+
+
+
+    def __init__(self, target: str, host: str = "127.0.0.1", port: int = 8000, workers: int = None, path: str = "/ws",
+
+                 loop: str = None, stats_interval: float = 1.0, restart_delay: float = 0.5, max_restart_delay: float = 30):
+
+        self.target = target
+
+        self.host = host
+
+        self.port = port
+
+        self.path = path
+
+        self.loop = loop
+
+        self.stats_interval = stats_interval
+
+        self.restart_delay = restart_delay
+
+        self.max_restart_delay = max_restart_delay
+
+        self.workers = [_Worker(index) for index in range(workers or multiprocessing.cpu_count())]
+
+        self._context = multiprocessing.get_context()
+
+        self._stats = self._context.Queue()
+
+        self._reservation = None
+
+        self._stopping = False
+
+        self._restart_at: Dict[int, float] = {}
+
+        self._window_started = time.monotonic()
+
+        self._window_calls = 0
+
+        self._window_latency = LatencyHistogram()
+
+
+
+    def start(self) -> "Supervisor":
+
+        # holding a bound socket in the group pins the port (and picks one when port is 0) for the workers
+
+        self._reservation = reuseport_socket(self.host, self.port)
+
+        self.port = self._reservation.getsockname()[1]
+
+        for worker in self.workers:
+
+            self._spawn(worker)
+
+        return self
+
+
+
+    def _spawn(self, worker: _Worker):
+
+        worker.process = self._context.Process(
+
+            target=_worker_main, name=f"fasterpc-worker-{worker.index}", daemon=True,
+
+            args=(worker.index, self.target, self.host, self.port, self.path, self.loop, self._stats, self.stats_interval))
+
+        worker.process.start()
+
+        worker.started_at = time.monotonic()
+
+
+
+    def poll(self, timeout: float = 0.1):
+
+        """One supervision step: collect reports, restart dead workers"""
+
+        deadline = time.monotonic() + timeout
+
+        while True:
+
+            try:
+
+                report = self._stats.get(timeout=max(deadline - time.monotonic(), 0))
+
+            except queue.Empty:
+
+                break
+
+            worker = self.workers[report["worker"]]
+
+            worker.connections = report["connections"]
+
+            latency = report["latency"]
+
+            worker.calls += latency["count"]
+
+            self._window_calls += latency["count"]
+
+            self._window_latency.buckets.update({int(bucket): count for bucket, count in latency["buckets"].items()})
+
+            self._window_latency.count += latency["count"]
+
+            self._window_latency.total += latency["total"]
+
+            self._window_latency.max = max(self._window_latency.max, latency["max"])
+
+        now = time.monotonic()
+
+        for worker in self.workers:
+
+            if self._stopping or worker.process.is_alive():
+
+                continue
+
+            restart_at = self._restart_at.get(worker.index)
+
+            if restart_at is None:
+
+                uptime = now - worker.started_at
+
+                # crashing right after start - back off instead of spinning
+
+                worker.crashes = worker.crashes + 1 if uptime < self.max_restart_delay else 0
+
+                delay = min(self.restart_delay * 2 ** min(worker.crashes, 16), self.max_restart_delay)
+
+                logger.warning("Worker %s (pid %s) exited with %s after %.1fs, restarting in %.1fs",
+
+                               worker.index, worker.process.pid, worker.process.exitcode, uptime, delay)
+
+                worker.connections = 0
+
+                self._restart_at[worker.index] = now + delay
+
+            elif now >= restart_at:
+
+                del self._restart_at[worker.index]
+
+                worker.restarts += 1
+
+                self._spawn(worker)
+
+
+
+    def snapshot(self) -> Dict[str, Any]:
+
+        """Aggregated view since the previous snapshot (throughput, latency) plus current connection counts"""
+
+        now = time.monotonic()
+
+        elapsed = max(now - self._window_started, 1e-9)
+
+        view = {"port": self.port,
+
+                "workers_alive": sum(worker.process is not None and worker.process.is_alive() for worker in self.workers),
+
+                "workers": len(self.workers),
+
+                "connections": sum(worker.connections for worker in self.workers),
+
+                "calls_per_second": round(self._window_calls / elapsed, 1),
+
+                "calls": sum(worker.calls for worker in self.workers),
+
+                "restarts": sum(worker.restarts for worker in self.workers),
+
+                "latency": self._window_latency.summary(),
+
+                "per_worker": [{"worker": worker.index, "pid": worker.process.pid if worker.process else None,
+
+                                "connections": worker.connections, "calls": worker.calls, "restarts": worker.restarts}
+
+                               for worker in self.workers]}
+
+        self._window_started, self._window_calls, self._window_latency = now, 0, LatencyHistogram()
+
+        return view
+
+
+
+    def run(self, report=None):
+
+        """Supervises until stop(); calls report(snapshot) every stats interval"""
+
+        next_report = time.monotonic() + self.stats_interval
+
+        while not self._stopping:
+
+            self.poll()
+
+            if report is not None and time.monotonic() >= next_report:
+
+                next_report += self.stats_interval
+
+                report(self.snapshot())
+
+        self._shutdown()
+
+
+
+    def stop(self):
+
+        self._stopping = True
+
+
+
+    def _shutdown(self, timeout: float = 10):
+
+        for worker in self.workers:
+
+            if worker.process is not None and worker.process.is_alive(): worker.process.terminate()
+
+        deadline = time.monotonic() + timeout
+
+        for worker in self.workers:
+
+            if worker.process is None: continue
+
+            worker.process.join(max(deadline - time.monotonic(), 0))
+
+            if worker.process.is_alive(): worker.process.kill()
+
+        if self._reservation is not None:
+
+            self._reservation.close()
+
+            self._reservation = None
+
+
+
+def print_view(view: Dict[str, Any]):
+
+    latency = view["latency"]
+
+    print(f"workers {view['workers_alive']}/{view['workers']}  connections {view['connections']:>6}  "
+
+          f"calls/s {view['calls_per_second']:>9.1f}  p50 {latency['p50_ms']:.3f}ms  p99 {latency['p99_ms']:.3f}ms  "
+
+          f"restarts {view['restarts']}", flush=True)
+
+
+
+def main(argv: List[str] = None):
+
+    parser = argparse.ArgumentParser(prog="fasterpc", description="fasterpc command line")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="serve an endpoint from several worker processes sharing one port")
+
+    serve.add_argument("target", help="module:attribute - a WebsocketRPCEndpoint, or RpcMethodsBase instance or class")
+
+    serve.add_argument("--host", default="127.0.0.1")
+
+    serve.add_argument("--port", type=int, default=8000)
+
+    serve.add_argument("--path", default="/ws", help="websocket route")
+
+    serve.add_argument("-w", "--workers", type=int, default=None, help="worker processes, defaults to the number of cores")
+
+    serve.add_argument("--stats-interval", type=float, default=5, help="seconds between aggregated reports, 0 to disable")
+
+    serve.add_argument("--json", action="store_true", help="print reports as JSON lines")
+
+    serve.add_argument("--loop", choices=event_loop.LOOPS, default=None,
+
+                       help=f"event loop, defaults to ${event_loop.ENV_VAR} or auto (uvloop when installed)")
+
+    args = parser.parse_args(argv)
+
+    # targets given relative to the working directory, like uvicorn does
+
+    if "" not in sys.path: sys.path.insert(0, "")
+
+    # a target that can't load would only show up as workers crashing in a loop
+
+    try:
+
+        load_endpoint(args.target, WorkerStats())
+
+    except Exception as e:
+
+        parser.error(f"can't serve {args.target}: {e!r}")
+
+    supervisor = Supervisor(args.target, args.host, args.port, args.workers, args.path, args.loop,
+
+                            stats_interval=args.stats_interval or 1)
+
+    signal.signal(signal.SIGTERM, lambda *_: supervisor.stop())
+
+    supervisor.start()
+
+    print(f"Serving {args.target} on ws://{args.host}:{supervisor.port}{args.path} with {len(supervisor.workers)} workers", flush=True)
+
+    report = None
+
+    if args.stats_interval > 0:
+
+        report = (lambda view: print(json.dumps(view), flush=True)) if args.json else print_view
+
+    try:
+
+        supervisor.run(report)
+
+    except KeyboardInterrupt:
+
+        supervisor.stop()
+
+        supervisor._shutdown()
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,222 @@
+import time
+
+from collections import OrderedDict, deque
+
+from typing import Deque, Optional
+
+
+
+from .schemas import RpcMessage
+
+from .utils import gen_token
+
+
+
+SESSION_KEY = "session"
+
+
+
+class PENDING:
+
+    pass
+
+
+
+class CallDedupeWindow:
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 1024):
+
+        self.ttl = ttl
+
+        self.max_size = max_size
+
+        # call_id -> (expires_at, response or PENDING)
+
+        self._calls: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+
+    def _purge(self):
+
+        now = time.monotonic()
+
+        while self._calls:
+
+            call_id, (expires_at, _) = next(iter(self._calls.items()))
+
+            if expires_at > now and len(self._calls) <= self.max_size:
+
+                break
+
+            self._calls.popitem(last=False)
+
+
+
+    def get(self, call_id):
+
+        entry = self._calls.get(call_id)
+
+        if entry is None or entry[0] < time.monotonic():
+
+            return None
+
+        return entry[1]
+
+
+
+    def start(self, call_id):
+
+        self._purge()
+
+        # running calls must not expire, completion re-inserts them with a fresh ttl
+
+        self._calls[call_id] = (float("inf"), PENDING)
+
+
+
+    def complete(self, call_id, response):
+
+        self._calls.pop(call_id, None)
+
+        self._calls[call_id] = (time.monotonic() + self.ttl, response)
+
+
+
+    def discard(self, call_id):
+
+        self._calls.pop(call_id, None)
+
+
+
+class RpcSession:
+
+    def __init__(self, token: str = None, max_outbox: int = 1024, dedupe_ttl: float = 30.0, ack_every: int = 32):
+
+        self.token = token or gen_token()
+
+        self.max_outbox = max_outbox
+
+        self.ack_every = ack_every
+
+        # sent messages the other side has not acknowledged yet, in seq order
+
+        self.outbox: Deque[RpcMessage] = deque()
+
+        self.last_sent_seq = 0
+
+        self.last_received_seq = 0
+
+        self.connected = True
+
+        self.calls = CallDedupeWindow(dedupe_ttl, max_size=max_outbox)
+
+        self._received_since_ack = 0
+
+
+
+    def stamp(self, message: RpcMessage) -> RpcMessage:
+
+        self.last_sent_seq += 1
+
+        message.seq = self.last_sent_seq
+
+        message.ack = self.last_received_seq
+
+        self._received_since_ack = 0
+
+        self.outbox.append(message)
+
+        if len(self.outbox) > self.max_outbox:
+
+            self.outbox.popleft()
+
+        return message
+
+
+
+    # Takes back the latest stamp(), for a message that turned out unsendable
+
+    def unstamp(self, message: RpcMessage):
+
+        if self.outbox and self.outbox[-1] is message: self.outbox.pop()
+
+        self.last_sent_seq -= 1
+
+
+
+    def on_ack(self, ack: int):
+
+        outbox = self.outbox
+
+        while outbox and outbox[0].seq <= ack:
+
+            outbox.popleft()
+
+
+
+    # Returns False for messages that should not be processed (duplicates and bare acks)
+
+    def on_message(self, data: dict) -> bool:
+
+        ack = data.get("ack")
+
+        if ack is not None:
+
+            self.on_ack(ack)
+
+        seq = data.get("seq")
+
+        if seq is None:
+
+            return "request" in data or "response" in data
+
+        if seq <= self.last_received_seq:
+
+            return False
+
+        self.last_received_seq = seq
+
+        self._received_since_ack += 1
+
+        return True
+
+
+
+    def ack_due(self) -> bool:
+
+        return self._received_since_ack >= self.ack_every
+
+
+
+    def ack_message(self) -> dict:
+
+        self._received_since_ack = 0
+
+        return {"ack": self.last_received_seq}
+
+
+
+    # Whether the outbox still holds everything the other side has not seen
+
+    def can_replay(self, peer_ack: int) -> bool:
+
+        self.on_ack(peer_ack)
+
+        if self.outbox:
+
+            return self.outbox[0].seq == peer_ack + 1
+
+        return self.last_sent_seq <= peer_ack
+
+
+
+    def handshake(self, resumed: Optional[bool] = None, complete: bool = True) -> dict:
+
+        info = {"token": self.token, "ack": self.last_received_seq}
+
+        if resumed is not None:
+
+            info.update(resumed=resumed, complete=complete)
+
+        return {SESSION_KEY: info}
+
@@ -1,11 +1,49 @@
 import json
 
+import time
+
 from abc import ABC, abstractmethod
 
 from .utils import pydantic_serialize
 
 
 
+# resumable-session fields, left off the wire when a channel has no session
+
+SESSION_FIELDS = {"seq", "ack"}
+
+# optional request fields, left off the wire while unset
+
+OPTIONAL_REQUEST_FIELDS = ("priority", "deadline", "traceparent")
+
+OPTIONAL_RESPONSE_FIELDS = ("error",)
+
+
+
+def _unset_fields(msg):
+
+    exclude = {}
+
+    if getattr(msg, "seq", None) is None:
+
+        exclude.update(dict.fromkeys(SESSION_FIELDS, True))
+
+    for field, optional in (("request", OPTIONAL_REQUEST_FIELDS), ("response", OPTIONAL_RESPONSE_FIELDS)):
+
+        part = getattr(msg, field, None)
+
+        if part is not None:
+
+            unset = {name: True for name in optional if getattr(part, name, None) is None}
+
+            if unset:
+
+                exclude[field] = unset
+
+    return exclude
+
+
+
 class SimpleWebSocket(ABC):
 
     @abstractmethod
@@ -46,6 +84,14 @@ class JsonSerializingWebSocket(SimpleWebSocket):
 
         self._websocket = websocket
 
+        # size of the last received frame, used for byte rate limits
+
+        self.last_recv_size = 0
+
+        # called with (msg, seconds) after each serialization while a CallProfiler is attached
+
+        self.on_serialized = None
+
 
 
     async def connect(self, uri: str, **connect_kwargs):
@@ -56,6 +102,18 @@ class JsonSerializingWebSocket(SimpleWebSocket):
 
     def _serialize(self, msg):
 
+        # control frames (keep-alive etc.) are plain dicts
+
+        if isinstance(msg, dict):
+
+            return json.dumps(msg)
+
+        exclude = _unset_fields(msg)
+
+        if exclude:
+
+            return pydantic_serialize(msg, exclude=exclude)
+
         return pydantic_serialize(msg)
 
 
@@ -68,7 +126,17 @@ class JsonSerializingWebSocket(SimpleWebSocket):
 
     async def send(self, msg):
 
-        await self._websocket.send(self._serialize(msg))
+        if self.on_serialized is None:
+
+            return await self._websocket.send(self._serialize(msg))
+
+        start = time.perf_counter()
+
+        data = self._serialize(msg)
+
+        self.on_serialized(msg, time.perf_counter() - start)
+
+        await self._websocket.send(data)
 
 
 
@@ -80,6 +148,8 @@ class JsonSerializingWebSocket(SimpleWebSocket):
 
             return None
 
+        self.last_recv_size = len(msg)
+
         return self._deserialize(msg)
 
 
@@ -0,0 +1,310 @@
+import asyncio
+
+from typing import Coroutine, List, Optional, Set, Tuple, Type
+
+from urllib.parse import urlsplit
+
+
+
+from .admission import AdmissionController
+
+from .framing import MAX_FRAME_SIZE, FrameTooLargeError, encode_frame, read_frame
+
+from .logger import get_logger
+
+from .rpc_channel import RpcChannel
+
+from .rpc_methods import RpcMethodsBase
+
+from .schemas import WebSocketFrameType
+
+from .simplewebsocket import SimpleWebSocket, JsonSerializingWebSocket
+
+
+
+logger = get_logger("RPC_STREAM")
+
+
+
+STREAM_SCHEMES = ("tcp", "unix")
+
+
+
+def is_stream_uri(uri: str) -> bool:
+
+    return uri.split("://", 1)[0] in STREAM_SCHEMES
+
+
+
+# "tcp://host:port" -> ("tcp", host, port); "unix:///path/to.sock" -> ("unix", path, None)
+
+def parse_stream_uri(uri: str) -> Tuple[str, str, Optional[int]]:
+
+    parts = urlsplit(uri)
+
+    if parts.scheme == "tcp":
+
+        if not parts.hostname or parts.port is None:
+
+            raise ValueError(f"Expected tcp://host:port, got {uri!r}")
+
+        return "tcp", parts.hostname, parts.port
+
+    if parts.scheme == "unix":
+
+        path = parts.netloc + parts.path
+
+        if not path:
+
+            raise ValueError(f"Expected unix:///path/to.sock, got {uri!r}")
+
+        return "unix", path, None
+
+    raise ValueError(f"Unsupported stream uri {uri!r}")
+
+
+
+class StreamSocket(SimpleWebSocket):
+
+    """
+
+    SimpleWebSocket over a plain asyncio stream (TCP or Unix domain socket) with length-prefixed frames
+
+    - no HTTP upgrade, masking or websocket framing.
+
+    """
+
+
+
+    def __init__(self, reader: asyncio.StreamReader = None, writer: asyncio.StreamWriter = None,
+
+                 frame_type: WebSocketFrameType = WebSocketFrameType.Text, max_frame_size: int = MAX_FRAME_SIZE):
+
+        self._reader = reader
+
+        self._writer = writer
+
+        self.frame_type = frame_type
+
+        self.max_frame_size = max_frame_size
+
+
+
+    async def connect(self, uri: str, **connect_kwargs):
+
+        scheme, address, port = parse_stream_uri(uri)
+
+        if scheme == "tcp":
+
+            self._reader, self._writer = await asyncio.open_connection(address, port, **connect_kwargs)
+
+        else:
+
+            self._reader, self._writer = await asyncio.open_unix_connection(address, **connect_kwargs)
+
+
+
+    async def send(self, msg):
+
+        self._writer.write(encode_frame(msg.encode() if isinstance(msg, str) else msg))
+
+        await self._writer.drain()
+
+
+
+    async def recv(self):
+
+        if self._reader is None:
+
+            return None
+
+        try:
+
+            frame = await read_frame(self._reader, self.max_frame_size)
+
+        except FrameTooLargeError as e:
+
+            # the stream can't be resynchronized past a frame we won't read - end it like a lost connection,
+
+            # so pending calls fail now instead of at their timeouts
+
+            logger.warning("Closing stream: %s", e)
+
+            await self.close()
+
+            return None
+
+        if frame is None or self.frame_type == WebSocketFrameType.Binary:
+
+            return frame
+
+        return frame.decode()
+
+
+
+    async def close(self, code: int = 1000):
+
+        if self._writer is None or self._writer.is_closing():
+
+            return
+
+        self._writer.close()
+
+        try:
+
+            await self._writer.wait_closed()
+
+        except (ConnectionError, OSError): pass
+
+
+
+class StreamRpcServer:
+
+    """Serves RpcChannels over tcp:// or unix:// uris - the stream counterpart of WebsocketRPCEndpoint"""
+
+
+
+    def __init__(self, methods: RpcMethodsBase = None,
+
+                 on_disconnect: List[Coroutine] = None,
+
+                 on_connect: List[Coroutine] = None,
+
+                 on_channel_created: List[Coroutine] = None,
+
+                 frame_type: WebSocketFrameType = WebSocketFrameType.Text,
+
+                 serializing_socket_cls: Type[SimpleWebSocket] = JsonSerializingWebSocket,
+
+                 rpc_channel_get_remote_id: bool = False,
+
+                 max_frame_size: int = MAX_FRAME_SIZE,
+
+                 request_concurrency: int = 1,
+
+                 admission: AdmissionController = None):
+
+        self.methods = methods if methods is not None else RpcMethodsBase()
+
+        self._on_disconnect = on_disconnect
+
+        self._on_connect = on_connect
+
+        self._on_channel_created = on_channel_created
+
+        self._frame_type = frame_type
+
+        self._serializing_socket_cls = serializing_socket_cls
+
+        self._rpc_channel_get_remote_id = rpc_channel_get_remote_id
+
+        self._max_frame_size = max_frame_size
+
+        self._request_concurrency = request_concurrency
+
+        self.admission = admission
+
+        self.channels: Set[RpcChannel] = set()
+
+        self._server = None
+
+
+
+    async def start(self, uri: str, **server_kwargs):
+
+        scheme, address, port = parse_stream_uri(uri)
+
+        if scheme == "tcp":
+
+            self._server = await asyncio.start_server(self.main_loop, address, port, **server_kwargs)
+
+        else:
+
+            self._server = await asyncio.start_unix_server(self.main_loop, address, **server_kwargs)
+
+        logger.info("Listening on %s", uri)
+
+        return self
+
+
+
+    async def serve_forever(self, uri: str, **server_kwargs):
+
+        await self.start(uri, **server_kwargs)
+
+        async with self._server:
+
+            await self._server.serve_forever()
+
+
+
+    @property
+
+    def sockets(self):
+
+        return self._server.sockets if self._server is not None else ()
+
+
+
+    async def close(self):
+
+        if self._server is not None:
+
+            self._server.close()
+
+            await self._server.wait_closed()
+
+        for channel in list(self.channels):
+
+            await channel.socket.close()
+
+
+
+    async def main_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, **kwargs):
+
+        socket = self._serializing_socket_cls(StreamSocket(reader, writer, frame_type=self._frame_type,
+
+                                                           max_frame_size=self._max_frame_size))
+
+        channel = RpcChannel(self.methods, socket, sync_channel_id=self._rpc_channel_get_remote_id,
+
+                             request_concurrency=self._request_concurrency,
+
+                             admission=self.admission.connection() if self.admission is not None else None, **kwargs)
+
+        self.channels.add(channel)
+
+        try:
+
+            if self._on_channel_created:
+
+                await asyncio.gather(*(callback(channel) for callback in self._on_channel_created))
+
+            channel.register_connect_handler(self._on_connect)
+
+            channel.register_disconnect_handler(self._on_disconnect)
+
+            await channel.on_connect()
+
+            while True:
+
+                data = await socket.recv()
+
+                if data is None:
+
+                    break
+
+                await channel.on_message(data)
+
+        except Exception:
+
+            logger.exception("Stream connection failed")
+
+        finally:
+
+            self.channels.discard(channel)
+
+            await channel.on_disconnect()
+
+            await socket.close()
+
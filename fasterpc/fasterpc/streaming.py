@@ -0,0 +1,410 @@
+import json
+
+import re
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+
+_WHITESPACE = re.compile(r"\s*")
+
+# a string's body up to its closing quote, or up to the end of the piece (a trailing backslash left over)
+
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+
+_STRUCTURAL = re.compile(r'["\[\]{},:]')
+
+# inside an element's containers only nesting and strings matter
+
+_NESTING = re.compile(r'["\[\]{}]')
+
+_decoder = json.JSONDecoder()
+
+# _emit() value placeholder: decode the buffered element text
+
+_BUFFERED = object()
+
+
+
+class ArrayStreamDecoder:
+
+    """
+
+    Decodes a JSON document fed in pieces, handing each element of the array at `path` (by default a response's
+
+    result, {"response": {"result": [...]}}) to `on_element` as soon as it is complete. Elements within one piece
+
+    are decoded directly; one spanning pieces is tracked by a scanner resuming where the last piece ended, and
+
+    only its text is buffered. on_element returning False stops the streaming: that
+
+    element and the rest of the array then stay in the document. finish() returns the document with the
+
+    streamed elements left out - the array replaced by null, or holding the elements that weren't streamed.
+
+    """
+
+
+
+    def __init__(self, on_element: Callable[[Any], Optional[bool]], path: Sequence[str] = ("response", "result")):
+
+        self._on_element = on_element
+
+        self._path = list(path)
+
+        # text before the array's "[", and after the last streamed element
+
+        self._prefix: List[str] = []
+
+        self._rest: Optional[List[str]] = None
+
+        # where fed text goes once there is nothing left to scan
+
+        self._tail: Optional[List[str]] = None
+
+        self._found = False
+
+        self._streaming = False
+
+        self._stopped = False
+
+        # scanner state, carried from one piece to the next
+
+        self._in_string = False
+
+        self._escaped = False
+
+        self._depth = 0
+
+        # before the array: open containers, the key of each open object, the last string read
+
+        self._containers: List[str] = []
+
+        self._keys: List[Optional[str]] = []
+
+        self._string: List[str] = []
+
+        self._last_string: Optional[str] = None
+
+        self._value_next = False
+
+        # pieces of the element being received
+
+        self._element: Optional[List[str]] = None
+
+        self._held = 0
+
+        self.count = 0
+
+
+
+    @property
+
+    def buffered(self) -> int:
+
+        return self._held
+
+
+
+    def feed(self, text: str):
+
+        if not text:
+
+            return
+
+        if self._tail is not None:
+
+            self._tail.append(text)
+
+            self._held += len(text)
+
+        elif self._streaming:
+
+            self._scan_elements(text, 0)
+
+        else:
+
+            self._scan_prefix(text)
+
+
+
+    def _skip_string(self, text: str, pos: int, collect: bool = False) -> int:
+
+        """Position after the closing quote of the string being read, or the end of `text` while it goes on"""
+
+        if self._escaped:
+
+            self._escaped = False
+
+            pos += 1
+
+        end = _STRING_BODY.match(text, pos).end()
+
+        if collect: self._string.append(text[pos:end])
+
+        if end < len(text) and text[end] == '"':
+
+            self._in_string = False
+
+            return end + 1
+
+        # stopped at a backslash ending the piece, its escaped character comes with the next one
+
+        if end < len(text): self._escaped = True
+
+        return len(text)
+
+
+
+    def _scan_prefix(self, text: str):
+
+        pos, size = 0, len(text)
+
+        while pos < size:
+
+            if self._in_string:
+
+                pos = self._skip_string(text, pos, collect=True)
+
+                if not self._in_string: self._last_string = "".join(self._string)
+
+                continue
+
+            if self._value_next:
+
+                pos = _WHITESPACE.match(text, pos).end()
+
+                if pos >= size:
+
+                    break
+
+                self._value_next = False
+
+                if text[pos] != "[":
+
+                    # not an array - nothing to stream, the document is decoded whole
+
+                    self._tail = self._prefix
+
+                    break
+
+                self._append(self._prefix, text[:pos])
+
+                self._found = self._streaming = True
+
+                return self._scan_elements(text, pos + 1)
+
+            match = _STRUCTURAL.search(text, pos)
+
+            if match is None:
+
+                break
+
+            char, pos = match.group(), match.end()
+
+            if char == '"':
+
+                self._in_string = True
+
+                self._string = []
+
+            elif char in "[{":
+
+                self._containers.append(char)
+
+                self._keys.append(None)
+
+            elif char in "]}":
+
+                if self._containers:
+
+                    self._containers.pop()
+
+                    self._keys.pop()
+
+            elif char == ",":
+
+                if self._keys: self._keys[-1] = None
+
+            elif self._containers and self._containers[-1] == "{":
+
+                self._keys[-1] = self._last_string
+
+                # a key at the array's position - only that one counts, not a same-named key nested deeper
+
+                self._value_next = self._keys == self._path and all(container == "{" for container in self._containers)
+
+        self._append(self._prefix, text)
+
+
+
+    def _scan_elements(self, text: str, pos: int):
+
+        size, start = len(text), pos
+
+        while pos < size:
+
+            if self._element is None:
+
+                pos = _WHITESPACE.match(text, pos).end()
+
+                if pos >= size:
+
+                    break
+
+                char = text[pos]
+
+                if char == "]":
+
+                    self._streaming = False
+
+                    self._rest = self._tail = []
+
+                    self._append(self._rest, text[pos + 1:])
+
+                    return
+
+                if char == ",":
+
+                    pos += 1
+
+                    continue
+
+                try:
+
+                    value, end = _decoder.raw_decode(text, pos)
+
+                except json.JSONDecodeError:
+
+                    end = None
+
+                # a number or literal is only complete once followed by a delimiter - "15" may go on as "15.5"
+
+                after = _WHITESPACE.match(text, end).end() if end is not None else 0
+
+                if end is not None and (char in '[{"' or text[after:after + 1] in (",", "]")):
+
+                    if not self._emit(text, pos, end, value):
+
+                        return
+
+                    pos = end
+
+                    continue
+
+                self._element, start = [], pos
+
+            if self._in_string:
+
+                pos = self._skip_string(text, pos)
+
+                if not self._in_string and self._depth == 0 and not self._emit(text, start, pos):
+
+                    return
+
+                continue
+
+            match = (_NESTING if self._depth else _STRUCTURAL).search(text, pos)
+
+            if match is None:
+
+                pos = size
+
+                break
+
+            char, at = match.group(), match.start()
+
+            pos = at + 1
+
+            if char == '"':
+
+                self._in_string = True
+
+            elif char in "[{":
+
+                self._depth += 1
+
+            elif char in "]}" and self._depth > 0:
+
+                self._depth -= 1
+
+                if self._depth == 0 and not self._emit(text, start, pos):
+
+                    return
+
+            elif char != ":" and self._depth == 0:
+
+                # "," or the array's "]" ends a number or literal - "15" may still continue as "15.5" before that
+
+                pos = at
+
+                if not self._emit(text, start, at):
+
+                    return
+
+        if self._element is not None: self._append(self._element, text[start:])
+
+
+
+    def _emit(self, text: str, start: int, end: int, value: Any = _BUFFERED) -> bool:
+
+        """Hands on the element ending at `end` in `text`; False once streaming stopped"""
+
+        if value is _BUFFERED:
+
+            self._element.append(text[start:end])
+
+            element_text = "".join(self._element)
+
+            self._held -= len(element_text) - (end - start)
+
+            self._element = None
+
+            value = json.loads(element_text)
+
+        else:
+
+            element_text = None
+
+        if self._on_element(value) is False:
+
+            # the consumer can't take more - this element and everything after it stay in the document
+
+            self._streaming = False
+
+            self._stopped = True
+
+            self._rest = self._tail = []
+
+            self._append(self._rest, element_text if element_text is not None else text[start:end])
+
+            self._append(self._rest, text[end:])
+
+            return False
+
+        self.count += 1
+
+        return True
+
+
+
+    def _append(self, pieces: List[str], text: str):
+
+        pieces.append(text)
+
+        self._held += len(text)
+
+
+
+    def finish(self) -> Dict[str, Any]:
+
+        if not self._found:
+
+            return json.loads("".join(self._prefix))
+
+        if self._rest is None:
+
+            raise ValueError("JSON document ended inside the streamed array")
+
+        return json.loads("".join(self._prefix) + ("[" if self._stopped else "null") + "".join(self._rest))
+
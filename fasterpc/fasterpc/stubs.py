@@ -0,0 +1,262 @@
+# Typed client stubs: one class per RpcMethodsBase (or remote description), with prebuilt methods that check
+
+# argument names locally. Source for type checkers: python -m fasterpc.stubs my_app.methods:ServerMethods
+
+import inspect
+
+import sys
+
+from importlib import import_module
+
+from typing import Any, Dict, List, Type, Union
+
+
+
+from .rpc_methods import RpcMethodsBase
+
+
+
+MethodDescription = Dict[str, Any]
+
+MethodsLike = Union[RpcMethodsBase, Type[RpcMethodsBase], Dict[str, MethodDescription]]
+
+
+
+class _Unset:
+
+    def __repr__(self):
+
+        return "UNSET"
+
+
+
+# default of optional parameters in stubs - left out of the call so the remote default applies
+
+UNSET = _Unset()
+
+
+
+# names from the methods' own module are left unqualified, rendered stubs star-import that module
+
+def _annotation(annotation, module: str):
+
+    if annotation is inspect.Parameter.empty:
+
+        return None
+
+    return inspect.formatannotation(annotation).replace(f"{module}.", "")
+
+
+
+def _public_methods(methods):
+
+    cls = methods if isinstance(methods, type) else type(methods)
+
+    for name in dir(cls):
+
+        member = getattr(cls, name)
+
+        if not name.startswith("_") and inspect.isfunction(member):
+
+            yield name, member
+
+
+
+def describe_methods(methods: Union[RpcMethodsBase, Type[RpcMethodsBase]]) -> Dict[str, MethodDescription]:
+
+    description = {}
+
+    module = (methods if isinstance(methods, type) else type(methods)).__module__
+
+    for name, function in _public_methods(methods):
+
+        method_signature = inspect.signature(function)
+
+        params = list(method_signature.parameters.values())[1:]
+
+        description[name] = {
+
+            "params": [{"name": p.name, "annotation": _annotation(p.annotation, module), "required": p.default is p.empty}
+
+                       for p in params if p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)],
+
+            "var_keyword": any(p.kind == p.VAR_KEYWORD for p in params),
+
+            "returns": _annotation(method_signature.return_annotation, module),
+
+            "doc": inspect.getdoc(function),
+
+        }
+
+    return description
+
+
+
+class RpcStub:
+
+    """Base of generated stubs; wraps a channel (e.g. `client.channel`)"""
+
+    __slots__ = ("_channel", "_options")
+
+
+
+    def __init__(self, channel, **options):
+
+        self._channel = channel
+
+        self._options = options
+
+
+
+    def _with_options(self, **options) -> "RpcStub":
+
+        return type(self)(self._channel, **{**self._options, **options})
+
+
+
+    def _call(self, name: str, arguments: Dict[str, Any]):
+
+        return self._channel.call(name, arguments, **self._options)
+
+
+
+def _make_method(name: str, method: MethodDescription):
+
+    names = frozenset(p["name"] for p in method["params"])
+
+    required = frozenset(p["name"] for p in method["params"] if p["required"])
+
+    var_keyword = method["var_keyword"]
+
+
+
+    def call(self, **kwds):
+
+        if not (var_keyword or names.issuperset(kwds)):
+
+            raise TypeError(f"{name}() got unexpected arguments {sorted(set(kwds) - names)}")
+
+        if not required.issubset(kwds):
+
+            raise TypeError(f"{name}() missing required arguments {sorted(required - set(kwds))}")
+
+        return self._channel.call(name, kwds, **self._options)
+
+    call.__name__ = call.__qualname__ = name
+
+    call.__doc__ = method["doc"]
+
+    call.__signature__ = inspect.Signature(
+
+        [inspect.Parameter("self", inspect.Parameter.POSITIONAL_ONLY)] +
+
+        [inspect.Parameter(p["name"], inspect.Parameter.KEYWORD_ONLY, annotation=p["annotation"] or inspect.Parameter.empty,
+
+                           default=inspect.Parameter.empty if p["required"] else UNSET) for p in method["params"]])
+
+    return call
+
+
+
+def _description(methods: MethodsLike) -> Dict[str, MethodDescription]:
+
+    return methods if isinstance(methods, dict) else describe_methods(methods)
+
+
+
+def _default_name(methods: MethodsLike) -> str:
+
+    if isinstance(methods, dict):
+
+        return "RemoteMethodsStub"
+
+    return f"{(methods if isinstance(methods, type) else type(methods)).__name__}Stub"
+
+
+
+def generate_stub(methods: MethodsLike, name: str = None) -> Type[RpcStub]:
+
+    namespace = {method_name: _make_method(method_name, method) for method_name, method in _description(methods).items()}
+
+    namespace["__slots__"] = ()
+
+    return type(name or _default_name(methods), (RpcStub,), namespace)
+
+
+
+async def fetch_stub(channel, name: str = None, **options) -> RpcStub:
+
+    """Builds a stub from the other side's own description of its methods"""
+
+    description = (await channel.call("_describe_methods_")).result
+
+    return generate_stub(description, name)(channel, **options)
+
+
+
+def render_stub(methods: MethodsLike, name: str = None) -> str:
+
+    """Python source of a typed stub module, for type checkers and IDE autocomplete"""
+
+    lines = ["from __future__ import annotations", "from typing import *", "",
+
+             "from fasterpc.schemas import RpcResponse", "from fasterpc.stubs import UNSET, RpcStub"]
+
+    if not isinstance(methods, dict):
+
+        cls = methods if isinstance(methods, type) else type(methods)
+
+        lines.append(f"from {cls.__module__} import *")
+
+    lines += ["", "", f"class {name or _default_name(methods)}(RpcStub):", "    __slots__ = ()"]
+
+    for method_name, method in _description(methods).items():
+
+        params = "".join(f", {p['name']}: {p['annotation'] or 'Any'}" + ("" if p["required"] else " = UNSET")
+
+                         for p in method["params"])
+
+        params = (", *" + params if params else "") + (", **kwargs: Any" if method["var_keyword"] else "")
+
+        arguments = ", ".join(f"{p['name']!r}: {p['name']}" for p in method["params"])
+
+        lines += ["", f"    async def {method_name}(self{params}) -> RpcResponse[{method['returns'] or 'Any'}]:"]
+
+        if method["doc"]:
+
+            lines.append(f"        {method['doc']!r}")
+
+        arguments = f"{{{arguments}}}"
+
+        if method["var_keyword"]:
+
+            arguments = f"{{**{arguments}, **kwargs}}"
+
+        if not all(p["required"] for p in method["params"]):
+
+            arguments = f"{{k: v for k, v in {arguments}.items() if v is not UNSET}}"
+
+        lines.append(f"        return await self._call({method_name!r}, {arguments})")
+
+    return "\n".join(lines) + "\n"
+
+
+
+def main(argv: List[str] = None):
+
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) != 1 or ":" not in argv[0]:
+
+        sys.exit("usage: python -m fasterpc.stubs module:MethodsClass")
+
+    module_name, class_name = argv[0].split(":", 1)
+
+    print(render_stub(getattr(import_module(module_name), class_name)), end="")
+
+
+
+if __name__ == "__main__":
+
+    main()
+
@@ -0,0 +1,290 @@
+import asyncio
+
+import itertools
+
+import threading
+
+from collections import deque
+
+from concurrent.futures import Future
+
+from typing import Any, Deque, Dict, List, Tuple
+
+
+
+from .logger import get_logger
+
+from .loop import new_event_loop
+
+from .rpc_channel import DEFAULT_TIMEOUT
+
+from .rpc_methods import RpcMethodsBase
+
+from .websocket_rpc_client import WebSocketRpcClient
+
+
+
+logger = get_logger("RPC_SYNC_CLIENT")
+
+
+
+class SyncProxy:
+
+    __slots__ = ("_client",)
+
+
+
+    def __init__(self, client: "SyncRpcClient"):
+
+        self._client = client
+
+
+
+    def __getattr__(self, name: str):
+
+        if name.startswith("_"):
+
+            raise AttributeError(name)
+
+        return lambda **arguments: self._client.call(name, arguments)
+
+
+
+class SyncRpcClient:
+
+    """
+
+    Blocking facade for threaded code: one background event-loop thread owns `connections` WebSocketRpcClients
+
+    (all calls multiplexed over them) and serves calls from any number of threads. Calls are queued and the
+
+    loop is woken once per batch - not once per call - and each caller blocks on its own future.
+
+    """
+
+
+
+    def __init__(self, uri: str, methods: RpcMethodsBase = None, connections: int = 1, loop: str = None, **client_kwargs):
+
+        self.uri = uri
+
+        self.methods = methods
+
+        self.connections = connections
+
+        self._loop_name = loop
+
+        self._client_kwargs = client_kwargs
+
+        self.clients: List[WebSocketRpcClient] = []
+
+        self._loop: asyncio.AbstractEventLoop = None
+
+        self._thread: threading.Thread = None
+
+        self._pending: Deque[Tuple[str, Dict, Any, Any, Future]] = deque()
+
+        self._lock = threading.Lock()
+
+        self._wakeup_scheduled = False
+
+        self._next_client = None
+
+        # how often the loop thread had to be woken up, for comparing against the number of calls
+
+        self.wakeups = 0
+
+
+
+    def connect(self) -> "SyncRpcClient":
+
+        ready = threading.Event()
+
+        self._loop = new_event_loop(self._loop_name)
+
+
+
+        def run():
+
+            asyncio.set_event_loop(self._loop)
+
+            self._loop.call_soon(ready.set)
+
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fasterpc-sync-client", daemon=True)
+
+        self._thread.start()
+
+        ready.wait()
+
+        try:
+
+            self.clients = self._run(self._connect_all())
+
+        except BaseException:
+
+            self._stop_loop()
+
+            raise
+
+        self._next_client = itertools.cycle(self.clients)
+
+        return self
+
+
+
+    async def _connect_all(self) -> List[WebSocketRpcClient]:
+
+        clients = [WebSocketRpcClient(self.uri, self.methods._copy_() if self.methods is not None else None, **self._client_kwargs)
+
+                   for _ in range(self.connections)]
+
+        return list(await asyncio.gather(*(client.__aenter__() for client in clients)))
+
+
+
+    async def _close_all(self):
+
+        await asyncio.gather(*(client.close() for client in self.clients), return_exceptions=True)
+
+        # the clients' cancelled tasks (readers, keep-alives) must run to their end before the loop stops
+
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+
+        for task in tasks: task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+
+    def close(self):
+
+        if self._loop is None:
+
+            return
+
+        try:
+
+            self._run(self._close_all())
+
+        finally:
+
+            self._stop_loop()
+
+            self.clients = []
+
+
+
+    def _stop_loop(self):
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+        self._thread.join()
+
+        self._loop.close()
+
+        self._loop = None
+
+
+
+    def __enter__(self):
+
+        return self.connect()
+
+
+
+    def __exit__(self, *args):
+
+        self.close()
+
+
+
+    def _run(self, coroutine):
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+
+
+    def submit(self, name: str, args: Dict = None, timeout=DEFAULT_TIMEOUT, priority=None) -> Future:
+
+        """Queues a call and returns a future of its RpcResponse; usable from any thread but the loop's own."""
+
+        if self._loop is None:
+
+            raise RuntimeError("SyncRpcClient is not connected")
+
+        if threading.current_thread() is self._thread:
+
+            raise RuntimeError("SyncRpcClient can't be called from its own event loop, use its .clients there")
+
+        future = Future()
+
+        self._pending.append((name, args or {}, timeout, priority, future))
+
+        with self._lock:
+
+            # the loop drains everything queued until it runs - later calls ride along on the same wakeup
+
+            if self._wakeup_scheduled:
+
+                return future
+
+            self._wakeup_scheduled = True
+
+            self.wakeups += 1
+
+        self._loop.call_soon_threadsafe(self._drain)
+
+        return future
+
+
+
+    def call(self, name: str, args: Dict = None, timeout=DEFAULT_TIMEOUT, priority=None) -> Any:
+
+        """Blocking call, returns the result"""
+
+        return self.submit(name, args, timeout, priority).result().result
+
+
+
+    @property
+
+    def other(self) -> SyncProxy:
+
+        return SyncProxy(self)
+
+
+
+    def _drain(self):
+
+        with self._lock:
+
+            self._wakeup_scheduled = False
+
+        pending = self._pending
+
+        while pending:
+
+            name, args, timeout, priority, future = pending.popleft()
+
+            if future.set_running_or_notify_cancel():
+
+                asyncio.ensure_future(self._call(next(self._next_client), name, args, timeout, priority, future))
+
+
+
+    async def _call(self, client: WebSocketRpcClient, name, args, timeout, priority, future: Future):
+
+        try:
+
+            response = await client.channel.call(name, args, timeout=timeout, priority=priority)
+
+        except BaseException as e:
+
+            future.set_exception(e)
+
+        else:
+
+            future.set_result(response)
+
@@ -0,0 +1,378 @@
+import asyncio
+
+import copy
+
+from collections import deque
+
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+
+from pydantic import BaseModel
+
+
+
+from .logger import get_logger
+
+from .rpc_methods import RpcMethodsBase
+
+from .utils import pydantic_dump
+
+
+
+logger = get_logger("RPC_SYNCED")
+
+
+
+# JSON-patch (RFC 6902) style operations, limited to what diff() produces: add, remove and replace
+
+def _escape(token: str) -> str:
+
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+
+def _unescape(token: str) -> str:
+
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+
+def _same_kind(old: Any, new: Any) -> bool:
+
+    # 1 == True == 1.0 in Python, not once serialized
+
+    if isinstance(old, (dict, list)):
+
+        return isinstance(new, dict if isinstance(old, dict) else list)
+
+    return type(old) is type(new)
+
+
+
+def diff(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+
+    """Operations turning `old` into `new`. Dicts and equally long lists are diffed per item, anything else replaced."""
+
+    if not _same_kind(old, new):
+
+        return [{"op": "replace", "path": path, "value": new}]
+
+    if isinstance(old, dict):
+
+        ops = []
+
+        for key, value in new.items():
+
+            child = f"{path}/{_escape(str(key))}"
+
+            if key not in old:
+
+                ops.append({"op": "add", "path": child, "value": value})
+
+            else:
+
+                ops.extend(diff(old[key], value, child))
+
+        ops.extend({"op": "remove", "path": f"{path}/{_escape(str(key))}"} for key in old if key not in new)
+
+        return ops
+
+    if isinstance(old, list) and len(old) == len(new):
+
+        ops = []
+
+        for index, (before, after) in enumerate(zip(old, new)):
+
+            ops.extend(diff(before, after, f"{path}/{index}"))
+
+        return ops
+
+    return [] if old == new else [{"op": "replace", "path": path, "value": new}]
+
+
+
+def apply_patch(document: Any, ops: List[Dict[str, Any]]) -> Any:
+
+    """Applies `ops` in place where possible and returns the result (a new object when the root is replaced)."""
+
+    for op in ops:
+
+        path = op["path"]
+
+        if not path:
+
+            document = op["value"]
+
+            continue
+
+        *parents, last = [_unescape(token) for token in path[1:].split("/")]
+
+        target = document
+
+        for token in parents:
+
+            target = target[int(token)] if isinstance(target, list) else target[token]
+
+        if isinstance(target, list):
+
+            last = int(last)
+
+        if op["op"] == "remove":
+
+            del target[last]
+
+        else:
+
+            target[last] = op["value"]
+
+    return document
+
+
+
+class SyncedObjectMethods(RpcMethodsBase):
+
+    """
+
+    Mixin for the receiving side's methods: keeps the last version of every synced object pushed to this channel
+
+    in `synced_objects`. Override _on_synced_object_ to react to updates. Not for _shared_ methods objects.
+
+    """
+
+
+
+    @property
+
+    def synced_objects(self) -> Dict[str, Any]:
+
+        state = self.__dict__.get("_synced_state_")
+
+        if state is None:
+
+            state = self.__dict__["_synced_state_"] = {}
+
+        return {key: value for key, (version, value) in state.items()}
+
+
+
+    def _synced_version_(self, key: str) -> Optional[int]:
+
+        entry = self.__dict__.get("_synced_state_", {}).get(key)
+
+        return entry[0] if entry is not None else None
+
+
+
+    async def _on_synced_object_(self, key: str, value: Any):
+
+        pass
+
+
+
+    async def sync_object(self, key: str, version: int, base: Optional[int] = None, patch: Optional[List[Dict[str, Any]]] = None,
+
+                          snapshot: Any = None) -> Dict[str, Any]:
+
+        state = self.__dict__.get("_synced_state_")
+
+        if state is None:
+
+            state = self.__dict__["_synced_state_"] = {}
+
+        current = state.get(key)
+
+        if patch is not None:
+
+            # the delta is against a version we don't have - ask for a snapshot instead
+
+            if current is None or current[0] != base:
+
+                return {"resync": True, "version": current[0] if current is not None else None}
+
+            try:
+
+                value = apply_patch(current[1], patch)
+
+            except (KeyError, IndexError, TypeError, ValueError):
+
+                # possibly half applied, our copy can't be trusted anymore
+
+                del state[key]
+
+                return {"resync": True, "version": None}
+
+        else:
+
+            value = snapshot
+
+        state[key] = (version, value)
+
+        await self._on_synced_object_(key, value)
+
+        return {"version": version}
+
+
+
+class SyncedObjects:
+
+    """
+
+    Sender side: set() records a new version of an object and its delta from the previous one, once for all
+
+    channels. push() sends a channel the deltas since the version it last acknowledged, or a full snapshot when
+
+    it has none (new or reconnected channel), lags more than `history` versions behind, or reports a mismatch.
+
+    """
+
+
+
+    def __init__(self, history: int = 16, method: str = "sync_object"):
+
+        self.history = history
+
+        self.method = method
+
+        # key -> (version, value)
+
+        self._objects: Dict[str, Tuple[int, Any]] = {}
+
+        # key -> patches of the last `history` versions, as (version, ops)
+
+        self._patches: Dict[str, Deque[Tuple[int, List[Dict[str, Any]]]]] = {}
+
+        # channel id -> key -> acknowledged version
+
+        self._acked: Dict[str, Dict[str, int]] = {}
+
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+
+
+    def set(self, key: str, value: Any) -> int:
+
+        value = pydantic_dump(value) if isinstance(value, BaseModel) else copy.deepcopy(value)
+
+        previous = self._objects.get(key)
+
+        if previous is None:
+
+            version = 1
+
+            self._patches[key] = deque(maxlen=self.history)
+
+        else:
+
+            ops = diff(previous[1], value)
+
+            if not ops:
+
+                return previous[0]
+
+            version = previous[0] + 1
+
+            self._patches[key].append((version, ops))
+
+        self._objects[key] = (version, value)
+
+        return version
+
+
+
+    def get(self, key: str) -> Any:
+
+        return self._objects[key][1]
+
+
+
+    def _delta(self, key: str, base: int) -> Optional[List[Dict[str, Any]]]:
+
+        patches = self._patches[key]
+
+        if not patches or patches[0][0] > base + 1:
+
+            return None
+
+        return [op for version, ops in patches if version > base for op in ops]
+
+
+
+    async def push(self, channel, key: str, timeout: float = None) -> int:
+
+        """Brings `channel` up to date on `key`; returns the version it acknowledged."""
+
+        lock = self._locks.get((channel.id, key))
+
+        if lock is None:
+
+            lock = self._locks[(channel.id, key)] = asyncio.Lock()
+
+        async with lock:
+
+            version, value = self._objects[key]
+
+            acked = self._acked.setdefault(channel.id, {})
+
+            base = acked.get(key)
+
+            if base == version:
+
+                return version
+
+            arguments = {"key": key, "version": version}
+
+            timeout_option = {"timeout": timeout} if timeout is not None else {}
+
+            patch = self._delta(key, base) if base is not None else None
+
+            if patch is not None:
+
+                response = await channel.call(self.method, {**arguments, "base": base, "patch": patch}, **timeout_option)
+
+                if response.result.get("resync"):
+
+                    logger.debug("Channel %s lost %s at version %s, resending it whole", channel.id, key, response.result.get('version'))
+
+                    patch = None
+
+            if patch is None:
+
+                await channel.call(self.method, {**arguments, "snapshot": value}, **timeout_option)
+
+            acked[key] = version
+
+            return version
+
+
+
+    async def publish(self, key: str, value: Any, channels, timeout: float = None) -> int:
+
+        """set() and push to every channel; a failing channel doesn't hold back the others."""
+
+        version = self.set(key, value)
+
+        channels = list(channels)
+
+        results = await asyncio.gather(*(self.push(channel, key, timeout) for channel in channels), return_exceptions=True)
+
+        for channel, result in zip(channels, results):
+
+            if isinstance(result, Exception):
+
+                logger.warning("Failed pushing %s to channel %s: %r", key, channel.id, result)
+
+        return version
+
+
+
+    def forget(self, channel):
+
+        """Drops what `channel` acknowledged - call on disconnect; a channel coming back then gets snapshots."""
+
+        self._acked.pop(channel.id, None)
+
+        for lock_key in [lock_key for lock_key in self._locks if lock_key[0] == channel.id]:
+
+            del self._locks[lock_key]
+
@@ -0,0 +1,312 @@
+import json
+
+import random
+
+import time
+
+from contextlib import nullcontext
+
+from contextvars import ContextVar
+
+from typing import Any, Dict, List, Optional, Union
+
+
+
+from .logger import get_logger
+
+
+
+logger = get_logger("RPC_TRACING")
+
+
+
+CLIENT = "client"
+
+SERVER = "server"
+
+INTERNAL = "internal"
+
+
+
+# returned by span() while tracing is off, so `with tracing.span(...)` costs next to nothing
+
+NO_SPAN = nullcontext()
+
+
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("fasterpc_current_span", default=None)
+
+
+
+def _random_id(bits: int) -> str:
+
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+
+class SpanExporter:
+
+    def export(self, span: "Span"):
+
+        raise NotImplementedError()
+
+
+
+    def close(self):
+
+        pass
+
+
+
+class InMemorySpanExporter(SpanExporter):
+
+    def __init__(self):
+
+        self.spans: List[Span] = []
+
+
+
+    def export(self, span: "Span"):
+
+        self.spans.append(span)
+
+
+
+class JsonlSpanExporter(SpanExporter):
+
+    def __init__(self, path: str):
+
+        self._file = open(path, "a", buffering=1)
+
+
+
+    def export(self, span: "Span"):
+
+        self._file.write(json.dumps(span.to_dict(), default=repr) + "\n")
+
+
+
+    def close(self):
+
+        self._file.close()
+
+
+
+class Span:
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "kind", "sampled", "start_time", "end_time",
+
+                 "attributes", "status", "_token")
+
+
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+
+                 kind: str = INTERNAL, attributes: Dict[str, Any] = None):
+
+        self.tracer = tracer
+
+        self.trace_id = trace_id
+
+        self.span_id = _random_id(64)
+
+        self.parent_id = parent_id
+
+        self.name = name
+
+        self.kind = kind
+
+        self.sampled = sampled
+
+        self.attributes = attributes if sampled and attributes else {}
+
+        self.status = "ok"
+
+        self.start_time = time.time()
+
+        self.end_time = None
+
+        self._token = None
+
+
+
+    @property
+
+    def traceparent(self) -> str:
+
+        # W3C trace context: version-trace_id-parent_id-flags
+
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+
+    @property
+
+    def duration(self) -> Optional[float]:
+
+        return self.end_time - self.start_time if self.end_time is not None else None
+
+
+
+    def set_attribute(self, key: str, value: Any):
+
+        if self.sampled: self.attributes[key] = value
+
+
+
+    def end(self):
+
+        if self.end_time is not None:
+
+            return
+
+        self.end_time = time.time()
+
+        if self.sampled:
+
+            try:
+
+                self.tracer.exporter.export(self)
+
+            except Exception:
+
+                logger.exception("Failed exporting span")
+
+
+
+    def __enter__(self):
+
+        self._token = _current_span.set(self)
+
+        return self
+
+
+
+    def __exit__(self, exc_type, exc, tb):
+
+        _current_span.reset(self._token)
+
+        if exc is not None:
+
+            self.status = "error"
+
+            self.set_attribute("error", repr(exc))
+
+        self.end()
+
+
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+
+                "kind": self.kind, "start": self.start_time, "end": self.end_time, "duration": self.duration,
+
+                "status": self.status, "attributes": self.attributes}
+
+
+
+def parse_traceparent(traceparent: str):
+
+    try:
+
+        version, trace_id, span_id, flags = traceparent.split("-")
+
+        return trace_id, span_id, int(flags, 16) & 1 == 1
+
+    except (AttributeError, ValueError):
+
+        return None
+
+
+
+class Tracer:
+
+    def __init__(self, exporter: SpanExporter, sample_rate: float = 1.0):
+
+        self.exporter = exporter
+
+        self.sample_rate = sample_rate
+
+
+
+    # `parent` defaults to the current span; a traceparent string continues a remote trace
+
+    def start_span(self, name: str, kind: str = INTERNAL, parent: Union[Span, str, None] = None,
+
+                   attributes: Dict[str, Any] = None) -> Span:
+
+        if parent is None:
+
+            parent = _current_span.get()
+
+        if isinstance(parent, str):
+
+            parent = parse_traceparent(parent)
+
+            if parent is not None:
+
+                return Span(self, name, parent[0], parent[1], parent[2], kind, attributes)
+
+        elif parent is not None:
+
+            return Span(self, name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes)
+
+        # head sampling - decided once at the root, children and remote hops follow the flag
+
+        return Span(self, name, _random_id(128), None, random.random() < self.sample_rate, kind, attributes)
+
+
+
+# the active tracer, None while tracing is off
+
+tracer: Optional[Tracer] = None
+
+
+
+def configure(exporter: SpanExporter, sample_rate: float = 1.0) -> Tracer:
+
+    global tracer
+
+    tracer = Tracer(exporter, sample_rate)
+
+    return tracer
+
+
+
+def disable():
+
+    global tracer
+
+    if tracer is not None: tracer.exporter.close()
+
+    tracer = None
+
+
+
+def span(name: str, kind: str = INTERNAL, parent: Union[Span, str, None] = None, **attributes):
+
+    if tracer is None:
+
+        return NO_SPAN
+
+    return tracer.start_span(name, kind, parent, attributes)
+
+
+
+def current_span() -> Optional[Span]:
+
+    return _current_span.get()
+
+
+
+def current_traceparent() -> Optional[str]:
+
+    if tracer is None:
+
+        return None
+
+    current = _current_span.get()
+
+    return current.traceparent if current is not None else None
+
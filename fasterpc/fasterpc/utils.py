@@ -1,3 +1,5 @@
+import json
+
 import os
 
 import uuid
@@ -30,9 +32,9 @@ class RandomUtils(object):
 
         return (
 
-            uuid.UUID(int=SystemRandom().getrandbits(size / 2)).hex
+            uuid.UUID(int=SystemRandom().getrandbits(size // 2)).hex
 
-            + uuid.UUID(int=SystemRandom().getrandbits(size / 2)).hex
+            + uuid.UUID(int=SystemRandom().getrandbits(size // 2)).hex
 
         )
 
@@ -44,31 +46,51 @@ gen_token = RandomUtils.gen_token
 
 
 
+# Resolved once at import; the helpers below are on the per-message path.
+
+PYDANTIC_PRE_V2 = version.parse(pydantic.VERSION) < version.parse("2.0.0")
+
+
+
 def is_pydantic_pre_v2():
 
-    return version.parse(pydantic.VERSION) < version.parse("2.0.0")
+    return PYDANTIC_PRE_V2
 
 
 
-def pydantic_serialize(model, **kwargs):
+if PYDANTIC_PRE_V2:
 
-    if is_pydantic_pre_v2():
+    def pydantic_serialize(model, **kwargs):
 
         return model.json(**kwargs)
 
-    else:
 
-        return model.model_dump_json(**kwargs)
 
+    def pydantic_dump(model):
+
+        return json.loads(model.json())
 
 
-def pydantic_parse(model, data, **kwargs):
 
-    if is_pydantic_pre_v2():
+    def pydantic_parse(model, data, **kwargs):
 
         return model.parse_obj(data, **kwargs)
 
-    else:
+else:
+
+    def pydantic_serialize(model, **kwargs):
+
+        return model.model_dump_json(**kwargs)
+
+
+
+    def pydantic_dump(model):
+
+        return model.model_dump(mode="json")
+
+
+
+    def pydantic_parse(model, data, **kwargs):
 
         return model.model_validate(data, **kwargs)
 
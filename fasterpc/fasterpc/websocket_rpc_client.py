@@ -2,20 +2,26 @@ import asyncio
 
 import logging
 
+import random
+
 from typing import List, Type
 
 from tenacity import retry, RetryCallState, wait, retry_if_exception
 
 
 
-from .rpc_methods import PING_RESPONSE, RpcMethodsBase
+from .rpc_methods import RpcMethodsBase
 
 from .rpc_channel import RpcChannel, OnConnectCallback, OnDisconnectCallback
 
 from .logger import get_logger
 
+from .session import SESSION_KEY, RpcSession
+
 from .simplewebsocket import SimpleWebSocket, JsonSerializingWebSocket
 
+from .stream_socket import StreamSocket, is_stream_uri
+
 
 
 logger = get_logger("RPC_CLIENT")
@@ -84,7 +90,11 @@ class WebSocketRpcClient:
 
     def logerror(retry_state: RetryCallState):
 
-        logger.exception(retry_state.outcome.exception())
+        error = retry_state.outcome.exception()
+
+        # the traceback is rendered by the handler - off the loop in QUEUED logging mode
+
+        logger.error("Giving up connecting after %s attempts: %r", retry_state.attempt_number, error, exc_info=error)
 
 
 
@@ -112,8 +122,22 @@ class WebSocketRpcClient:
 
                  keep_alive: float = 0,
 
+                 keep_alive_timeout: float = None,
+
+                 keep_alive_max_missed: int = 3,
+
                  websocket_client_handler_cls: Type[SimpleWebSocket] = None,
 
+                 resumable: bool = False,
+
+                 session_max_outbox: int = 1024,
+
+                 session_handshake_timeout: float = 5,
+
+                 request_concurrency: int = 1,
+
+                 serializing_socket_cls: Type[SimpleWebSocket] = JsonSerializingWebSocket,
+
                  **kwargs):
 
         self.methods = methods or RpcMethodsBase()
@@ -130,6 +154,10 @@ class WebSocketRpcClient:
 
         self._keep_alive_interval = keep_alive
 
+        self._keep_alive_timeout = keep_alive_timeout
+
+        self._keep_alive_max_missed = keep_alive_max_missed
+
         self.default_response_timeout = default_response_timeout
 
         self.channel = None
@@ -140,24 +168,90 @@ class WebSocketRpcClient:
 
         self._on_connect = on_connect
 
-        self._websocket_client_handler_cls = websocket_client_handler_cls or WebSocketsClientHandler
+        # tcp:// and unix:// uris skip the websocket layer entirely
 
+        self._websocket_client_handler_cls = websocket_client_handler_cls or (StreamSocket if is_stream_uri(uri) else WebSocketsClientHandler)
 
+        self._resumable = resumable
 
-    async def __connect__(self):
+        self._session_max_outbox = session_max_outbox
+
+        self._session_handshake_timeout = session_handshake_timeout
+
+        self._request_concurrency = request_concurrency
+
+        self._serializing_socket_cls = serializing_socket_cls
+
+        self._closing = False
+
+        self._migration_task = None
+
+        # connections left behind by a migration, still finishing their calls -> the task closing each once idle
+
+        self._retired_sockets = {}
+
+
+
+    async def _open_socket(self):
 
         raw_ws = self._websocket_client_handler_cls()
 
-        self.ws = JsonSerializingWebSocket(raw_ws)
+        ws = self._serializing_socket_cls(raw_ws)
+
+        await ws.connect(self.uri, **self.connect_kwargs)
+
+        return ws
+
+
+
+    async def _handshake(self, ws, session: RpcSession = None) -> dict:
+
+        await ws.send(session.handshake() if session is not None else {SESSION_KEY: {"token": None, "ack": 0}})
+
+        try:
+
+            reply = await asyncio.wait_for(ws.recv(), self._session_handshake_timeout)
+
+        except asyncio.TimeoutError:
+
+            reply = None
+
+        if reply is None or SESSION_KEY not in reply:
+
+            raise ConnectionError("Endpoint did not answer the session handshake (is it resumable?)")
+
+        return reply[SESSION_KEY]
+
+
+
+    def _create_channel(self, session: RpcSession = None):
 
-        await self.ws.connect(self.uri, **self.connect_kwargs)
+        self.channel = RpcChannel(self.methods, self.ws, default_response_timeout=self.default_response_timeout, session=session,
 
-        self.channel = RpcChannel(self.methods, self.ws, default_response_timeout=self.default_response_timeout)
+                                  request_concurrency=self._request_concurrency)
 
         self.channel.register_connect_handler(self._on_connect)
 
         self.channel.register_disconnect_handler(self._on_disconnect)
 
+        self.channel.register_goaway_handler([self._on_goaway])
+
+
+
+    async def __connect__(self):
+
+        self._closing = False
+
+        self.ws = await self._open_socket()
+
+        session = None
+
+        if self._resumable:
+
+            session = RpcSession((await self._handshake(self.ws))["token"], max_outbox=self._session_max_outbox)
+
+        self._create_channel(session)
+
         self._read_task = asyncio.create_task(self.reader())
 
         if self._keep_alive_interval > 0:
@@ -186,6 +280,8 @@ class WebSocketRpcClient:
 
     async def close(self):
 
+        self._closing = True
+
         if self.ws: await self.ws.close()
 
         if self.channel and not self.channel.isClosed():
@@ -198,6 +294,14 @@ class WebSocketRpcClient:
 
         if self._keep_alive_task: self._keep_alive_task.cancel()
 
+        if self._migration_task: self._migration_task.cancel()
+
+        for ws, closer in list(self._retired_sockets.items()):
+
+            closer.cancel()
+
+            await ws.close()
+
 
 
     async def reader(self):
@@ -206,10 +310,22 @@ class WebSocketRpcClient:
 
             while True:
 
-                raw_message = await self.ws.recv()
+                ws, channel = self.ws, self.channel
+
+                raw_message = await ws.recv()
+
+                if ws is not self.ws and channel is not self.channel:
+
+                    # migrated to a new connection meanwhile - this task stays with the old one until it ends
+
+                    return await self._retire(ws, channel, raw_message)
 
                 if raw_message is None:
 
+                    if self._resumable and not self._closing and await self._resume():
+
+                        continue
+
                     await self.close()
 
                     break
@@ -220,17 +336,191 @@ class WebSocketRpcClient:
 
 
 
+    async def _resume(self) -> bool:
+
+        self.channel.session.connected = False
+
+        logger.info("Connection lost, resuming session")
+
+        try:
+
+            if self.retry_config is False: await self._reconnect()
+
+            else: await retry(**self.retry_config)(self._reconnect)()
+
+            return True
+
+        except Exception:
+
+            logger.exception("Failed to resume session")
+
+            return False
+
+
+
+    async def _reconnect(self):
+
+        ws = await self._open_socket()
+
+        channel = self.channel
+
+        reply = await self._handshake(ws, channel.session)
+
+        self.ws = ws
+
+        if reply.get("resumed"):
+
+            channel.socket = ws
+
+            complete = await channel.replay(reply["ack"])
+
+            # one side lost messages from its bounded outbox - re-issue pending calls, the other side dedupes by call id
+
+            if not (complete and reply.get("complete", True)):
+
+                await channel.resend_pending_requests()
+
+        else:
+
+            logger.warning("Endpoint no longer knows our session, starting a new one")
+
+            await channel.on_disconnect()
+
+            self._create_channel(RpcSession(reply["token"], max_outbox=self._session_max_outbox))
+
+            await self.channel.on_connect()
+
+
+
+    async def _on_goaway(self, channel: RpcChannel, notice: dict):
+
+        if self._closing or channel is not self.channel or self._migration_task is not None:
+
+            return
+
+        logger.info("Endpoint is draining, moving to a new connection")
+
+        self._migration_task = asyncio.create_task(self._migrate(notice))
+
+
+
+    async def _migrate(self, notice: dict):
+
+        try:
+
+            # spread out, so the clients of a draining endpoint don't all reconnect at the same moment
+
+            await asyncio.sleep(notice.get("reconnect_after", 0) + random.uniform(0, notice.get("jitter", 0)))
+
+            connect = self._open_socket if self.retry_config is False else retry(**self.retry_config)(self._open_socket)
+
+            ws = await connect()
+
+            session = None
+
+            if self._resumable:
+
+                session = RpcSession((await self._handshake(ws))["token"], max_outbox=self._session_max_outbox)
+
+            old_ws, old_channel = self.ws, self.channel
+
+            self._retired_sockets[old_ws] = asyncio.create_task(self._close_when_idle(old_ws, old_channel))
+
+            # new calls go out on the new connection from here on, the old one finishes what it has in flight
+
+            self.ws = ws
+
+            self._create_channel(session)
+
+            self._read_task = asyncio.create_task(self.reader())
+
+            await self.channel.on_connect()
+
+        except asyncio.CancelledError: pass
+
+        except Exception:
+
+            logger.exception("Failed moving to a new connection, staying on the draining one")
+
+        finally:
+
+            self._migration_task = None
+
+
+
+    @staticmethod
+
+    def _awaiting_responses(channel: RpcChannel) -> bool:
+
+        # answered calls stay in `requests` until their caller picks the response up
+
+        return bool(channel.requests.keys() - channel.responses.keys())
+
+
+
+    async def _close_when_idle(self, ws, channel: RpcChannel):
+
+        # our calls answered, and the endpoint's calls to us handled - their responses went out before `busy` clears
+
+        while self._awaiting_responses(channel) or channel.busy:
+
+            await asyncio.sleep(0.05)
+
+        await ws.close()
+
+
+
+    async def _retire(self, ws, channel: RpcChannel, raw_message):
+
+        try:
+
+            while raw_message is not None:
+
+                await channel.on_message(raw_message)
+
+                raw_message = await ws.recv()
+
+        finally:
+
+            # calls still pending when the endpoint closed the connection fail now
+
+            channel._mark_closed()
+
+            closer = self._retired_sockets.pop(ws, None)
+
+            if closer is not None: closer.cancel()
+
+
+
     async def _keep_alive(self):
 
         try:
 
             while True:
 
-                await asyncio.sleep(self._keep_alive_interval)
+                channel = self.channel
+
+                await channel.keep_alive(self._keep_alive_interval, self._keep_alive_timeout, self._keep_alive_max_missed)
+
+                # the channel was replaced after a failed resume, keep watching the new one
+
+                if self.channel is not channel: continue
+
+                if channel.isClosed() or not self._resumable or self._closing: break
+
+                # drop the dead socket, the reader resumes the session
 
-                answer = await self.channel.other._ping_()
+                channel.session.connected = False
 
-                assert answer.result == PING_RESPONSE
+                await self.ws.close()
+
+            # peer is dead - fail pending calls right away, don't wait for the close handshake
+
+            if not channel.isClosed():
+
+                await channel.on_disconnect()
+
+            await self.close()
 
         except asyncio.CancelledError: pass
 
@@ -241,3 +531,11 @@ class WebSocketRpcClient:
     def other(self):
 
         return self.channel.other
+
+
+
+    @property
+
+    def rtt(self):
+
+        return self.channel.rtt if self.channel else None
@@ -1,11 +1,17 @@
 import asyncio
 
-from typing import Coroutine, List, Type
+import time
+
+from typing import Coroutine, Dict, List, Type
 
 from fastapi import WebSocket, WebSocketDisconnect
 
+from .admission import AdmissionController
+
 from .connection_manager import ConnectionManager
 
+from .profiling import CallProfiler
+
 from .rpc_channel import RpcChannel
 
 from .rpc_methods import RpcMethodsBase
@@ -14,6 +20,8 @@ from .logger import get_logger
 
 from .schemas import WebSocketFrameType
 
+from .session import SESSION_KEY, RpcSession
+
 from .simplewebsocket import SimpleWebSocket, JsonSerializingWebSocket
 
 
@@ -22,6 +30,16 @@ logger = get_logger("RPC_ENDPOINT")
 
 
 
+# policy violation - a resumable endpoint got a client without a session handshake
+
+SESSION_REQUIRED_CLOSE_CODE = 1008
+
+# new connections while draining
+
+SERVICE_RESTART_CLOSE_CODE = 1012
+
+
+
 class WebSocketSimplifier(SimpleWebSocket):
 
     def __init__(self, websocket: WebSocket, frame_type: WebSocketFrameType = WebSocketFrameType.Text):
@@ -74,7 +92,27 @@ class WebsocketRPCEndpoint:
 
                  serializing_socket_cls: Type[SimpleWebSocket] = JsonSerializingWebSocket,
 
-                 rpc_channel_get_remote_id: bool = False):
+                 rpc_channel_get_remote_id: bool = False,
+
+                 keep_alive: float = 0,
+
+                 keep_alive_timeout: float = None,
+
+                 keep_alive_max_missed: int = 3,
+
+                 resumable: bool = False,
+
+                 session_ttl: float = 30,
+
+                 session_max_outbox: int = 1024,
+
+                 session_handshake_timeout: float = 5,
+
+                 request_concurrency: int = 1,
+
+                 admission: AdmissionController = None,
+
+                 profiler: CallProfiler = None):
 
         self.manager = manager if manager is not None else ConnectionManager()
 
@@ -92,31 +130,129 @@ class WebsocketRPCEndpoint:
 
         self._rpc_channel_get_remote_id = rpc_channel_get_remote_id
 
+        self._keep_alive_interval = keep_alive
+
+        self._keep_alive_timeout = keep_alive_timeout
+
+        self._keep_alive_max_missed = keep_alive_max_missed
+
+        self._resumable = resumable
+
+        self._session_ttl = session_ttl
+
+        self._session_max_outbox = session_max_outbox
+
+        # session token -> channel, kept for `session_ttl` after the socket drops
+
+        self._sessions: Dict[str, RpcChannel] = {}
+
+        self._session_expiry: Dict[str, asyncio.TimerHandle] = {}
+
+        self._session_handshake_timeout = session_handshake_timeout
+
+        self._keep_alive_tasks: Dict[str, asyncio.Task] = {}
+
+        self._request_concurrency = request_concurrency
+
+        self.admission = admission
+
+        # shared by all channels; profiling itself is switched on and off at runtime on the profiler
+
+        self.profiler = profiler
+
+        self.draining = False
+
 
 
     async def main_loop(self, websocket: WebSocket, client_id: str = None, **kwargs):
 
+        if self.draining:
+
+            # rejected before the handshake completes - clients retry, reaching a replica that isn't going away
+
+            return await websocket.close(SERVICE_RESTART_CLOSE_CODE)
+
         try:
 
             await self.manager.connect(websocket)
 
-            logger.info(f"Client connected")
+            logger.info("Client connected")
 
             simple_websocket = self._serializing_socket_cls(WebSocketSimplifier(websocket, frame_type=self._frame_type))
 
-            channel = RpcChannel(self.methods, simple_websocket, sync_channel_id=self._rpc_channel_get_remote_id, **kwargs)
+            channel = None
+
+            session = None
+
+            if self._resumable:
+
+                # resumable endpoints require clients to open with a session handshake
 
-            # Call on_channel_created callback if provided
+                try:
 
-            if self._on_channel_created:
+                    data = await asyncio.wait_for(simple_websocket.recv(), self._session_handshake_timeout)
 
-                await asyncio.gather(*(callback(channel) for callback in self._on_channel_created))
+                except asyncio.TimeoutError:
 
-            channel.register_connect_handler(self._on_connect)
+                    data = None
 
-            channel.register_disconnect_handler(self._on_disconnect)
+                if not isinstance(data, dict) or SESSION_KEY not in data:
 
-            await channel.on_connect()
+                    logger.warning("Client did not open with a session handshake, closing")
+
+                    await simple_websocket.close(SESSION_REQUIRED_CLOSE_CODE)
+
+                    self.manager.disconnect(websocket)
+
+                    return
+
+                channel = await self._resume_session(simple_websocket, data[SESSION_KEY])
+
+                if channel is None:
+
+                    session = RpcSession(max_outbox=self._session_max_outbox)
+
+                    await simple_websocket.send(session.handshake(resumed=False))
+
+            if channel is None:
+
+                channel = RpcChannel(self.methods, simple_websocket, sync_channel_id=self._rpc_channel_get_remote_id, session=session,
+
+                                      request_concurrency=self._request_concurrency,
+
+                                      admission=self.admission.connection() if self.admission is not None else None,
+
+                                      profiler=self.profiler, **kwargs)
+
+                if session is not None:
+
+                    self._sessions[session.token] = channel
+
+                # Call on_channel_created callback if provided
+
+                if self._on_channel_created:
+
+                    await asyncio.gather(*(callback(channel) for callback in self._on_channel_created))
+
+                channel.register_connect_handler(self._on_connect)
+
+                channel.register_disconnect_handler(self._on_disconnect)
+
+                self.manager.register_channel(channel)
+
+                await channel.on_connect()
+
+            keep_alive_task = None
+
+            if self._keep_alive_interval > 0:
+
+                # a resumed channel may still have the keep-alive of its previous socket running
+
+                previous = self._keep_alive_tasks.pop(channel.id, None)
+
+                if previous is not None: previous.cancel()
+
+                keep_alive_task = self._keep_alive_tasks[channel.id] = asyncio.create_task(self._keep_alive(channel))
 
             try:
 
@@ -126,13 +262,23 @@ class WebsocketRPCEndpoint:
 
                     await channel.on_message(data)
 
-            except WebSocketDisconnect:
+            except WebSocketDisconnect as e:
 
-                await self.handle_disconnect(websocket, channel)
+                await self.handle_disconnect(websocket, channel, simple_websocket, code=e.code)
 
             except Exception:
 
-                await self.handle_disconnect(websocket, channel)
+                await self.handle_disconnect(websocket, channel, simple_websocket)
+
+            finally:
+
+                if keep_alive_task:
+
+                    keep_alive_task.cancel()
+
+                    if self._keep_alive_tasks.get(channel.id) is keep_alive_task:
+
+                        del self._keep_alive_tasks[channel.id]
 
         except:
 
@@ -140,14 +286,188 @@ class WebsocketRPCEndpoint:
 
 
 
-    async def handle_disconnect(self, websocket, channel):
+    async def handle_disconnect(self, websocket, channel, socket=None, code=None):
 
         self.manager.disconnect(websocket)
 
+        session = channel.session
+
+        if session is not None:
+
+            # the session already moved on to a newer socket
+
+            if socket is not None and channel.socket is not socket:
+
+                return
+
+            # anything but a clean close may be a network blip - keep the session around for a resume
+
+            if code != 1000 and self._session_ttl > 0:
+
+                session.connected = False
+
+                self._session_expiry[session.token] = asyncio.get_running_loop().call_later(
+
+                    self._session_ttl, lambda: asyncio.ensure_future(self._expire_session(session.token)))
+
+                return
+
+            self._sessions.pop(session.token, None)
+
+        self.manager.unregister_channel(channel)
+
         await channel.on_disconnect()
 
 
 
+    async def _resume_session(self, socket: SimpleWebSocket, request: dict):
+
+        token = request.get("token")
+
+        channel = self._sessions.get(token) if token else None
+
+        if channel is None:
+
+            return None
+
+        expiry = self._session_expiry.pop(token, None)
+
+        if expiry is not None: expiry.cancel()
+
+        session = channel.session
+
+        session.connected = False
+
+        complete = session.can_replay(request.get("ack", 0))
+
+        await socket.send(session.handshake(resumed=True, complete=complete))
+
+        channel.socket = socket
+
+        await channel.replay(request.get("ack", 0))
+
+        logger.info("Resumed session of channel %s", channel.id)
+
+        return channel
+
+
+
+    async def _expire_session(self, token: str):
+
+        self._session_expiry.pop(token, None)
+
+        channel = self._sessions.pop(token, None)
+
+        if channel is not None:
+
+            logger.info("Session of channel %s expired", channel.id)
+
+            self.manager.unregister_channel(channel)
+
+            await channel.on_disconnect()
+
+
+
+    async def drain(self, deadline: float = 30, reconnect_after: float = 0, jitter: float = 5) -> Dict[str, int]:
+
+        """
+
+        Graceful shutdown: stops accepting connections and tells every client to move to a new one, within
+
+        `reconnect_after` + up to `jitter` seconds (spread so they don't all reconnect at once). Clients close
+
+        their old connection once the calls on it completed, in both directions; whatever is still open after
+
+        `deadline` seconds is closed, failing our calls still waiting on it (counted as `failed_calls`).
+
+        """
+
+        self.draining = True
+
+        channels = list(self.manager.channels.values())
+
+        logger.info("Draining %s channels", len(channels))
+
+        notices = await asyncio.gather(*(channel.send_goaway(reconnect_after=reconnect_after, jitter=jitter, deadline=deadline)
+
+                                         for channel in channels), return_exceptions=True)
+
+        for channel, notice in zip(channels, notices):
+
+            if isinstance(notice, Exception): logger.debug("Failed sending goaway on channel %s: %r", channel.id, notice)
+
+        end = time.monotonic() + deadline
+
+        while time.monotonic() < end and any(not channel.isClosed() for channel in channels):
+
+            await asyncio.sleep(0.05)
+
+        forced = [channel for channel in channels if not channel.isClosed()]
+
+        failed_calls = 0
+
+        for channel in forced:
+
+            if channel.busy: logger.warning("Closing channel %s with calls still running, drain deadline passed", channel.id)
+
+            # our own calls to the client - closing wakes them with RpcChannelClosedException
+
+            pending = len(channel.requests.keys() - channel.responses.keys())
+
+            if pending: logger.warning("Failing %s calls to the client of channel %s, drain deadline passed", pending, channel.id)
+
+            failed_calls += pending
+
+            try:
+
+                await channel.close()
+
+            except Exception:
+
+                logger.debug("Failed closing channel %s", channel.id)
+
+        # no resumes after a drain
+
+        for token in list(self._sessions):
+
+            expiry = self._session_expiry.pop(token, None)
+
+            if expiry is not None: expiry.cancel()
+
+            await self._expire_session(token)
+
+        return {"channels": len(channels), "migrated": len(channels) - len(forced), "forced": len(forced),
+
+                "failed_calls": failed_calls}
+
+
+
+    async def _keep_alive(self, channel: RpcChannel):
+
+        try:
+
+            await channel.keep_alive(self._keep_alive_interval, self._keep_alive_timeout, self._keep_alive_max_missed)
+
+            if channel.session is not None:
+
+                # only drop the socket, the session waits for the client to resume
+
+                await channel.socket.close()
+
+            else:
+
+                # closing the channel fails its pending calls; the main loop then runs the disconnect handlers
+
+                await channel.close()
+
+        except asyncio.CancelledError: pass
+
+        except Exception:
+
+            logger.exception("Failed closing unresponsive channel")
+
+
+
     def register_route(self, router, path="/ws", dependencies=None):
 
         @router.websocket(path, dependencies=dependencies)
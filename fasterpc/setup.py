@@ -30,5 +30,13 @@ setup(
 
     install_requires=install_requires,
 
+    extras_require={"uvloop": ["uvloop"]},
+
+    entry_points={
+
+        "console_scripts": ["fasterpc=fasterpc.serve:main", "fasterpc-loadgen=fasterpc.loadgen:main"],
+
+    },
+
 )
 
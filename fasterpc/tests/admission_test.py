@@ -0,0 +1,86 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.admission import AdmissionController, TokenBucket
+
+from fasterpc.rpc_channel import RpcOverloadedException
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+
+
+from conftest import connected_pair
+
+
+
+class CountingMethods(RpcMethodsBase):
+
+    calls = 0
+
+
+
+    async def work(self) -> int:
+
+        CountingMethods.calls += 1
+
+        await asyncio.sleep(0.05)
+
+        return CountingMethods.calls
+
+
+
+def test_token_bucket_reports_retry_after():
+
+    bucket = TokenBucket(rate=10, burst=2)
+
+    assert bucket.take() == 0 and bucket.take() == 0
+
+    assert 0 < bucket.take() <= 0.1
+
+
+
+@pytest.mark.asyncio
+
+async def test_rate_limited_calls_are_rejected_without_running():
+
+    CountingMethods.calls = 0
+
+    admission = AdmissionController(calls_per_second=(1, 2))
+
+    client, _, tasks = await connected_pair(CountingMethods(), request_concurrency=4, admission=admission.connection())
+
+    results = await asyncio.gather(*(client.call("work", timeout=1) for _ in range(4)), return_exceptions=True)
+
+    rejected = [r for r in results if isinstance(r, RpcOverloadedException)]
+
+    assert len(rejected) == 2 and all(r.retry_after > 0 for r in rejected)
+
+    assert CountingMethods.calls == 2 and admission.in_flight == 0
+
+    for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_global_in_flight_budget():
+
+    CountingMethods.calls = 0
+
+    admission = AdmissionController(max_in_flight=1, overload_retry_after=0.25)
+
+    client, _, tasks = await connected_pair(CountingMethods(), request_concurrency=4, admission=admission.connection())
+
+    results = await asyncio.gather(client.call("work", timeout=1), client.call("work", timeout=1), return_exceptions=True)
+
+    assert isinstance(results[1], RpcOverloadedException) and results[1].retry_after == 0.25
+
+    assert (await client.call("work", timeout=1)).result == 2
+
+    for task in tasks: task.cancel()
+
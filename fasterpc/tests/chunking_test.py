@@ -0,0 +1,176 @@
+import asyncio
+
+from functools import partial
+
+
+
+import pytest
+
+
+
+from fasterpc.chunking import CHUNK_MARKER, ChunkedSerializingWebSocket, MessageTooLargeError
+
+from fasterpc.rpc_channel import RESPONSE_TOO_LARGE, RpcRemoteError
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.session import RpcSession
+
+
+
+from conftest import QueueSocket, RecordingSocket, connected_pair
+
+
+
+class BlobMethods(RpcMethodsBase):
+
+    async def blob(self, size: int) -> str:
+
+        return "x" * size
+
+
+
+async def chunked_pair(session: RpcSession = None, **options):
+
+    # the server's frames are recorded, and slowed down so other traffic can interleave
+
+    return await connected_pair(BlobMethods(), serializer=partial(ChunkedSerializingWebSocket, **options),
+
+                                server_wire=partial(RecordingSocket, delay=0.001), request_concurrency=2, session=session)
+
+
+
+@pytest.mark.asyncio
+
+async def test_large_result_is_chunked_and_interleaved():
+
+    client, server, tasks = await chunked_pair(chunk_size=1000)
+
+    wire = server.socket._websocket
+
+    try:
+
+        big = asyncio.ensure_future(client.call("blob", {"size": 50000}, timeout=5))
+
+        await asyncio.sleep(0.01)
+
+        # answered while the big response is still going out
+
+        assert (await client.call("blob", {"size": 10}, timeout=5)).result == "x" * 10
+
+        assert (await big).result == "x" * 50000
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+    chunks = [i for i, frame in enumerate(wire.sent) if frame.startswith(CHUNK_MARKER)]
+
+    small = next(i for i, frame in enumerate(wire.sent) if '"xxxxxxxxxx"' in frame)
+
+    assert len(chunks) > 50 and chunks[0] < small < chunks[-1]
+
+    assert not client.socket._reassembly and client.socket._buffered == 0
+
+
+
+@pytest.mark.asyncio
+
+async def test_oversized_messages_are_dropped():
+
+    socket = ChunkedSerializingWebSocket(None, chunk_size=100, max_message_size=1000)
+
+    with pytest.raises(MessageTooLargeError):
+
+        list(socket.split({"data": "x" * 2000}))
+
+    sender = ChunkedSerializingWebSocket(None, chunk_size=100)
+
+    frames = list(sender.split({"data": "x" * 2000}))
+
+    inbox = asyncio.Queue()
+
+    for frame in frames + ['{"ping": 1}']:
+
+        inbox.put_nowait(frame)
+
+    receiver = ChunkedSerializingWebSocket(QueueSocket(inbox, None), chunk_size=100, max_message_size=1000)
+
+    # the whole oversized message is skipped, the next one comes through
+
+    assert await receiver.recv() == {"ping": 1}
+
+    assert receiver.dropped == 1 and not receiver._reassembly and not receiver._skipping
+
+
+
+@pytest.mark.asyncio
+
+async def test_reassembly_memory_is_bounded():
+
+    sender = ChunkedSerializingWebSocket(None, chunk_size=100)
+
+    first, second = list(sender.split({"data": "a" * 500})), list(sender.split({"data": "b" * 500}))
+
+    inbox = asyncio.Queue()
+
+    # two messages interleaved, together more than the receiver may buffer
+
+    for pair in zip(first, second):
+
+        for frame in pair: inbox.put_nowait(frame)
+
+    receiver = ChunkedSerializingWebSocket(QueueSocket(inbox, None), chunk_size=100, max_reassembly_size=800)
+
+    # whichever message's chunk overflows the budget is dropped, the other one completes
+
+    assert await receiver.recv() in ({"data": "a" * 500}, {"data": "b" * 500})
+
+    assert receiver.dropped == 1 and receiver._buffered == 0
+
+
+
+@pytest.mark.asyncio
+
+async def test_oversized_response_fails_the_call_not_the_session():
+
+    session = RpcSession()
+
+    client, server, tasks = await chunked_pair(session, chunk_size=1000, max_message_size=5000)
+
+    try:
+
+        with pytest.raises(RpcRemoteError) as error:
+
+            await client.call("blob", {"size": 10000}, timeout=5)
+
+        assert error.value.code == RESPONSE_TOO_LARGE
+
+        assert session.connected and not session.outbox
+
+        assert (await client.call("blob", {"size": 10}, timeout=5)).result == "x" * 10
+
+        assert [message.seq for message in session.outbox] == [1]
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_malformed_chunk_headers_are_dropped():
+
+    inbox = asyncio.Queue()
+
+    for frame in (CHUNK_MARKER + "no header", CHUNK_MARKER + "1,zz,|x", CHUNK_MARKER + "1,2|xx", '{"ping": 1}'):
+
+        inbox.put_nowait(frame)
+
+    receiver = ChunkedSerializingWebSocket(QueueSocket(inbox, None))
+
+    assert await receiver.recv() == {"ping": 1}
+
+    assert receiver.dropped == 3 and not receiver._reassembly
+
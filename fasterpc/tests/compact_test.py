@@ -0,0 +1,96 @@
+import asyncio
+
+import json
+
+
+
+import pytest
+
+
+
+from fasterpc.compact import CompactSerializingWebSocket
+
+from fasterpc.rpc_methods import RpcUtilityMethods
+
+from fasterpc.schemas import RpcMessage, RpcRequest
+
+from fasterpc.simplewebsocket import JsonSerializingWebSocket
+
+
+
+from conftest import RecordingSocket, connected_pair
+
+
+
+async def compact_pair():
+
+    client, server, tasks = await connected_pair(RpcUtilityMethods(), serializer=CompactSerializingWebSocket,
+
+                                                 client_wire=RecordingSocket)
+
+    await server.on_connect()
+
+    await client.on_connect()
+
+    return client, server, client.socket._websocket, tasks
+
+
+
+@pytest.mark.asyncio
+
+async def test_compact_round_trip_uses_method_ids():
+
+    client, server, wire, tasks = await compact_pair()
+
+    try:
+
+        # the server's table arrives before our first call
+
+        while not client.socket._peer_method_ids: await asyncio.sleep(0.01)
+
+        assert (await client.other.echo(text="hi")).result == "hi"
+
+        details = await client.other.get_process_details()
+
+        assert details.result["pid"] > 0
+
+        request = json.loads(wire.sent[-1])
+
+        assert request[0] == 0 and isinstance(request[1], int)
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+def test_compact_envelope_is_smaller():
+
+    message = RpcMessage(request=RpcRequest(method="echo", arguments={"text": "hi"}, call_id="c" * 32))
+
+    compact = CompactSerializingWebSocket(None)
+
+    compact._peer_method_ids = {"echo": 0}
+
+    encoded = compact._serialize(message)
+
+    assert len(encoded) < len(JsonSerializingWebSocket(None)._serialize(message)) / 2
+
+    compact._local_methods = ["echo"]
+
+    assert compact._deserialize(encoded)["request"]["method"] == "echo"
+
+    message.seq, message.ack = 7, 3
+
+    decoded = compact._deserialize(compact._serialize(message))
+
+    assert (decoded["seq"], decoded["ack"]) == (7, 3)
+
+
+
+def test_unknown_method_id_does_not_resolve():
+
+    compact = CompactSerializingWebSocket(None)
+
+    assert compact._deserialize("[0,5,{}]")["request"]["method"] == "#5"
+
@@ -0,0 +1,136 @@
+import asyncio
+
+
+
+from fasterpc.rpc_channel import RpcChannel
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.simplewebsocket import JsonSerializingWebSocket, SimpleWebSocket
+
+
+
+class QueueSocket(SimpleWebSocket):
+
+    def __init__(self, inbox, outbox):
+
+        self.inbox = inbox
+
+        self.outbox = outbox
+
+
+
+    async def connect(self, uri: str, **connect_kwargs): pass
+
+
+
+    async def send(self, msg):
+
+        await self.outbox.put(msg)
+
+
+
+    async def recv(self):
+
+        return await self.inbox.get()
+
+
+
+    async def close(self, code: int = 1000): pass
+
+
+
+class RecordingSocket(QueueSocket):
+
+    """Keeps what it sends; a `delay` per frame gives other traffic a chance to interleave"""
+
+
+
+    def __init__(self, inbox, outbox, delay: float = 0):
+
+        super().__init__(inbox, outbox)
+
+        self.delay = delay
+
+        self.sent = []
+
+
+
+    async def send(self, msg):
+
+        self.sent.append(msg)
+
+        if self.delay: await asyncio.sleep(self.delay)
+
+        await super().send(msg)
+
+
+
+class SlowMethods(RpcMethodsBase):
+
+    def __init__(self):
+
+        super().__init__()
+
+        self.started = 0
+
+        self.finished = 0
+
+        self.cancelled = 0
+
+
+
+    async def work(self, seconds: float) -> str:
+
+        self.started += 1
+
+        try:
+
+            await asyncio.sleep(seconds)
+
+        except asyncio.CancelledError:
+
+            self.cancelled += 1
+
+            raise
+
+        self.finished += 1
+
+        return "done"
+
+
+
+async def connected_pair(server_methods: RpcMethodsBase = None, client_methods: RpcMethodsBase = None,
+
+                         serializer=JsonSerializingWebSocket, client_wire=QueueSocket, server_wire=QueueSocket,
+
+                         **server_options):
+
+    """
+
+    Two channels talking over in-memory queues, each read by a pump task; returns (client, server, tasks).
+
+    `serializer` wraps both wires, the raw wires are reachable as channel.socket._websocket.
+
+    """
+
+    if server_methods is None: server_methods = RpcMethodsBase()
+
+    if client_methods is None: client_methods = RpcMethodsBase()
+
+    a, b = asyncio.Queue(), asyncio.Queue()
+
+    client = RpcChannel(client_methods, serializer(client_wire(a, b)))
+
+    server = RpcChannel(server_methods, serializer(server_wire(b, a)), **server_options)
+
+
+
+    async def pump(channel):
+
+        while True:
+
+            await channel.on_message(await channel.socket.recv())
+
+    return client, server, [asyncio.create_task(pump(client)), asyncio.create_task(pump(server))]
+
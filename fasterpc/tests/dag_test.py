@@ -0,0 +1,150 @@
+import asyncio
+
+import time
+
+
+
+import pytest
+
+
+
+from fasterpc.dag import DagAgentMethods, DagExecutor, Ref, ResultRef, ResultStore, Step, WorkflowError
+
+from fasterpc.stream_socket import StreamRpcServer
+
+from fasterpc.websocket_rpc_client import WebSocketRpcClient
+
+
+
+class Agent(DagAgentMethods):
+
+    async def rows(self, count: int) -> list:
+
+        return [{"id": i} for i in range(count)]
+
+
+
+    async def count(self, data: list) -> int:
+
+        return len(data)
+
+
+
+    async def wait(self, seconds: float, value: int = 0) -> int:
+
+        await asyncio.sleep(seconds)
+
+        return value
+
+
+
+    async def add(self, a: int, b: int) -> int:
+
+        return a + b
+
+
+
+    async def fail(self) -> int:
+
+        raise ValueError("no")
+
+
+
+async def start_agent():
+
+    agent = Agent()
+
+    # separate stores, as if each agent ran in its own process
+
+    agent.result_store = ResultStore()
+
+    server = await StreamRpcServer(agent, request_concurrency=8).start("tcp://127.0.0.1:0")
+
+    agent.public_uri = f"tcp://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    return agent, server
+
+
+
+@pytest.mark.asyncio
+
+async def test_by_reference_outputs_go_agent_to_agent():
+
+    (a, a_server), (b, b_server) = await start_agent(), await start_agent()
+
+    async with WebSocketRpcClient(a.public_uri, retry_config=False) as a_client, \
+
+            WebSocketRpcClient(b.public_uri, retry_config=False) as b_client:
+
+        executor = DagExecutor({"a": a_client, "b": b_client})
+
+        results = await executor.run([
+
+            Step("rows", "a", "rows", {"count": 1000}, by_reference=True),
+
+            Step("count", "b", "count", {"data": Ref("rows")}),
+
+            Step("kept", "a", "rows", {"count": 2}, by_reference=True),
+
+        ], timeout=5)
+
+        # the orchestrator only ever saw a reference to the rows
+
+        assert isinstance(results["rows"], ResultRef) and results["count"] == 1000
+
+        # consumed intermediates are released, final by_reference outputs wait to be fetched
+
+        assert list(a.result_store.results) == [results["kept"]["ref"]]
+
+        assert await executor.fetch(results["kept"], "a") == [{"id": 0}, {"id": 1}]
+
+        assert not a.result_store.results
+
+    await b.result_store.close()
+
+    await a_server.close()
+
+    await b_server.close()
+
+
+
+@pytest.mark.asyncio
+
+async def test_independent_steps_run_in_parallel():
+
+    agent, server = await start_agent()
+
+    async with WebSocketRpcClient(agent.public_uri, retry_config=False) as client:
+
+        executor = DagExecutor({"a": client})
+
+        start = time.monotonic()
+
+        results = await executor.run([
+
+            Step("left", "a", "wait", {"seconds": 0.2, "value": 1}),
+
+            Step("right", "a", "wait", {"seconds": 0.2, "value": 2}),
+
+            Step("sum", "a", "add", {"a": Ref("left"), "b": Ref("right")}),
+
+        ])
+
+        assert results["sum"] == 3 and time.monotonic() - start < 0.35
+
+
+
+        with pytest.raises(WorkflowError) as error:
+
+            # a raising handler sends no response, the run's timeout catches it
+
+            await executor.run([Step("bad", "a", "fail"), Step("after", "a", "add", {"a": Ref("bad"), "b": 1})], timeout=0.3)
+
+        assert error.value.step == "bad"
+
+        with pytest.raises(ValueError):
+
+            await executor.run([Step("x", "a", "add", {"a": Ref("y"), "b": 1}), Step("y", "a", "add", {"a": Ref("x"), "b": 1})])
+
+    await server.close()
+
@@ -0,0 +1,76 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.rpc_channel import RpcChannelClosedException, RpcTimeoutException
+
+
+
+from conftest import SlowMethods, connected_pair
+
+
+
+@pytest.mark.asyncio
+
+async def test_timeout_cancels_remote_handler():
+
+    methods = SlowMethods()
+
+    client, server, tasks = await connected_pair(methods)
+
+    with pytest.raises(RpcTimeoutException):
+
+        await client.call("work", {"seconds": 5}, timeout=0.1)
+
+    await asyncio.sleep(0.1)
+
+    assert server.methods.started == 1 and server.methods.cancelled == 1
+
+    assert not server._running and not client.requests
+
+    for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_caller_cancellation_propagates():
+
+    methods = SlowMethods()
+
+    client, server, tasks = await connected_pair(methods)
+
+    call = asyncio.create_task(client.call("work", {"seconds": 5}))
+
+    await asyncio.sleep(0.05)
+
+    call.cancel()
+
+    await asyncio.sleep(0.05)
+
+    assert server.methods.cancelled == 1
+
+    for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_timeout_is_still_a_channel_closed_error():
+
+    client, server, tasks = await connected_pair(SlowMethods())
+
+    with pytest.raises(RpcChannelClosedException):
+
+        await client.call("work", {"seconds": 1}, timeout=0.05)
+
+    response = await client.call("work", {"seconds": 0}, timeout=1)
+
+    assert response.result == "done"
+
+    for task in tasks: task.cancel()
+
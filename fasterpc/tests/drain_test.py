@@ -0,0 +1,166 @@
+import asyncio
+
+
+
+import pytest
+
+import uvicorn
+
+from fastapi import FastAPI
+
+
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.serve import reuseport_socket
+
+from fasterpc.websocket_rpc_client import WebSocketRpcClient
+
+from fasterpc.websocket_rpc_endpoint import WebsocketRPCEndpoint
+
+
+
+class Replica(RpcMethodsBase):
+
+    def __init__(self, name: str):
+
+        super().__init__()
+
+        self.name = name
+
+
+
+    async def work(self, seconds: float, tag: str) -> str:
+
+        await asyncio.sleep(seconds)
+
+        return f"{self.name}:{tag}"
+
+
+
+class ClientMethods(RpcMethodsBase):
+
+    async def think(self, seconds: float) -> str:
+
+        await asyncio.sleep(seconds)
+
+        return "thought"
+
+
+
+async def start_replica(name: str, port: int):
+
+    endpoint = WebsocketRPCEndpoint(Replica(name), request_concurrency=4)
+
+    app = FastAPI()
+
+    endpoint.register_route(app, "/ws")
+
+    sock = reuseport_socket("127.0.0.1", port)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="error"))
+
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+
+    while not server.started:
+
+        await asyncio.sleep(0.01)
+
+    return endpoint, server, task, sock.getsockname()[1]
+
+
+
+@pytest.mark.asyncio
+
+async def test_drain_migrates_clients_without_failing_calls():
+
+    old, old_server, old_task, port = await start_replica("old", 0)
+
+    async with WebSocketRpcClient(f"ws://127.0.0.1:{port}/ws", retry_config=False, default_response_timeout=5) as client:
+
+        in_flight = asyncio.create_task(client.other.work(seconds=0.5, tag="slow"))
+
+        await asyncio.sleep(0.1)
+
+        # deploy: the new replica takes over the port, the old one stops listening and drains
+
+        new, new_server, new_task, _ = await start_replica("new", port)
+
+        for listener in old_server.servers: listener.close()
+
+        drain = asyncio.create_task(old.drain(deadline=5, jitter=0.1))
+
+        await asyncio.sleep(0.3)
+
+        assert (await client.other.work(seconds=0, tag="fresh")).result == "new:fresh"
+
+        # the call started before the drain completes on the old replica
+
+        assert (await in_flight).result == "old:slow"
+
+        assert await drain == {"channels": 1, "migrated": 1, "forced": 0, "failed_calls": 0}
+
+        assert not old.manager.channels and len(new.manager.channels) == 1
+
+    for server, task in ((old_server, old_task), (new_server, new_task)):
+
+        server.should_exit = True
+
+        await task
+
+
+
+@pytest.mark.asyncio
+
+async def test_drain_waits_for_calls_to_the_client():
+
+    old, old_server, old_task, port = await start_replica("old", 0)
+
+    async with WebSocketRpcClient(f"ws://127.0.0.1:{port}/ws", ClientMethods(), retry_config=False) as client:
+
+        while not old.manager.channels: await asyncio.sleep(0.01)
+
+        channel = next(iter(old.manager.channels.values()))
+
+        # the endpoint's call is still being handled by the client when it migrates
+
+        to_client = asyncio.create_task(channel.other.think(seconds=0.5))
+
+        await asyncio.sleep(0.05)
+
+        new, new_server, new_task, _ = await start_replica("new", port)
+
+        for listener in old_server.servers: listener.close()
+
+        drain = await old.drain(deadline=5, jitter=0.1)
+
+        assert (await to_client).result == "thought"
+
+        assert drain == {"channels": 1, "migrated": 1, "forced": 0, "failed_calls": 0}
+
+    for server, task in ((old_server, old_task), (new_server, new_task)):
+
+        server.should_exit = True
+
+        await task
+
+
+
+@pytest.mark.asyncio
+
+async def test_draining_endpoint_rejects_new_connections():
+
+    endpoint, server, task, port = await start_replica("old", 0)
+
+    endpoint.draining = True
+
+    with pytest.raises(Exception):
+
+        async with WebSocketRpcClient(f"ws://127.0.0.1:{port}/ws", retry_config=False) as client:
+
+            await client.other.work(seconds=0, tag="x")
+
+    server.should_exit = True
+
+    await task
+
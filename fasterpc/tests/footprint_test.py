@@ -0,0 +1,92 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.rpc_channel import RpcChannel, RpcChannelClosedException
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.simplewebsocket import JsonSerializingWebSocket
+
+
+
+from conftest import QueueSocket, SlowMethods, connected_pair
+
+
+
+class SharedMethods(RpcMethodsBase):
+
+    _shared_ = True
+
+
+
+    async def whoami(self) -> str:
+
+        return self.channel.id
+
+
+
+def test_idle_channel_allocates_lazily():
+
+    channel = RpcChannel(RpcMethodsBase(), JsonSerializingWebSocket(QueueSocket(None, None)))
+
+    assert not hasattr(channel, "__dict__")
+
+    assert channel._send_lanes is None and channel._request_lanes is None and channel._other is None
+
+    assert channel.other is channel.other
+
+
+
+@pytest.mark.asyncio
+
+async def test_shared_methods_see_the_calling_channel():
+
+    methods = SharedMethods()
+
+    first_client, first_server, first_tasks = await connected_pair(methods)
+
+    second_client, second_server, second_tasks = await connected_pair(methods)
+
+    try:
+
+        assert first_server.methods is second_server.methods is methods
+
+        assert (await first_client.call("whoami", timeout=5)).result == first_server.id
+
+        assert (await second_client.call("whoami", timeout=5)).result == second_server.id
+
+        assert (await first_client.call("_get_channel_id_", timeout=5)).result == first_server.id
+
+    finally:
+
+        for task in first_tasks + second_tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_close_wakes_pending_calls():
+
+    client, server, tasks = await connected_pair(SlowMethods())
+
+    try:
+
+        pending = asyncio.ensure_future(client.call("work", {"seconds": 5}, timeout=10))
+
+        await asyncio.sleep(0.05)
+
+        await client.on_disconnect()
+
+        with pytest.raises(RpcChannelClosedException):
+
+            await asyncio.wait_for(pending, 1)
+
+    finally:
+
+        for task in tasks: task.cancel()
+
@@ -0,0 +1,126 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.connection_manager import ConnectionManager
+
+from fasterpc.gather import scatter_gather
+
+from fasterpc.rpc_channel import RpcRemoteError, RpcTimeoutException
+
+
+
+from conftest import SlowMethods, connected_pair
+
+
+
+class Replica(SlowMethods):
+
+    def __init__(self, name: str, delay: float, fail: bool = False):
+
+        super().__init__()
+
+        self.name, self.delay, self.fail, self.calls = name, delay, fail, 0
+
+
+
+    async def lookup(self, key: str) -> str:
+
+        self.calls += 1
+
+        await asyncio.sleep(self.delay)
+
+        if self.fail: raise ValueError("broken replica")
+
+        return f"{self.name}:{key}"
+
+
+
+async def replicas(*specs):
+
+    pairs = [await connected_pair(Replica(*spec)) for spec in specs]
+
+    return {spec[0]: client for spec, (client, server, tasks) in zip(specs, pairs)}, \
+
+        [server for client, server, tasks in pairs], [task for *_, tasks in pairs for task in tasks]
+
+
+
+@pytest.mark.asyncio
+
+async def test_partial_results_with_deadline():
+
+    clients, servers, tasks = await replicas(("a", 0), ("b", 5), ("c", 0, True))
+
+    try:
+
+        outcome = await scatter_gather(clients, "lookup", {"key": "k"}, timeout=0.3)
+
+        assert outcome.results == {"a": "a:k"} and not outcome.complete
+
+        assert isinstance(outcome.errors["b"], RpcTimeoutException) and isinstance(outcome.errors["c"], Exception)
+
+        assert outcome.elapsed < 1
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_quorum_and_hedging():
+
+    clients, servers, tasks = await replicas(("slow", 5), ("fast", 0.01), ("spare", 0.01))
+
+    try:
+
+        # the first answers win (both fast ones may land together), the slow call is cancelled
+
+        outcome = await scatter_gather(clients, "lookup", {"key": "k"}, timeout=2, quorum=1)
+
+        assert outcome.complete and "slow" not in outcome.results and outcome.cancelled == ["slow"]
+
+        # hedged: only "slow" is called at first, "fast" once it takes longer than hedge_after
+
+        outcome = await scatter_gather(clients, "lookup", {"key": "k"}, timeout=2, quorum=1, hedge_after=0.05)
+
+        assert outcome.results == {"fast": "fast:k"} and outcome.cancelled == ["slow", "spare"]
+
+        assert servers[2].methods.calls == 1
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_manager_maps_over_connected_clients():
+
+    clients, servers, tasks = await replicas(("a", 0), ("b", 0))
+
+    manager = ConnectionManager()
+
+    # channels to the replicas stand in for connected clients
+
+    for client in clients.values(): manager.register_channel(client)
+
+    try:
+
+        outcome = await manager.scatter_gather("lookup", {"key": "x"}, timeout=2)
+
+        assert sorted(outcome.results.values()) == ["a:x", "b:x"]
+
+        assert set(outcome.results) == set(manager.channels)
+
+    finally:
+
+        for task in tasks: task.cancel()
+
@@ -0,0 +1,150 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.hashring import HashRing, ReplicaRouter
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.stream_socket import StreamRpcServer
+
+
+
+KEYS = [f"user-{i}" for i in range(2000)]
+
+
+
+class Replica(RpcMethodsBase):
+
+    def __init__(self, name: str):
+
+        super().__init__()
+
+        self.name = name
+
+
+
+    async def whoami(self) -> str:
+
+        return self.name
+
+
+
+def test_minimal_key_movement():
+
+    ring = HashRing(["a", "b", "c"])
+
+    before = {key: ring.node_for(key) for key in KEYS}
+
+    ring.add("d")
+
+    after = {key: ring.node_for(key) for key in KEYS}
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+
+    # only keys now owned by the new node move, about a quarter of them
+
+    assert all(after[key] == "d" for key in moved) and 300 < len(moved) < 700
+
+    ring.remove("d")
+
+    assert {key: ring.node_for(key) for key in KEYS} == before
+
+    # failover order: the owner, then every other node once
+
+    assert sorted(ring.walk("k")) == ["a", "b", "c"] and next(ring.walk("k")) == ring.node_for("k")
+
+
+
+def test_bounded_load():
+
+    ring = HashRing(["a", "b", "c"])
+
+    loads = {"a": 0, "b": 0, "c": 0}
+
+    for key in ["same-key"] * 30:
+
+        loads[ring.node_for(key, loads, load_factor=1.25)] += 1
+
+    # one hot key spills over instead of piling 30 calls onto one replica
+
+    assert max(loads.values()) <= 13
+
+
+
+@pytest.mark.asyncio
+
+async def test_router_is_sticky_and_fails_over():
+
+    servers = {}
+
+    for name in ("r1", "r2", "r3"):
+
+        server = await StreamRpcServer(Replica(name)).start("tcp://127.0.0.1:0")
+
+        servers[f"tcp://127.0.0.1:{server.sockets[0].getsockname()[1]}"] = (name, server)
+
+    async with ReplicaRouter(servers, reconnect_interval=60, default_response_timeout=5) as router:
+
+        owners = {key: (await router.call(key, "whoami")).result for key in KEYS[:30]}
+
+        assert owners == {key: (await router.call(key, "whoami")).result for key in KEYS[:30]}
+
+        assert len(set(owners.values())) == 3
+
+        # the replica owning user-0 goes away - its keys move on, the others stay put
+
+        uri = router.replica_for("user-0")
+
+        await servers[uri][1].close()
+
+        assert (await router.call("user-0", "whoami")).result != servers[uri][0]
+
+        for key, owner in owners.items():
+
+            if owner != servers[uri][0]: assert (await router.call(key, "whoami")).result == owner
+
+        assert uri in router._down
+
+    for name, server in servers.values(): await server.close()
+
+
+
+@pytest.mark.asyncio
+
+async def test_replica_dropped_while_idle_is_reconnected():
+
+    servers = {}
+
+    for name in ("r1", "r2"):
+
+        server = await StreamRpcServer(Replica(name)).start("tcp://127.0.0.1:0")
+
+        servers[f"tcp://127.0.0.1:{server.sockets[0].getsockname()[1]}"] = (name, server)
+
+    async with ReplicaRouter(servers, reconnect_interval=0.05, default_response_timeout=5) as router:
+
+        uri = router.replica_for("user-0")
+
+        name, server = servers[uri]
+
+        # no call is running when the connection drops
+
+        await server.close()
+
+        while uri not in router._down: await asyncio.sleep(0.01)
+
+        assert (await router.call("user-0", "whoami")).result != name
+
+        servers[uri] = (name, await StreamRpcServer(Replica(name)).start(uri))
+
+        while uri in router._down: await asyncio.sleep(0.01)
+
+        assert (await router.call("user-0", "whoami")).result == name
+
+    for name, server in servers.values(): await server.close()
+
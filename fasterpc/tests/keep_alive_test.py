@@ -0,0 +1,138 @@
+import asyncio
+
+import time
+
+from multiprocessing import Process
+
+
+
+import pytest
+
+import uvicorn
+
+from fastapi import FastAPI
+
+
+
+from fasterpc.rpc_channel import RpcChannel, RpcChannelClosedException
+
+from fasterpc.rpc_methods import RpcMethodsBase, RpcUtilityMethods
+
+from fasterpc.simplewebsocket import SimpleWebSocket
+
+from fasterpc.websocket_rpc_client import WebSocketRpcClient
+
+from fasterpc.websocket_rpc_endpoint import WebsocketRPCEndpoint
+
+
+
+PORT = 9997
+
+uri = f"ws://localhost:{PORT}/ws"
+
+
+
+def setup_server():
+
+    app = FastAPI()
+
+    endpoint = WebsocketRPCEndpoint(RpcUtilityMethods(), keep_alive=0.1)
+
+    endpoint.register_route(app, "/ws")
+
+    uvicorn.run(app, port=PORT, log_level="error")
+
+
+
+@pytest.fixture(scope="module")
+
+def server():
+
+    proc = Process(target=setup_server, args=(), daemon=True)
+
+    proc.start()
+
+    time.sleep(1)
+
+    yield proc
+
+    proc.kill()
+
+
+
+class BlackHoleSocket(SimpleWebSocket):
+
+    async def connect(self, uri: str, **connect_kwargs): pass
+
+
+
+    async def send(self, msg): pass
+
+
+
+    async def recv(self):
+
+        await asyncio.Future()
+
+
+
+    async def close(self, code: int = 1000): pass
+
+
+
+@pytest.mark.asyncio
+
+async def test_keep_alive_measures_rtt(server):
+
+    async with WebSocketRpcClient(uri, RpcUtilityMethods(), keep_alive=0.1) as client:
+
+        await asyncio.sleep(0.5)
+
+        assert client.rtt is not None and client.rtt > 0
+
+        response = await client.other.echo(text="alive")
+
+        assert response.result == "alive"
+
+        assert not client.channel.isClosed()
+
+
+
+@pytest.mark.asyncio
+
+async def test_dead_peer_fails_pending_calls():
+
+    channel = RpcChannel(RpcMethodsBase(), BlackHoleSocket())
+
+    pending = asyncio.create_task(channel.call("echo", {"text": "lost"}))
+
+    start = time.monotonic()
+
+    await channel.keep_alive(0.05, max_missed=2)
+
+    await channel.close()
+
+    with pytest.raises(RpcChannelClosedException):
+
+        await pending
+
+    assert time.monotonic() - start < 1
+
+
+
+class ClosedSocket(BlackHoleSocket):
+
+    async def send(self, msg):
+
+        raise ConnectionError("socket is closing")
+
+
+
+@pytest.mark.asyncio
+
+async def test_ping_send_failure_counts_as_dead_peer():
+
+    channel = RpcChannel(RpcMethodsBase(), ClosedSocket())
+
+    await asyncio.wait_for(channel.keep_alive(0.01, max_missed=100), 1)
+
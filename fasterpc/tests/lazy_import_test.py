@@ -0,0 +1,58 @@
+import subprocess
+
+import sys
+
+
+
+import fasterpc
+
+from fasterpc import utils
+
+
+
+def _loaded_after(statement):
+
+    code = f"import sys\n{statement}\nprint(sorted(m for m in ('fastapi', 'starlette') if m in sys.modules))"
+
+    return subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout.strip()
+
+
+
+def test_client_import_skips_server_stack():
+
+    assert _loaded_after("from fasterpc import WebSocketRpcClient") == "[]"
+
+    assert _loaded_after("import fasterpc") == "[]"
+
+
+
+def test_lazy_attributes_resolve():
+
+    from fasterpc.websocket_rpc_endpoint import WebsocketRPCEndpoint
+
+    assert fasterpc.WebsocketRPCEndpoint is WebsocketRPCEndpoint
+
+    assert "WebSocketRpcClient" in dir(fasterpc)
+
+    try:
+
+        fasterpc.NotAThing
+
+        assert False, "expected AttributeError"
+
+    except AttributeError:
+
+        pass
+
+
+
+def test_pydantic_helpers_bound_once():
+
+    assert utils.is_pydantic_pre_v2() is utils.PYDANTIC_PRE_V2
+
+    from fasterpc.schemas import RpcRequest
+
+    request = utils.pydantic_parse(RpcRequest, {"method": "echo", "arguments": {"text": "hi"}})
+
+    assert '"method":"echo"' in utils.pydantic_serialize(request).replace(" ", "")
+
@@ -0,0 +1,58 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.loadgen import EchoServer, LatencyHistogram, render_arguments, run_load
+
+
+
+def test_histogram_percentiles():
+
+    histogram = LatencyHistogram()
+
+    for ms in range(1, 101):
+
+        histogram.record(ms / 1000)
+
+    summary = histogram.summary()
+
+    assert 48 <= summary["p50_ms"] <= 53 and 97 <= summary["p99_ms"] <= 100 and summary["max_ms"] == 100
+
+
+
+def test_render_arguments():
+
+    assert render_arguments({"text": "hi {i}", "tags": ["{caller}"], "n": 1}, i=3, caller=2, connection=0) == \
+
+        {"text": "hi 3", "tags": ["2"], "n": 1}
+
+
+
+@pytest.mark.asyncio
+
+async def test_run_load_against_echo_server(tmp_path):
+
+    server = EchoServer(f"unix://{tmp_path / 'echo.sock'}")
+
+    server.start()
+
+    try:
+
+        while not (tmp_path / "echo.sock").exists():
+
+            await asyncio.sleep(0.01)
+
+        report = await run_load(server.uri, connections=2, concurrency=3, requests=60, duration=10)
+
+    finally:
+
+        await server.stop()
+
+    assert report["completed"] == 60 and report["timeouts"] == 0 and not report["errors"]
+
+    assert report["latency"]["p50_ms"] > 0
+
@@ -0,0 +1,60 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc import loop as event_loop
+
+
+
+async def current_loop_name():
+
+    await asyncio.sleep(0)
+
+    return event_loop.loop_name()
+
+
+
+def test_resolve_loop(monkeypatch):
+
+    monkeypatch.delenv(event_loop.ENV_VAR, raising=False)
+
+    assert event_loop.resolve_loop("asyncio") == "asyncio"
+
+    assert event_loop.resolve_loop() == ("uvloop" if event_loop.uvloop is not None else "asyncio")
+
+    monkeypatch.setenv(event_loop.ENV_VAR, "asyncio")
+
+    assert event_loop.resolve_loop() == "asyncio"
+
+    with pytest.raises(ValueError):
+
+        event_loop.resolve_loop("trio")
+
+
+
+def test_run_on_asyncio():
+
+    assert event_loop.run(current_loop_name(), "asyncio") == "asyncio"
+
+
+
+@pytest.mark.skipif(event_loop.uvloop is None, reason="uvloop is not installed")
+
+def test_run_on_uvloop():
+
+    assert event_loop.run(current_loop_name(), "uvloop") == "uvloop"
+
+
+
+def test_missing_uvloop_is_reported(monkeypatch):
+
+    monkeypatch.setattr(event_loop, "uvloop", None)
+
+    with pytest.raises(RuntimeError):
+
+        event_loop.resolve_loop("uvloop")
+
@@ -0,0 +1,194 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.priority import PriorityLanes
+
+from fasterpc.rpc_channel import HANDLER_ERROR, RpcChannel, RpcRemoteError
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.schemas import RpcPriority
+
+from fasterpc.simplewebsocket import SimpleWebSocket
+
+
+
+from conftest import connected_pair
+
+
+
+class SlowRecordingSocket(SimpleWebSocket):
+
+    def __init__(self):
+
+        self.sent = []
+
+
+
+    async def connect(self, uri: str, **connect_kwargs): pass
+
+
+
+    async def send(self, msg):
+
+        await asyncio.sleep(0.01)
+
+        self.sent.append(msg)
+
+
+
+    async def recv(self): pass
+
+
+
+    async def close(self, code: int = 1000): pass
+
+
+
+class RecordingMethods(RpcMethodsBase):
+
+    def __init__(self, order):
+
+        super().__init__()
+
+        self.order = order
+
+
+
+    async def batch(self, i: int) -> int:
+
+        await asyncio.sleep(0.05)
+
+        self.order.append(f"batch{i}")
+
+        return i
+
+
+
+    async def interactive(self) -> str:
+
+        self.order.append("interactive")
+
+        return "ok"
+
+
+
+    async def boom(self) -> str:
+
+        raise ValueError("boom")
+
+
+
+def request(method, priority=None, **arguments):
+
+    return {"request": {"method": method, "arguments": arguments, "call_id": method, "priority": priority}}
+
+
+
+def test_lanes_prefer_urgent_without_starving():
+
+    lanes = PriorityLanes(starvation_limit=2)
+
+    for i in range(4):
+
+        lanes.put(RpcPriority.INTERACTIVE, f"i{i}")
+
+    lanes.put(RpcPriority.BULK, "bulk")
+
+    order = [lanes.pop() for _ in range(5)]
+
+    assert order == ["i0", "i1", "bulk", "i2", "i3"]
+
+    assert lanes.pop() is None
+
+
+
+@pytest.mark.asyncio
+
+async def test_control_frames_overtake_queued_bulk_sends():
+
+    socket = SlowRecordingSocket()
+
+    channel = RpcChannel(RpcMethodsBase(), socket)
+
+    sends = [asyncio.create_task(channel.send({"bulk": i}, priority=RpcPriority.BULK)) for i in range(3)]
+
+    await asyncio.sleep(0)
+
+    sends.append(asyncio.create_task(channel.send({"pong": 1}, priority=RpcPriority.CONTROL)))
+
+    await asyncio.gather(*sends)
+
+    assert socket.sent[1] == {"pong": 1}
+
+
+
+@pytest.mark.asyncio
+
+async def test_interactive_request_skips_batch_backlog():
+
+    order = []
+
+    channel = RpcChannel(RecordingMethods(order), SlowRecordingSocket())
+
+    for i in range(3):
+
+        await channel.on_message(request("batch", RpcPriority.BULK, i=i))
+
+    await channel.on_message(request("interactive", RpcPriority.INTERACTIVE))
+
+    await asyncio.sleep(0.3)
+
+    assert order.index("interactive") == 0
+
+    assert order[1:] == ["batch0", "batch1", "batch2"]
+
+
+
+@pytest.mark.asyncio
+
+async def test_with_options_sets_request_priority():
+
+    socket = SlowRecordingSocket()
+
+    channel = RpcChannel(RpcMethodsBase(), socket)
+
+    call = asyncio.create_task(channel.other.echo.with_options(priority=RpcPriority.INTERACTIVE, timeout=0.1)(text="hi"))
+
+    await asyncio.sleep(0.05)
+
+    assert socket.sent[0].request.priority == RpcPriority.INTERACTIVE
+
+    call.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_failing_handler_answers_with_an_error():
+
+    client, server, tasks = await connected_pair(RecordingMethods([]))
+
+    try:
+
+        with pytest.raises(RpcRemoteError) as error:
+
+            await asyncio.wait_for(client.call("boom"), 1)
+
+        assert error.value.code == HANDLER_ERROR and "boom" in str(error.value)
+
+        assert (await client.call("interactive", timeout=1)).result == "ok"
+
+        await asyncio.sleep(0.05)
+
+        assert not server._tasks
+
+    finally:
+
+        for task in tasks: task.cancel()
+
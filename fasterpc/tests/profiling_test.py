@@ -0,0 +1,108 @@
+import asyncio
+
+import pstats
+
+
+
+import pytest
+
+
+
+from fasterpc.profiling import PHASES, CallProfiler
+
+
+
+from conftest import SlowMethods, connected_pair
+
+
+
+@pytest.mark.asyncio
+
+async def test_slow_call_log_breaks_down_phases():
+
+    client, server, tasks = await connected_pair(SlowMethods())
+
+    server.profiler = CallProfiler(slow_threshold=0.05)
+
+    try:
+
+        await client.call("work", {"seconds": 0.01}, timeout=5)
+
+        assert not server.profiler.slow_calls
+
+        await client.call("work", {"seconds": 0.1}, timeout=5)
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+    (record,) = server.profiler.slow_calls
+
+    assert record["method"] == "work" and record["arg_bytes"] == {"seconds": 3}
+
+    assert set(record["phases_ms"]) == set(PHASES)
+
+    assert record["phases_ms"]["handler"] >= 100 and record["phases_ms"]["serialize"] > 0
+
+    assert not server.profiler._timings
+
+
+
+@pytest.mark.asyncio
+
+async def test_profiling_dumps_pstats_for_selected_method(tmp_path):
+
+    client, server, tasks = await connected_pair(SlowMethods())
+
+    server.profiler = CallProfiler()
+
+    server.profiler.enable_profiling("work", directory=str(tmp_path))
+
+    try:
+
+        await client.call("work", {"seconds": 0}, timeout=5)
+
+        await client.call("_ping_", timeout=5)
+
+        server.profiler.disable_profiling()
+
+        await client.call("work", {"seconds": 0}, timeout=5)
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+    (dump,) = tmp_path.iterdir()
+
+    assert dump.name.startswith("work-") and pstats.Stats(str(dump)).total_calls > 0
+
+
+
+@pytest.mark.asyncio
+
+async def test_requests_that_never_run_leave_no_timings():
+
+    client, server, tasks = await connected_pair(SlowMethods())
+
+    server.profiler = CallProfiler()
+
+    try:
+
+        running = asyncio.ensure_future(client.call("work", {"seconds": 0.2}, timeout=5))
+
+        queued = asyncio.ensure_future(client.call("work", {"seconds": 0}, timeout=5))
+
+        await asyncio.sleep(0.05)
+
+        # cancelled while it waits for the busy worker
+
+        queued.cancel()
+
+        await running
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+    assert server.methods.started == 1 and not server.profiler._timings
+
@@ -0,0 +1,128 @@
+import logging
+
+import time
+
+
+
+from fasterpc.logger import LoggingModes, RateLimitFilter, _LoguruAdapter, get_logger, logging_config
+
+
+
+class Expensive:
+
+    def __init__(self):
+
+        self.formatted = 0
+
+
+
+    def __repr__(self):
+
+        self.formatted += 1
+
+        return "expensive"
+
+
+
+def test_queued_mode_formats_off_the_calling_thread(capsys):
+
+    logger = get_logger("QUEUED_TEST")
+
+    logging_config.set_mode(LoggingModes.QUEUED, rate_limit_burst=3, rate_limit_interval=60)
+
+    try:
+
+        value = Expensive()
+
+        logger.info("value is %r", value)
+
+        for i in range(50):
+
+            logger.warning("connect storm %s", i)
+
+        logger.debug("below the level %r", value)
+
+        logging_config.flush()
+
+        output = capsys.readouterr().err
+
+        assert "value is expensive" in output and value.formatted == 1
+
+        # only the first 3 of the storm got through
+
+        assert output.count("connect storm") == 3
+
+    finally:
+
+        logging_config.set_mode(LoggingModes.SIMPLE)
+
+
+
+def test_rate_limit_reports_suppressed_records():
+
+    limiter = RateLimitFilter(burst=2, interval=0.05)
+
+    record = lambda: logging.LogRecord("fasterpc.x", logging.INFO, __file__, 1, "same %s", (1,), None)
+
+    assert [limiter.filter(record()) for _ in range(5)] == [True, True, False, False, False]
+
+    time.sleep(0.06)
+
+    allowed = record()
+
+    assert limiter.filter(allowed) and allowed.suppressed == 3
+
+
+
+class FakeLoguru:
+
+    """Records what the adapter hands loguru"""
+
+
+
+    def __init__(self, records, options=None):
+
+        self.records = records
+
+        self.options = options or {}
+
+
+
+    def opt(self, **options):
+
+        return FakeLoguru(self.records, options)
+
+
+
+    def bind(self, **extra):
+
+        return FakeLoguru(self.records, {**self.options, "extra": extra})
+
+
+
+    def __getattr__(self, level):
+
+        return lambda message: self.records.append((level, message, self.options))
+
+
+
+def test_loguru_adapter_keeps_exception_info():
+
+    records = []
+
+    logger = _LoguruAdapter(FakeLoguru(records))
+
+    try:
+
+        raise ValueError("boom")
+
+    except ValueError as e:
+
+        logger.warning("failed %s", "x", exc_info=e)
+
+    logger.info("plain", extra={"channel": "c"})
+
+    assert records[0][:2] == ("warning", "failed x") and isinstance(records[0][2]["exception"], ValueError)
+
+    assert records[1][2] == {"depth": 1, "exception": None, "extra": {"channel": "c"}}
+
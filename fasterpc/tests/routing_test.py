@@ -0,0 +1,112 @@
+import pytest
+
+
+
+from fasterpc.connection_manager import ConnectionManager
+
+from fasterpc.routing import (ChannelNotFoundException, FileChannelRegistry, InMemoryChannelRegistry,
+
+                              InMemoryWorkerTransport, UnixSocketWorkerTransport, WorkerRouter)
+
+from fasterpc.rpc_channel import RpcRemoteError, RpcTimeoutException
+
+from fasterpc.rpc_methods import RpcUtilityMethods
+
+
+
+from conftest import connected_pair
+
+
+
+class ClientMethods(RpcUtilityMethods):
+
+    async def fail(self) -> str:
+
+        raise ValueError("no")
+
+
+
+async def worker_with_client(router):
+
+    """A worker-side channel whose remote end (the 'client') exposes echo() and fail()"""
+
+    _, server, tasks = await connected_pair(client_methods=ClientMethods())
+
+    router.manager.register_channel(server)
+
+    return server, tasks
+
+
+
+async def check_routing(first: WorkerRouter, second: WorkerRouter):
+
+    await first.start()
+
+    await second.start()
+
+    channel, tasks = await worker_with_client(second)
+
+    try:
+
+        # first worker doesn't hold the channel - the call is forwarded to the second
+
+        response = await first.call(channel.id, "echo", {"text": "hello"}, timeout=5)
+
+        assert response.result == "hello"
+
+        assert await first.broadcast("echo", {"text": "all"}, timeout=5) == 1
+
+        # failures come back as the exceptions a local call raises
+
+        with pytest.raises(RpcRemoteError) as error:
+
+            await first.call(channel.id, "fail", timeout=5)
+
+        assert error.value.code == "handler_error" and "no" in str(error.value)
+
+        with pytest.raises(RpcTimeoutException):
+
+            await first.call(channel.id, "_not_exposed", timeout=0.2)
+
+        second.manager.unregister_channel(channel)
+
+        with pytest.raises(ChannelNotFoundException):
+
+            await first.call(channel.id, "echo", {"text": "gone"}, timeout=5)
+
+    finally:
+
+        for task in tasks:
+
+            task.cancel()
+
+        await first.close()
+
+        await second.close()
+
+
+
+@pytest.mark.asyncio
+
+async def test_in_memory_routing():
+
+    registry, hub = InMemoryChannelRegistry(), {}
+
+    await check_routing(WorkerRouter(ConnectionManager(), registry, InMemoryWorkerTransport(hub), "w1"),
+
+                        WorkerRouter(ConnectionManager(), registry, InMemoryWorkerTransport(hub), "w2"))
+
+
+
+@pytest.mark.asyncio
+
+async def test_unix_socket_routing(tmp_path):
+
+    def router(worker_id):
+
+        return WorkerRouter(ConnectionManager(), FileChannelRegistry(str(tmp_path / "registry")),
+
+                            UnixSocketWorkerTransport(str(tmp_path / "sockets")), worker_id)
+
+    await check_routing(router("w1"), router("w2"))
+
@@ -0,0 +1,92 @@
+import os
+
+import signal
+
+import threading
+
+import time
+
+
+
+from fasterpc.serve import Supervisor
+
+from fasterpc.sync_client import SyncRpcClient
+
+
+
+def wait_until(condition, timeout=20):
+
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+
+        assert time.monotonic() < deadline, "timed out"
+
+        time.sleep(0.05)
+
+
+
+def test_workers_share_a_port_and_are_restarted():
+
+    supervisor = Supervisor("fasterpc.rpc_methods:RpcUtilityMethods", port=0, workers=2, stats_interval=0.2,
+
+                            restart_delay=0.1).start()
+
+    views = []
+
+    thread = threading.Thread(target=supervisor.run, args=(views.append,))
+
+    thread.start()
+
+    try:
+
+        uri = f"ws://127.0.0.1:{supervisor.port}/ws"
+
+        client = None
+
+        for _ in range(100):
+
+            try:
+
+                client = SyncRpcClient(uri, connections=4, retry_config=False, default_response_timeout=5).connect()
+
+                break
+
+            except OSError:
+
+                time.sleep(0.1)
+
+        try:
+
+            assert [client.call("echo", {"text": str(i)}) for i in range(40)] == [str(i) for i in range(40)]
+
+            wait_until(lambda: views and views[-1]["connections"] == 4 and views[-1]["calls"] >= 40)
+
+            view = views[-1]
+
+        finally:
+
+            client.close()
+
+        # the kernel spreads connections over the workers sharing the port (4 of them can still land on one)
+
+        assert sum(worker["connections"] for worker in view["per_worker"]) == 4 and view["workers_alive"] == 2
+
+
+
+        crashed = supervisor.workers[0].process.pid
+
+        os.kill(crashed, signal.SIGKILL)
+
+        wait_until(lambda: supervisor.workers[0].restarts == 1 and supervisor.workers[0].process.is_alive())
+
+        assert supervisor.workers[0].process.pid != crashed
+
+    finally:
+
+        supervisor.stop()
+
+        thread.join()
+
+    assert not any(worker.process.is_alive() for worker in supervisor.workers)
+
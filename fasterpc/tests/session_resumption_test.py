@@ -0,0 +1,184 @@
+import asyncio
+
+import time
+
+from multiprocessing import Process
+
+
+
+import pytest
+
+import uvicorn
+
+from fastapi import FastAPI
+
+
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.schemas import RpcMessage, RpcRequest
+
+from fasterpc.session import RpcSession
+
+from fasterpc.websocket_rpc_client import WebSocketRpcClient
+
+from fasterpc.websocket_rpc_endpoint import WebsocketRPCEndpoint
+
+
+
+PORT = 9996
+
+uri = f"ws://localhost:{PORT}/ws"
+
+
+
+class CountingMethods(RpcMethodsBase):
+
+    executions = 0
+
+
+
+    async def slow_echo(self, text: str, delay: float) -> str:
+
+        CountingMethods.executions += 1
+
+        await asyncio.sleep(delay)
+
+        return text
+
+
+
+    async def get_executions(self) -> int:
+
+        return CountingMethods.executions
+
+
+
+def setup_server():
+
+    app = FastAPI()
+
+    endpoint = WebsocketRPCEndpoint(CountingMethods(), resumable=True, session_ttl=5)
+
+    endpoint.register_route(app, "/ws")
+
+    uvicorn.run(app, port=PORT, log_level="error")
+
+
+
+@pytest.fixture(scope="module")
+
+def server():
+
+    proc = Process(target=setup_server, args=(), daemon=True)
+
+    proc.start()
+
+    time.sleep(1)
+
+    yield proc
+
+    proc.kill()
+
+
+
+def drop_connection(client):
+
+    client.ws._websocket._websocket.transport.abort()
+
+
+
+@pytest.mark.asyncio
+
+async def test_call_survives_connection_drop(server):
+
+    async with WebSocketRpcClient(uri, RpcMethodsBase(), resumable=True) as client:
+
+        channel = client.channel
+
+        before = (await client.other.get_executions()).result
+
+        call = asyncio.create_task(client.other.slow_echo(text="resumed", delay=0.5))
+
+        await asyncio.sleep(0.1)
+
+        drop_connection(client)
+
+        response = await asyncio.wait_for(call, 5)
+
+        assert response.result == "resumed"
+
+        assert client.channel is channel
+
+        # sent while disconnected or replayed - executed exactly once
+
+        assert (await client.other.get_executions()).result == before + 1
+
+
+
+@pytest.mark.asyncio
+
+async def test_calls_issued_while_disconnected_are_replayed(server):
+
+    async with WebSocketRpcClient(uri, RpcMethodsBase(), resumable=True) as client:
+
+        drop_connection(client)
+
+        response = await asyncio.wait_for(client.other.slow_echo(text="queued", delay=0), 5)
+
+        assert response.result == "queued"
+
+
+
+def test_session_outbox_is_bounded_and_acknowledged():
+
+    session = RpcSession(max_outbox=2)
+
+    for i in range(3):
+
+        session.stamp(RpcMessage(request=RpcRequest(method="echo", call_id=str(i))))
+
+    assert [message.seq for message in session.outbox] == [2, 3]
+
+    # the peer saw nothing, seq 1 was dropped from the bounded outbox
+
+    assert not session.can_replay(0)
+
+    assert session.can_replay(1)
+
+    session.on_ack(3)
+
+    assert not session.outbox
+
+    assert session.on_message({"seq": 1, "ack": None, "request": {}})
+
+    assert not session.on_message({"seq": 1, "ack": None, "request": {}})
+
+
+
+@pytest.mark.asyncio
+
+async def test_client_without_handshake_is_rejected(server):
+
+    from fasterpc.rpc_channel import RpcChannelClosedException
+
+    async with WebSocketRpcClient(uri, RpcMethodsBase(), retry_config=False) as client:
+
+        with pytest.raises(RpcChannelClosedException):
+
+            await asyncio.wait_for(client.other.get_executions(), 10)
+
+
+
+def test_session_fields_stay_off_the_wire_without_a_session():
+
+    from fasterpc.simplewebsocket import JsonSerializingWebSocket
+
+    socket = JsonSerializingWebSocket(None)
+
+    assert '"seq"' not in socket._serialize(RpcMessage(request=RpcRequest(method="echo")))
+
+    session = RpcSession()
+
+    assert '"seq":1' in socket._serialize(session.stamp(RpcMessage(request=RpcRequest(method="echo")))).replace(" ", "")
+
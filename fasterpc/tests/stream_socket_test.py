@@ -0,0 +1,124 @@
+import asyncio
+
+import time
+
+from functools import partial
+
+
+
+import pytest
+
+
+
+from fasterpc.rpc_channel import RpcChannelClosedException
+
+from fasterpc.rpc_methods import RpcUtilityMethods
+
+from fasterpc.stream_socket import StreamRpcServer, StreamSocket, parse_stream_uri
+
+from fasterpc.websocket_rpc_client import WebSocketRpcClient
+
+
+
+class ServerMethods(RpcUtilityMethods):
+
+    async def ask_client(self, text: str) -> str:
+
+        response = await self.channel.other.echo(text=text)
+
+        return response.result
+
+
+
+async def check_round_trip(server: StreamRpcServer, uri: str):
+
+    disconnected = asyncio.Event()
+
+
+
+    async def on_disconnect(channel):
+
+        disconnected.set()
+
+    server._on_disconnect = [on_disconnect]
+
+    try:
+
+        async with WebSocketRpcClient(uri, RpcUtilityMethods(), retry_config=False) as client:
+
+            assert (await client.other.echo(text="hello")).result == "hello"
+
+            # server -> client call over the same stream
+
+            assert (await client.other.ask_client(text="back")).result == "back"
+
+        await asyncio.wait_for(disconnected.wait(), 5)
+
+        assert not server.channels
+
+    finally:
+
+        await server.close()
+
+
+
+@pytest.mark.asyncio
+
+async def test_tcp_round_trip():
+
+    server = await StreamRpcServer(ServerMethods()).start("tcp://127.0.0.1:0")
+
+    port = server.sockets[0].getsockname()[1]
+
+    await check_round_trip(server, f"tcp://127.0.0.1:{port}")
+
+
+
+@pytest.mark.asyncio
+
+async def test_unix_round_trip(tmp_path):
+
+    uri = f"unix://{tmp_path / 'rpc.sock'}"
+
+    await check_round_trip(await StreamRpcServer(ServerMethods()).start(uri), uri)
+
+
+
+@pytest.mark.asyncio
+
+async def test_oversized_frame_closes_the_connection():
+
+    server = await StreamRpcServer(ServerMethods()).start("tcp://127.0.0.1:0")
+
+    port = server.sockets[0].getsockname()[1]
+
+    try:
+
+        async with WebSocketRpcClient(f"tcp://127.0.0.1:{port}", RpcUtilityMethods(), retry_config=False,
+
+                                      websocket_client_handler_cls=partial(StreamSocket, max_frame_size=1000)) as client:
+
+            start = time.monotonic()
+
+            with pytest.raises(RpcChannelClosedException):
+
+                await client.other.echo.with_options(timeout=5)(text="x" * 5000)
+
+            assert time.monotonic() - start < 1 and client.channel.isClosed()
+
+    finally:
+
+        await server.close()
+
+
+
+def test_parse_stream_uri():
+
+    assert parse_stream_uri("tcp://localhost:9000") == ("tcp", "localhost", 9000)
+
+    assert parse_stream_uri("unix:///tmp/rpc.sock") == ("unix", "/tmp/rpc.sock", None)
+
+    with pytest.raises(ValueError):
+
+        parse_stream_uri("tcp://localhost")
+
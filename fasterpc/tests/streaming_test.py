@@ -0,0 +1,212 @@
+import asyncio
+
+import json
+
+from functools import partial
+
+
+
+import pytest
+
+
+
+from fasterpc.chunking import ChunkedSerializingWebSocket
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.streaming import ArrayStreamDecoder
+
+
+
+from conftest import RecordingSocket, connected_pair
+
+
+
+class RowMethods(RpcMethodsBase):
+
+    async def rows(self, count: int) -> list:
+
+        return [{"id": i, "name": f"row-{i}"} for i in range(count)]
+
+
+
+    async def scalar(self) -> int:
+
+        return 7
+
+
+
+def test_decoder_yields_elements_across_arbitrary_splits():
+
+    document = json.dumps({"response": {"result": [1, 22, "a]b", {"x": [3, 4]}, None, 1.5e3], "call_id": "c"}})
+
+    for size in (1, 3, 7, len(document)):
+
+        elements = []
+
+        decoder = ArrayStreamDecoder(elements.append)
+
+        for offset in range(0, len(document), size):
+
+            decoder.feed(document[offset:offset + size])
+
+        assert elements == [1, 22, "a]b", {"x": [3, 4]}, None, 1500.0]
+
+        assert decoder.finish() == {"response": {"result": None, "call_id": "c"}}
+
+
+
+def test_decoder_without_array_returns_whole_document():
+
+    decoder = ArrayStreamDecoder(lambda element: None)
+
+    decoder.feed('{"response": {"result": 5,')
+
+    decoder.feed(' "call_id": "c"}}')
+
+    assert decoder.finish() == {"response": {"result": 5, "call_id": "c"}}
+
+
+
+def test_decoder_streams_only_the_envelope_result():
+
+    elements = []
+
+    decoder = ArrayStreamDecoder(elements.append)
+
+    document = json.dumps({"response": {"result": {"result": [1, 2]}, "call_id": "c"}})
+
+    for offset in range(0, len(document), 4):
+
+        decoder.feed(document[offset:offset + 4])
+
+    assert elements == [] and decoder.finish() == json.loads(document)
+
+
+
+def test_decoder_stops_when_the_consumer_is_full():
+
+    elements = []
+
+    decoder = ArrayStreamDecoder(lambda element: len(elements) < 3 and elements.append(element) is None)
+
+    document = json.dumps({"response": {"result": list(range(10)), "call_id": "c"}})
+
+    for offset in range(0, len(document), 5):
+
+        decoder.feed(document[offset:offset + 5])
+
+    # the elements that didn't fit stay in the document, in order
+
+    assert elements == [0, 1, 2]
+
+    assert decoder.finish() == {"response": {"result": list(range(3, 10)), "call_id": "c"}}
+
+
+
+def test_decoder_handles_long_elements_in_linear_time():
+
+    # one element spanning many pieces isn't rescanned from its start on each piece
+
+    document = json.dumps({"response": {"result": [list(range(200000)), "x" * 200000], "call_id": "c"}})
+
+    elements = []
+
+    decoder = ArrayStreamDecoder(elements.append)
+
+    for offset in range(0, len(document), 64):
+
+        decoder.feed(document[offset:offset + 64])
+
+    assert elements == [list(range(200000)), "x" * 200000]
+
+
+
+@pytest.mark.asyncio
+
+async def test_stream_call_yields_before_response_completes():
+
+    client, server, tasks = await connected_pair(RowMethods(), serializer=partial(ChunkedSerializingWebSocket, chunk_size=500),
+
+                                                 server_wire=partial(RecordingSocket, delay=0.001))
+
+    wire = server.socket._websocket
+
+    try:
+
+        seen = []
+
+        async for row in client.stream_call("rows", {"count": 300}, timeout=5):
+
+            # the first rows arrive while most of the response is still on the wire
+
+            if not seen: chunks_sent = len(wire.sent)
+
+            seen.append(row)
+
+        assert seen == [{"id": i, "name": f"row-{i}"} for i in range(300)]
+
+        assert chunks_sent < len(wire.sent)
+
+        assert not client.socket._streams and client.socket._buffered == 0
+
+        # small results come whole and are yielded the same way
+
+        assert [row async for row in client.stream_call("rows", {"count": 2}, timeout=5)] == seen[:2]
+
+        with pytest.raises(TypeError):
+
+            [row async for row in client.stream_call("scalar", timeout=5)]
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_stream_call_falls_back_when_the_consumer_is_slow():
+
+    client, server, tasks = await connected_pair(RowMethods(), serializer=partial(ChunkedSerializingWebSocket, chunk_size=500))
+
+    try:
+
+        seen = []
+
+        async for row in client.stream_call("rows", {"count": 300}, timeout=5, max_buffered=10):
+
+            seen.append(row)
+
+            # the consumer falls behind while the whole response arrives
+
+            if len(seen) == 1: await asyncio.sleep(0.2)
+
+        assert seen == [{"id": i, "name": f"row-{i}"} for i in range(300)]
+
+        assert not client.socket._streams and client.socket._buffered == 0
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+def test_invalid_streamed_json_is_dropped():
+
+    socket = ChunkedSerializingWebSocket(None, chunk_size=8)
+
+    elements = []
+
+    socket.register_stream("c", elements.append)
+
+    document = '{"response": {"result": [1, {"a" 2}, 3], "call_id": "c"}}'
+
+    for offset in range(0, len(document), 8):
+
+        assert socket._on_chunk("1", len(document), "c", document[offset:offset + 8]) is None
+
+    assert elements == [1] and socket.dropped == 1 and not socket._reassembly and not socket._skipping
+
+    assert socket._buffered == 0
+
@@ -0,0 +1,128 @@
+import asyncio
+
+
+
+import pytest
+
+
+
+from fasterpc.rpc_channel import RpcCaller
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.stubs import RpcStub, describe_methods, fetch_stub, generate_stub, render_stub
+
+
+
+from conftest import connected_pair
+
+
+
+class CalcMethods(RpcMethodsBase):
+
+    async def add(self, a: int, b: int = 1) -> int:
+
+        """Adds two numbers"""
+
+        return a + b
+
+
+
+    async def tag(self, **labels) -> str:
+
+        return ",".join(sorted(labels))
+
+
+
+def test_describe_methods():
+
+    description = describe_methods(CalcMethods)
+
+    assert set(description) == {"add", "tag"}
+
+    assert description["add"]["params"] == [{"name": "a", "annotation": "int", "required": True},
+
+                                            {"name": "b", "annotation": "int", "required": False}]
+
+    assert description["add"]["returns"] == "int" and description["tag"]["var_keyword"]
+
+
+
+@pytest.mark.asyncio
+
+async def test_stub_checks_arguments_locally():
+
+    client, server, tasks = await connected_pair(CalcMethods())
+
+    try:
+
+        stub = generate_stub(CalcMethods)(client)
+
+        assert isinstance(stub, RpcStub)
+
+        assert (await stub.add(a=2)).result == 3
+
+        assert (await stub.tag(x=1, y=2)).result == "x,y"
+
+        with pytest.raises(TypeError):
+
+            stub.add(b=2)
+
+        with pytest.raises(TypeError):
+
+            stub.add(a=1, c=2)
+
+        assert not client.requests
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+@pytest.mark.asyncio
+
+async def test_stub_from_remote_description():
+
+    client, server, tasks = await connected_pair(CalcMethods())
+
+    try:
+
+        stub = await fetch_stub(client)
+
+        assert (await stub.add(a=2, b=5)).result == 7
+
+        with pytest.raises(TypeError):
+
+            stub.add()
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+
+
+def test_render_stub_compiles():
+
+    namespace = {}
+
+    exec(compile(render_stub(CalcMethods), "<stub>", "exec"), namespace)
+
+    stub_cls = namespace["CalcMethodsStub"]
+
+    assert issubclass(stub_cls, RpcStub) and asyncio.iscoroutinefunction(stub_cls.add)
+
+
+
+def test_caller_caches_proxies():
+
+    caller = RpcCaller(object())
+
+    assert caller.echo is caller.echo
+
+    assert caller._ping_.method_name == "_ping_"
+
+    with pytest.raises(AttributeError):
+
+        caller._private
+
@@ -0,0 +1,94 @@
+import asyncio
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+import pytest
+
+
+
+from fasterpc.rpc_methods import RpcUtilityMethods
+
+from fasterpc.stream_socket import StreamRpcServer
+
+from fasterpc.sync_client import SyncRpcClient
+
+
+
+class ServerMethods(RpcUtilityMethods):
+
+    async def add(self, a: int, b: int) -> int:
+
+        await asyncio.sleep(0.001)
+
+        return a + b
+
+
+
+@pytest.fixture
+
+def server_uri():
+
+    loop = asyncio.new_event_loop()
+
+    server = loop.run_until_complete(StreamRpcServer(ServerMethods(), request_concurrency=64).start("tcp://127.0.0.1:0"))
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+
+    thread.start()
+
+    yield f"tcp://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+
+    loop.call_soon_threadsafe(loop.stop)
+
+    thread.join()
+
+    loop.close()
+
+
+
+def test_many_threads_share_one_connection(server_uri):
+
+    with SyncRpcClient(server_uri, retry_config=False, default_response_timeout=5) as client:
+
+        assert client.other.echo(text="hi") == "hi"
+
+        with ThreadPoolExecutor(32) as pool:
+
+            results = list(pool.map(lambda i: client.call("add", {"a": i, "b": 1}), range(500)))
+
+        assert results == [i + 1 for i in range(500)]
+
+        assert len(client.clients) == 1
+
+        # submissions that pile up while the loop is busy share a wakeup
+
+        futures = [client.submit("add", {"a": i, "b": i}) for i in range(200)]
+
+        assert [future.result().result for future in futures] == [2 * i for i in range(200)]
+
+        assert client.wakeups < 501 + 200
+
+
+
+def test_pool_and_errors(server_uri):
+
+    with SyncRpcClient(server_uri, connections=3, retry_config=False, default_response_timeout=5) as client:
+
+        assert [client.call("add", {"a": i, "b": 0}) for i in range(6)] == list(range(6))
+
+        assert len({c.channel.id for c in client.clients}) == 3
+
+        with pytest.raises(Exception):
+
+            client.call("add", {"a": 1, "b": 2}, timeout=0)
+
+    with pytest.raises(RuntimeError):
+
+        client.call("echo", {"text": "closed"})
+
@@ -0,0 +1,138 @@
+import copy
+
+
+
+import pytest
+
+
+
+from fasterpc.rpc_channel import RpcTimeoutException
+
+from fasterpc.rpc_methods import RpcMethodsBase
+
+from fasterpc.synced import SyncedObjectMethods, SyncedObjects, apply_patch, diff
+
+
+
+from conftest import connected_pair
+
+
+
+class StatusMethods(SyncedObjectMethods):
+
+    received = []
+
+
+
+    async def sync_object(self, key, version, base=None, patch=None, snapshot=None) -> dict:
+
+        self.received.append({"patch": patch} if patch is not None else {"snapshot": snapshot})
+
+        return await super().sync_object(key, version, base, patch, snapshot)
+
+
+
+def status(workers):
+
+    return {"cluster": "a/b", "workers": {f"w{i}": {"load": load, "tags": ["x", "y"]} for i, load in enumerate(workers)}}
+
+
+
+def test_diff_roundtrip():
+
+    old = {"a": 1, "b": {"c": [1, 2, 3], "d~/e": "x"}, "gone": True}
+
+    new = {"a": 1, "b": {"c": [1, 5, 3], "d~/e": "y"}, "added": [1], "list": None}
+
+    ops = diff(old, new)
+
+    assert {"op": "replace", "path": "/b/c/1", "value": 5} in ops and {"op": "remove", "path": "/gone"} in ops
+
+    assert apply_patch(copy.deepcopy(old), ops) == new
+
+    assert apply_patch([1], diff([1], [1, 2])) == [1, 2]
+
+    # equal in Python, not on the wire
+
+    assert diff({"on": 1, "off": 0, "n": 1}, {"on": True, "off": False, "n": 1.0}) == [
+
+        {"op": "replace", "path": "/on", "value": True}, {"op": "replace", "path": "/off", "value": False},
+
+        {"op": "replace", "path": "/n", "value": 1.0}]
+
+    assert diff({"a": [1, {"b": "c"}]}, {"a": [1, {"b": "c"}]}) == []
+
+
+
+@pytest.mark.asyncio
+
+async def test_pushes_deltas_and_falls_back_to_snapshots():
+
+    client, server, tasks = await connected_pair(RpcMethodsBase())
+
+    client.methods = StatusMethods()
+
+    synced = SyncedObjects(history=2)
+
+    sent = StatusMethods.received = []
+
+    try:
+
+        await synced.publish("status", status([1, 2, 3]), [server])
+
+        await synced.publish("status", status([1, 9, 3]), [server])
+
+        assert client.methods.synced_objects["status"] == status([1, 9, 3])
+
+        assert "snapshot" in sent[0] and sent[1]["patch"] == [{"op": "replace", "path": "/workers/w1/load", "value": 9}]
+
+        # unchanged objects aren't sent again
+
+        await synced.publish("status", status([1, 9, 3]), [server])
+
+        assert len(sent) == 2
+
+
+
+        # the receiver lost its copy (e.g. restarted methods) - the delta is refused and a snapshot follows
+
+        client.methods = StatusMethods()
+
+        await synced.publish("status", status([4, 9, 3]), [server])
+
+        assert "patch" in sent[2] and "snapshot" in sent[3]
+
+        assert client.methods.synced_objects["status"] == status([4, 9, 3])
+
+
+
+        # lagging more than `history` versions behind - straight to a snapshot
+
+        for load in range(5): synced.set("status", status([load]))
+
+        await synced.push(server, "status")
+
+        assert "snapshot" in sent[4] and client.methods._synced_version_("status") == synced._objects["status"][0]
+
+
+
+        # a reconnected channel starts from scratch
+
+        synced.forget(server)
+
+        await synced.push(server, "status")
+
+        assert "snapshot" in sent[5]
+
+
+
+        # the hooks aren't callable by the peer
+
+        with pytest.raises(RpcTimeoutException):
+
+            await server.call("_on_synced_object_", {"key": "status", "value": None}, timeout=0.1)
+
+    finally:
+
+        for task in tasks: task.cancel()
+
@@ -0,0 +1,120 @@
+import json
+
+
+
+import pytest
+
+
+
+from fasterpc import tracing
+
+from fasterpc.rpc_methods import RpcUtilityMethods
+
+
+
+from conftest import connected_pair
+
+
+
+class RelayMethods(RpcUtilityMethods):
+
+    async def relay(self, text: str) -> str:
+
+        # second hop, back to the caller
+
+        return (await self.channel.other.echo(text=text)).result
+
+
+
+@pytest.fixture
+
+def exporter():
+
+    exporter = tracing.InMemorySpanExporter()
+
+    tracing.configure(exporter)
+
+    yield exporter
+
+    tracing.disable()
+
+
+
+async def traced_pair():
+
+    client, _, tasks = await connected_pair(RelayMethods(), RpcUtilityMethods())
+
+    return client, tasks
+
+
+
+@pytest.mark.asyncio
+
+async def test_trace_follows_multi_hop_call(exporter):
+
+    client, tasks = await traced_pair()
+
+    try:
+
+        assert (await client.other.relay(text="hi")).result == "hi"
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+    spans = {span.name: span for span in exporter.spans}
+
+    assert set(spans) == {"call relay", "on_request relay", "handler relay", "call echo", "on_request echo", "handler echo"}
+
+    assert len({span.trace_id for span in exporter.spans}) == 1
+
+    chain = ["call relay", "on_request relay", "handler relay", "call echo", "on_request echo", "handler echo"]
+
+    for parent, child in zip(chain, chain[1:]):
+
+        assert spans[child].parent_id == spans[parent].span_id
+
+    assert spans["call relay"].parent_id is None and spans["call relay"].kind == tracing.CLIENT
+
+
+
+@pytest.mark.asyncio
+
+async def test_unsampled_trace_is_not_exported(exporter):
+
+    tracing.tracer.sample_rate = 0
+
+    client, tasks = await traced_pair()
+
+    try:
+
+        assert (await client.other.relay(text="hi")).result == "hi"
+
+    finally:
+
+        for task in tasks: task.cancel()
+
+    assert exporter.spans == []
+
+
+
+def test_jsonl_exporter(tmp_path):
+
+    path = tmp_path / "spans.jsonl"
+
+    tracer = tracing.Tracer(tracing.JsonlSpanExporter(str(path)))
+
+    with tracer.start_span("outer") as outer:
+
+        with tracer.start_span("inner", attributes={"size": 3}):
+
+            pass
+
+    tracer.exporter.close()
+
+    inner, outer_line = [json.loads(line) for line in path.read_text().splitlines()]
+
+    assert inner["parent_id"] == outer.span_id and inner["attributes"] == {"size": 3}
+
+    assert outer_line["name"] == "outer" and tracing.parse_traceparent(outer.traceparent)[0] == outer.trace_id
+